@@ -0,0 +1,41 @@
+import hmac
+import re
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+
+router = APIRouter()
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """True when token matches the configured ADMIN_TOKEN (never if unset)."""
+    if not settings.ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode())
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not is_admin(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
+
+
+@router.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+def get_profile(profile_id: str):
+    """
+    A stored request profile in folded-stack format (one "a;b;c count"
+    line per stack), ready for flamegraph.pl or speedscope.
+    """
+    path = settings.PROFILE_DIR / f"{profile_id}.folded"
+    if not _PROFILE_ID.match(profile_id) or not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return PlainTextResponse(path.read_text(encoding="utf-8"))
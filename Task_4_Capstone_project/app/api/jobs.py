@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException, status
+
+from app.models.response import JobStatusResponse
+from app.services.jobs import job_manager
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return JobStatusResponse(**job)
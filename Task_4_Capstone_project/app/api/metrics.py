@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services import metrics
+from app.services.admission import generation_limiter
+from app.services.compact_vectors import quantized_index
+from app.services import vector_store
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Point-in-time state of other components, read at scrape time
+metrics.registry.gauge("rag_llm_active", "LLM generations running.", lambda: generation_limiter.active)
+metrics.registry.gauge("rag_llm_waiting", "Requests waiting for an LLM slot.", lambda: generation_limiter.waiting)
+metrics.registry.gauge(
+    "rag_partitions_open", "Open vector store partition handles.",
+    lambda: vector_store.partitions.stats()["open"]
+)
+metrics.registry.gauge(
+    "rag_quantized_index_bytes", "Memory held by quantized first-pass vectors.",
+    lambda: quantized_index.stats()["bytes"]
+)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Pipeline stage latencies and counters in Prometheus text format."""
+    return PlainTextResponse(metrics.registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,90 +1,155 @@
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
+import json
 import logging
+import time
+from typing import AsyncIterator, Optional
 
 from app.models.request import QueryRequest
 from app.models.response import QueryResponse, Citation
-from app.services.embedding import embed_query
+from app.core.config import settings
+from app.services.embedding import aembed_query, embedding_cache_stats, embedding_coalescing_stats
+from app.services.answer_cache import answer_cache
+from app.services.admission import generation_limiter
+from app.services import sessions
 # MODIFICATION 1: Import the whole module, not just 'collection'
 from app.services import vector_store 
-from app.services.llm import generate_answer
+from app.services import context_packer
+from app.services import metrics
+from app.services.llm import agenerate_answer, agenerate_answer_stream
+from app.utils.profiler import run_in_threadpool
+from app.utils.singleflight import AsyncSingleFlight
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.post("/query", response_model=QueryResponse)
-def query_docs(request: QueryRequest):
-    try:
-        # 1. Input validation
-        question = request.question.strip()
-        if not question:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Question cannot be empty"
-            )
+# Concurrent identical (session, question) queries share one computation
+_query_flight = AsyncSingleFlight()
+
+NO_DOCUMENTS_ANSWER = "I couldn't find any documents for this session. Please upload a PDF first."
+NO_CONTEXT_ANSWER = "The document does not contain information relevant to your question."
 
-        # 2. Generate query embedding
-        query_embedding = embed_query(question)
 
-        # 3. Vector search (WITH SESSION ID)
-        # MODIFICATION 2: Use the helper function that handles filtering
+def _retrieve(question: str, query_embedding: list[float], session_id: str) -> tuple[list[dict], list[Citation], Optional[str]]:
+    """
+    Searches the session's chunks and builds the LLM contexts plus
+    citations. The third value is a canned answer to return instead of
+    calling the LLM (no documents / nothing relevant), else None.
+    """
+    # 3. Vector search (WITH SESSION ID)
+    # MODIFICATION 2: Use the helper function that handles filtering
+    with metrics.timed("search"):
         results = vector_store.search_similar(
             query_embedding=query_embedding,
-            top_k=10,
-            session_id=request.session_id  # <--- CRITICAL: Pass the ID
+            top_k=settings.RETRIEVAL_TOP_K,
+            session_id=session_id,  # <--- CRITICAL: Pass the ID
+            query_text=question     # used by hybrid (BM25) retrieval
         )
+    documents = (results or {}).get("documents") or [[]]
+    metrics.SEARCH_RESULTS.observe(len(documents[0]), mode=settings.RETRIEVAL_MODE)
 
-        if (
-            not results
-            or "documents" not in results
-            or not results["documents"]
-            or not results["documents"][0]
-        ):
-            return QueryResponse(
-                answer="I couldn't find any documents for this session. Please upload a PDF first.",
-                citations=[]
-            )
+    if (
+        not results
+        or "documents" not in results
+        or not results["documents"]
+        or not results["documents"][0]
+    ):
+        return [], [], NO_DOCUMENTS_ANSWER
 
-        contexts = []
-        citations = []
-        seen_chunks = set()  
-
-        # 4. Construct Context & Citations
-        # (This logic remains mostly the same, just robust looping)
-        for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
-            
-            chunk_signature = f"{meta.get('page')}_{doc[:50]}"
-            
-            if chunk_signature in seen_chunks:
-                continue  
-            
-            seen_chunks.add(chunk_signature)
-
-            contexts.append({
-                "text": doc,
-                "page": meta.get("page")
-            })
-
-            citations.append(
-                Citation(
-                    source=meta.get("source", "uploaded_pdf"),
-                    page=meta.get("page"),
-                    text=doc[:300]  
-                )
-            )
+    # 4. Pack the context: MMR re-rank, merge overlapping neighbours,
+    #    stop at the token budget (replaces the page + doc[:50] dedup)
+    embeddings = results.get("embeddings")
+    with metrics.timed("context"):
+        contexts = context_packer.pack_context(
+            query_embedding,
+            results["documents"][0],
+            results["metadatas"][0],
+            embeddings[0] if embeddings is not None and len(embeddings) else None
+        )
+    metrics.CONTEXT_CHUNKS.observe(len(contexts))
 
-        # 5. Fallback if context list is empty
-        if not contexts:
-            return QueryResponse(
-                answer="The document does not contain information relevant to your question.",
-                citations=[]
-            )
+    citations = [
+        Citation(
+            source=context["source"],
+            page=context["page"],
+            text=context["text"][:300]
+        )
+        for context in contexts
+    ]
+
+    # 5. Fallback if context list is empty
+    if not contexts:
+        return [], [], NO_CONTEXT_ANSWER
+
+    return contexts, citations, None
+
+
+def _validate_question(request: QueryRequest) -> str:
+    # 1. Input validation
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Question cannot be empty"
+        )
+    return question
 
-        # 6. Generate answer using RAG
-        answer = generate_answer(question, contexts)
 
+def _normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+async def _answer_question(question: str, session_id: str) -> QueryResponse:
+    # 2. Generate query embedding
+    with metrics.timed("embed_query"):
+        query_embedding = await aembed_query(question)
+
+    # 2b. Near-identical question already answered in this session?
+    generation = answer_cache.generation(session_id)
+    if settings.ANSWER_CACHE_ENABLED:
+        cached = answer_cache.lookup(session_id, query_embedding, question)
+        if cached:
+            return cached
+
+    contexts, citations, canned_answer = await run_in_threadpool(
+        _retrieve, question, query_embedding, session_id
+    )
+    if canned_answer:
         return QueryResponse(
-            answer=answer,
-            citations=citations
+            answer=canned_answer,
+            citations=[]
+        )
+
+    # 6. Generate answer using RAG (bounded number of concurrent generations)
+    async with generation_limiter.slot():
+        with metrics.timed("llm"):
+            answer = await agenerate_answer(question, contexts)
+
+    response = QueryResponse(
+        answer=answer,
+        citations=citations
+    )
+    if settings.ANSWER_CACHE_ENABLED:
+        answer_cache.store(session_id, query_embedding, question, response, generation=generation)
+
+    return response
+
+
+@router.post("/query", response_model=QueryResponse)
+async def query_docs(request: QueryRequest):
+    """
+    Fully async RAG pipeline: Ollama calls go through the async client,
+    the Chroma search runs in the threadpool, and generation waits for a
+    slot from the admission limiter (429 + Retry-After when overloaded).
+    Identical concurrent questions of a session share one pipeline run.
+    """
+    try:
+        question = _validate_question(request)
+        await run_in_threadpool(sessions.session_tracker.touch, request.session_id)
+
+        key = (request.session_id, _normalize_question(question))
+        return await _query_flight.do(
+            key, lambda: _answer_question(question, request.session_id)
         )
 
     except HTTPException:
@@ -95,4 +160,107 @@ def query_docs(request: QueryRequest):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to process query: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/query/stream")
+async def query_docs_stream(request: QueryRequest):
+    """
+    Streams the answer as server-sent events:
+    'citations' first, then one 'token' event per model chunk,
+    then 'done' with the full answer ('error' if generation fails).
+    Admission is checked before the stream starts, so an overloaded
+    server answers 429 instead of opening a stream it cannot serve.
+    """
+    cached = None
+    try:
+        question = _validate_question(request)
+        await run_in_threadpool(sessions.session_tracker.touch, request.session_id)
+        with metrics.timed("embed_query"):
+            query_embedding = await aembed_query(question)
+
+        generation = answer_cache.generation(request.session_id)
+        if settings.ANSWER_CACHE_ENABLED:
+            cached = answer_cache.lookup(request.session_id, query_embedding, question)
+
+        if cached:
+            contexts, citations, canned_answer = [], cached.citations, cached.answer
+        else:
+            contexts, citations, canned_answer = await run_in_threadpool(
+                _retrieve, question, query_embedding, request.session_id
+            )
+
+        if not canned_answer:
+            generation_limiter.check_admission()
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Query failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to process query: {str(e)}"
+        )
+
+    async def event_stream() -> AsyncIterator[str]:
+        yield _sse("citations", [citation.model_dump() for citation in citations])
+
+        if canned_answer:
+            yield _sse("token", {"text": canned_answer})
+            yield _sse("done", {"answer": canned_answer})
+            return
+
+        answer = ""
+        try:
+            async with generation_limiter.slot():
+                with metrics.timed("llm"):
+                    started = time.perf_counter()
+                    async for token in agenerate_answer_stream(question, contexts):
+                        if not answer:
+                            metrics.observe_stage("llm_first_token", time.perf_counter() - started)
+                        answer += token
+                        yield _sse("token", {"text": token})
+        except HTTPException as e:
+            yield _sse("error", {"detail": e.detail, "status_code": e.status_code})
+            return
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {str(e)}")
+            yield _sse("error", {"detail": f"Failed to process query: {str(e)}"})
+            return
+
+        answer = answer.strip()
+        if settings.ANSWER_CACHE_ENABLED:
+            answer_cache.store(
+                request.session_id,
+                query_embedding,
+                question,
+                QueryResponse(answer=answer, citations=citations),
+                generation=generation
+            )
+
+        yield _sse("done", {"answer": answer})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/cache/stats")
+def cache_stats():
+    """Cache hit rates, generation admission and request coalescing counters."""
+    return {
+        "answer_cache": answer_cache.stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "generation": generation_limiter.stats(),
+        "coalescing": {
+            "queries": _query_flight.stats(),
+            "embeddings": embedding_coalescing_stats()
+        }
+    }
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from app.services import sessions
+
+router = APIRouter()
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Delete a session's chunks, uploaded files and cached answers."""
+    try:
+        result = await run_in_threadpool(sessions.delete_session, session_id)
+        return {"status": "success", **result}
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to delete session: {str(e)}"
+        )
@@ -1,25 +1,86 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
+from fastapi.responses import JSONResponse
+import io
+import os
 import logging
-import shutil
+import hashlib
 from pathlib import Path
 from typing import Optional
 
 # UPDATED IMPORT: Use settings instead of direct variables
 from app.core.config import settings
-from app.services.pdf_service import extract_text_from_pdf
-from app.services.embedding import embed_texts
-from app.services.vector_store import store_chunks, collection
+from app.services.ingestion import ingest_document, reuse_existing_document
+from app.services.jobs import job_manager
+from app.services import sessions
+from app.utils.profiler import run_in_threadpool
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Read size used while copying the spooled upload into memory
+UPLOAD_READ_CHUNK = 1024 * 1024
+
+
+def upload_path(doc_hash: str) -> Path:
+    """Content-addressed location of an uploaded PDF (same bytes, same file)."""
+    return settings.UPLOAD_DIR / doc_hash[:2] / f"{doc_hash}.pdf"
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"File size exceeds {settings.MAX_FILE_SIZE_MB} MB limit"
+    )
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> tuple[io.BytesIO, str]:
+    """
+    Copies the upload into one in-memory buffer, hashing as it goes, and
+    returns the buffer and the SHA-256. Starlette has already spooled the
+    whole body by the time the handler runs (uploads with a Content-Length
+    over the limit are refused earlier, by the limit_upload_size
+    middleware), so this only stops an oversized file from being copied:
+    its spooled size is checked first, and the running total while reading
+    covers a size Starlette did not record.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large()
+    hasher = hashlib.sha256()
+    buffer = io.BytesIO()
+    while block := await file.read(UPLOAD_READ_CHUNK):
+        if buffer.tell() + len(block) > max_bytes:
+            raise _too_large()
+        hasher.update(block)
+        buffer.write(block)
+    buffer.seek(0)
+    return buffer, hasher.hexdigest()
+
+
+def save_upload(content: io.BytesIO, doc_hash: str) -> Path:
+    """Writes the PDF to its content-addressed path unless it is already there."""
+    path = upload_path(doc_hash)
+    with content.getbuffer() as data:
+        if path.is_file() and path.stat().st_size == data.nbytes:
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix(f".{os.getpid()}.part")
+        partial.write_bytes(data)
+    os.replace(partial, path)
+    return path
+
 @router.post("/upload")
 async def upload_pdf(
     file: UploadFile = File(...),
     session_id: str = Form(...),   
-    password: Optional[str] = Form(None)        
+    password: Optional[str] = Form(None),
+    background: bool = Form(False)
 ):
-    print(f"DEBUG LOG: Filename='{file.filename}', Session='{session_id}', Password Received='{password}'")
+    """
+    Upload and index a PDF.
+    With background=true the work is queued and a job id is returned
+    (202); poll /api/jobs/{job_id} for stage and progress.
+    """
+    logger.debug(f"Upload received: {file.filename} for session {session_id} (password given: {bool(password)})")
     try:
         # 1. Basic validation
         if not file.filename.lower().endswith(".pdf"):
@@ -28,60 +89,48 @@ async def upload_pdf(
                 detail="Only PDF files are allowed"
             )
 
-        # 2. Size Validation 
-        file.file.seek(0, 2)
-        file_size = file.file.tell()
-        file.file.seek(0)
-        
-        # UPDATED: Use settings.MAX_FILE_SIZE_MB
-        if file_size > settings.MAX_FILE_SIZE_MB * 1024 * 1024:
-             raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File size exceeds {settings.MAX_FILE_SIZE_MB} MB limit"
-            )
-
-        # 3. Save file temporarily
-        # UPDATED: Use settings.UPLOAD_DIR
-        file_path = settings.UPLOAD_DIR / file.filename
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        await run_in_threadpool(sessions.session_tracker.touch, session_id)
 
-        logger.info(f"PDF uploaded: {file.filename} for session {session_id}")
+        # 2. Buffer + hash the spooled body, enforcing the size limit
+        content, doc_hash = await read_upload(file, settings.MAX_FILE_SIZE_MB * 1024 * 1024)
 
-        # 4. Extract text & Chunk (Pass Password)
-        try:
-            chunks = extract_text_from_pdf(str(file_path), password=password)
-        except HTTPException as e:
-           
-            raise e
-
-        if not chunks:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
-                detail="No text could be extracted from the PDF"
-            )
+        logger.info(f"PDF uploaded: {file.filename} for session {session_id} (sha256 {doc_hash[:12]})")
 
-        # 5. Generate Embeddings
-        text_list = [chunk["text"] for chunk in chunks]
-        embeddings = embed_texts(text_list)
+        # 3. Dedup: identical bytes were already processed before
+        reused = await run_in_threadpool(
+            reuse_existing_document, doc_hash, session_id, file.filename, content, password
+        )
+        if reused:
+            return reused
+
+        # 4. Keep a copy under its content hash (no clobbering across sessions)
+        file_path = await run_in_threadpool(save_upload, content, doc_hash)
+
+        pipeline_args = {
+            "file_path": str(file_path),
+            "filename": file.filename,
+            "session_id": session_id,
+            "doc_hash": doc_hash,
+            "password": password
+        }
 
-        if not embeddings or len(embeddings) != len(chunks):
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Embedding generation failed"
+        # 5a. Job mode: hand off to the background workers (they parse the
+        # saved file, so queued jobs don't pin upload buffers in memory)
+        if background:
+            job_id = job_manager.submit(ingest_document, **pipeline_args)
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content={
+                    "status": "queued",
+                    "message": "Document queued for processing",
+                    "job_id": job_id,
+                    "filename": file.filename
+                }
             )
 
-        # 6. Store in Vector DB (Pass Session ID)
-        store_chunks(chunks, embeddings, session_id=session_id)
-
-        logger.info(f"Stored {len(chunks)} chunks from {file.filename}")
-
-        return {
-            "status": "success",  
-            "message": "Document processed successfully",
-            "chunks_stored": len(chunks),
-            "filename": file.filename
-        }
+        # 5b. Inline mode: parse straight from the in-memory buffer,
+        # still keeping the blocking pipeline off the event loop
+        return await run_in_threadpool(ingest_document, content=content, **pipeline_args)
 
     except HTTPException:
         raise
@@ -97,14 +146,12 @@ async def upload_pdf(
 @router.delete("/reset")
 def reset_database():
     try:
-        # Check current count
-        count = collection.count()
+        # Drops and recreates the collection; registry, caches, session
+        # tracking and uploaded files go with it
+        count = sessions.reset_all()
         if count == 0:
              return {"status": "success", "message": "Database is already empty."}
 
-        # Delete everything
-        collection.delete(where={}) 
-        
         return {"status": "success", "message": f"Deleted {count} records. Database is clean."}
         
     except Exception as e:
@@ -8,7 +8,9 @@ load_dotenv()
 class Settings:
     # --- 1. BASE PATHS ---
     BASE_DIR = Path(__file__).resolve().parent.parent.parent
-    DATA_DIR = BASE_DIR / "data"
+    # Everything the app stores (uploads, Chroma, sqlite databases) lives
+    # here; benchmarks point it at a throwaway directory
+    DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
     
     # Storage Directories
     UPLOAD_DIR = DATA_DIR / "uploads"
@@ -21,18 +23,131 @@ class Settings:
     
     # --- 3. DATABASE SETTINGS (This was missing!) ---
     COLLECTION_NAME = os.getenv("COLLECTION_NAME", "tax_documents")
+    # Registry of processed PDFs by content hash (used to skip re-processing)
+    DOCUMENT_REGISTRY_PATH = DATA_DIR / os.getenv("DOCUMENT_REGISTRY_PATH", "documents.sqlite3")
+    # Partitioning: "global" (one collection, filtered by session_id),
+    # "session" (a collection per session) or "bucket" (sessions hashed
+    # into PARTITION_BUCKETS collections). At most PARTITION_MAX_OPEN
+    # partition handles stay open; idle ones are closed.
+    PARTITION_MODE = os.getenv("PARTITION_MODE", "global").lower()
+    PARTITION_BUCKETS = int(os.getenv("PARTITION_BUCKETS", 64))
+    PARTITION_MAX_OPEN = int(os.getenv("PARTITION_MAX_OPEN", 256))
+    PARTITION_IDLE_SECONDS = int(os.getenv("PARTITION_IDLE_SECONDS", 600))
+    # Closing a partition handle does not free its HNSW index; Chroma keeps
+    # loaded indexes in its own cache. CHROMA_HNSW_CACHE_SIZE caps how many
+    # stay loaded (0 = Chroma's default, a fifth of the open-file limit);
+    # CHROMA_MEMORY_LIMIT_MB is the LRU segment cache budget of Chroma's
+    # Python segment backend (0 = unbounded). An evicted index must already
+    # be on disk, so collections write theirs every HNSW_SYNC_THRESHOLD
+    # additions (Chroma's default of 1000 loses small, fresh indexes).
+    CHROMA_HNSW_CACHE_SIZE = int(os.getenv("CHROMA_HNSW_CACHE_SIZE", 256))
+    CHROMA_MEMORY_LIMIT_MB = int(os.getenv("CHROMA_MEMORY_LIMIT_MB", 1024))
+    HNSW_SYNC_THRESHOLD = int(os.getenv("HNSW_SYNC_THRESHOLD", 100))
+    # Vector backend: "chroma" (HNSW) or "flat" (exact search over a
+    # memory-mapped float32 matrix per partition, under FLAT_STORE_DIR).
+    # "flat" has no global collection: PARTITION_MODE "global" means "session".
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    # Chroma HNSW index of new collections: distance space ("l2", "cosine",
+    # "ip"), graph degree M, build-time beam ef_construction and query-time
+    # beam ef_search. Existing collections keep theirs; only ef_search can
+    # change later: python -m app.services.hnsw_tuning --apply
+    HNSW_SPACE = os.getenv("HNSW_SPACE", "l2").lower()
+    HNSW_M = int(os.getenv("HNSW_M", 16))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 100))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 100))
+    FLAT_STORE_DIR = DATA_DIR / os.getenv("FLAT_STORE_PATH", "flat_index")
+    # Session expiry: sessions idle longer than SESSION_TTL_SECONDS (0 = never)
+    # lose their chunks and uploaded files; the sweeper checks every
+    # SESSION_SWEEP_INTERVAL seconds. Last access is persisted at most once
+    # per SESSION_TOUCH_INTERVAL seconds per session.
+    SESSION_DB_PATH = DATA_DIR / os.getenv("SESSION_DB_PATH", "sessions.sqlite3")
+    SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 7 * 24 * 3600))
+    SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", 300))
+    SESSION_TOUCH_INTERVAL = int(os.getenv("SESSION_TOUCH_INTERVAL", 60))
 
     # --- 4. PROCESSING CONSTANTS ---
     MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", 20))
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 500))
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 50))
+    # Unit of CHUNK_SIZE / CHUNK_OVERLAP: "chars" or "tokens" (approximate
+    # sub-word tokens). With CHUNK_ACROSS_PAGES a chunk may continue on the
+    # next page; it keeps the page it starts on plus a page_end.
+    CHUNK_LENGTH_UNIT = os.getenv("CHUNK_LENGTH_UNIT", "chars").lower()
+    CHUNK_ACROSS_PAGES = os.getenv("CHUNK_ACROSS_PAGES", "false").lower() == "true"
     TOP_K = int(os.getenv("TOP_K", 3))
+    # Retrieval: "dense" (vector only) or "hybrid" (vector + BM25 fused with RRF)
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense").lower()
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 10))
+    HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", 3))
+    HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+    LEXICAL_MAX_SESSIONS = int(os.getenv("LEXICAL_MAX_SESSIONS", 500))
+    # Compact vectors: keep only an EMBEDDING_DIMENSIONS-long Matryoshka
+    # prefix of each embedding (0 = whole vector), and/or search a
+    # "float16" / "int8" quantized copy first, re-scoring the best
+    # QUANTIZED_RERANK_MULTIPLIER x k candidates at float32
+    EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 0))
+    VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+    QUANTIZED_RERANK_MULTIPLIER = int(os.getenv("QUANTIZED_RERANK_MULTIPLIER", 4))
+    QUANTIZED_MAX_SESSIONS = int(os.getenv("QUANTIZED_MAX_SESSIONS", 500))
+    # Context packing: retrieved chunks are re-ranked by MMR (1.0 = pure
+    # relevance, lower = more diversity) and packed up to this many tokens
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.7))
+    # Semantic answer cache: a new question reuses a cached answer of the same
+    # session when their embeddings' cosine similarity is >= the threshold and
+    # both mention the same numbers / section codes ("80C" vs "80D"). Off by
+    # default: near-duplicate questions can still need different answers
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+    ANSWER_CACHE_MAX_PER_SESSION = int(os.getenv("ANSWER_CACHE_MAX_PER_SESSION", 50))
+    ANSWER_CACHE_MAX_SESSIONS = int(os.getenv("ANSWER_CACHE_MAX_SESSIONS", 1000))
+    # Multi-process PDF text extraction (used from PDF_PARALLEL_MIN_PAGES pages up)
+    PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", 4))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 24))
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 8))
+    # Background ingestion: worker threads, and max queued + running jobs
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+    INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", 20))
+    # Streaming ingestion: chunks embedded + stored per flush, and how many
+    # parsed batches may wait for the embedder (bounds peak memory)
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 64))
+    INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", 2))
 
     # --- 5. AI MODELS (OLLAMA) ---
     LLM_MODEL = os.getenv("LLM_MODEL", "mistral:7b")
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 
+    # LLM admission control: concurrent generations, how many requests may
+    # wait for a slot (and for how long) before getting 429 + Retry-After
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 2))
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 16))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 30))
+    LLM_RETRY_AFTER_SECONDS = int(os.getenv("LLM_RETRY_AFTER_SECONDS", 5))
+
+    # Batched embedding: texts sent per /api/embed request, and how many
+    # of those requests may be in flight at once. A batch size of 1 keeps
+    # the legacy one-call-per-chunk /api/embeddings path.
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 32))
+    EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", 4))
+
+    # Disk-backed embedding cache (content-addressed, LRU-evicted)
+    EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+    EMBED_CACHE_PATH = DATA_DIR / os.getenv("EMBED_CACHE_PATH", "embedding_cache.sqlite3")
+    EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", 256))
+
+    # Per-stage latency histograms and counters, served on /metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Server-Timing header (per-stage durations) on upload/query responses
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+    # Admin-only request profiling: send "X-Profile: 1" with a matching
+    # "X-Admin-Token" (or set PROFILE_REQUESTS to profile every upload/query).
+    # No ADMIN_TOKEN disables the header opt-in and the admin endpoints.
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+    PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "false").lower() == "true"
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+    PROFILE_DIR = DATA_DIR / os.getenv("PROFILE_DIR", "profiles")
+
     # --- 6. NETWORK & CORS ---
     HOST = os.getenv("HOST", "127.0.0.1")
     PORT = int(os.getenv("PORT", 8000))
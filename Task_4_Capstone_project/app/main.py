@@ -1,12 +1,37 @@
-from fastapi import FastAPI
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.upload import router as upload_router
 from app.api.query import router as query_router
+from app.api.jobs import router as jobs_router
+from app.api.sessions import router as sessions_router
+from app.api.metrics import router as metrics_router
+from app.api.admin import router as admin_router, is_admin
+from app.services import metrics
+from app.services.sessions import session_sweeper
+from app.utils.profiler import SamplingProfiler
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Expires idle sessions in the background (disabled when the TTL is 0)
+    session_sweeper.start()
+    yield
+    session_sweeper.stop()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    version=settings.APP_VERSION
+    version=settings.APP_VERSION,
+    lifespan=lifespan
 )
 
 
@@ -24,9 +49,92 @@ app.add_middleware(
     allow_headers=["*"],  
 )
 
+# Multipart overhead allowed on top of the file itself
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Refuse oversized uploads from their Content-Length, before the body
+    # is spooled; bodies without one are still capped while being read
+    if request.method == "POST" and request.url.path == f"{settings.API_PREFIX}/upload":
+        length = request.headers.get("content-length")
+        limit = settings.MAX_FILE_SIZE_MB * 1024 * 1024 + UPLOAD_FORM_OVERHEAD
+        if length and length.isdigit() and int(length) > limit:
+            return JSONResponse(
+                status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                content={"detail": f"File size exceeds {settings.MAX_FILE_SIZE_MB} MB limit"}
+            )
+    return await call_next(request)
+
+# Endpoints that get a Server-Timing breakdown (and can be profiled)
+TIMED_PATHS = (f"{settings.API_PREFIX}/upload", f"{settings.API_PREFIX}/query")
+
+
+def _server_timing(stages: list, total: float) -> str:
+    # Repeated stages (per page, per batch) are summed
+    totals: dict[str, float] = {}
+    for stage, seconds in stages:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _wants_profile(request: Request) -> bool:
+    if settings.PROFILE_REQUESTS:
+        return True
+    return request.headers.get("x-profile") == "1" and is_admin(request.headers.get("x-admin-token"))
+
+
+async def _finish_profile(body: AsyncIterator, profiler: SamplingProfiler, profile_id: str) -> AsyncIterator:
+    # Streamed answers keep working after the headers went out; profile to the end
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        profiler.stop()
+        path = profiler.save(settings.PROFILE_DIR / f"{profile_id}.folded")
+        logger.info(f"Saved profile {path} ({profiler.samples} samples, {profiler.duration:.2f}s)")
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """
+    Adds a Server-Timing header (per-stage durations collected by
+    metrics.timed) to upload and query responses. Admins can opt a request
+    into the sampling profiler; its id comes back in X-Profile-Id and the
+    profile is served from /api/admin/profiles/{id}.
+    """
+    profile = request.url.path.startswith(TIMED_PATHS) and _wants_profile(request)
+    if not request.url.path.startswith(TIMED_PATHS) or not (settings.SERVER_TIMING_ENABLED or profile):
+        return await call_next(request)
+
+    stages = metrics.start_request_timing()
+    profiler = SamplingProfiler(interval=settings.PROFILE_INTERVAL_MS / 1000).start() if profile else None
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        if profiler:
+            profiler.stop()
+        raise
+
+    if settings.SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = _server_timing(stages, time.perf_counter() - started)
+    if profiler:
+        profile_id = uuid.uuid4().hex
+        response.headers["X-Profile-Id"] = profile_id
+        response.body_iterator = _finish_profile(response.body_iterator, profiler, profile_id)
+    return response
+
 # --- ROUTERS ---
 app.include_router(upload_router, prefix=settings.API_PREFIX)
 app.include_router(query_router, prefix=settings.API_PREFIX)
+app.include_router(jobs_router, prefix=settings.API_PREFIX)
+app.include_router(sessions_router, prefix=settings.API_PREFIX)
+app.include_router(admin_router, prefix=settings.API_PREFIX)
+# Prometheus scrapes /metrics at the root, outside the API prefix
+app.include_router(metrics_router)
 
 @app.get("/")
 def health_check():
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Any
 
 
 class Citation(BaseModel):
@@ -11,3 +11,15 @@ class Citation(BaseModel):
 class QueryResponse(BaseModel):
     answer: str
     citations: List[Citation]
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str          # queued | running | completed | failed
+    stage: str           # queued | extracting | embedding | storing | completed
+    progress: int        # percent complete, 0-100
+    filename: str
+    session_id: str
+    result: Optional[dict[str, Any]] = None
+    error: Optional[str] = None
+    error_code: Optional[int] = None
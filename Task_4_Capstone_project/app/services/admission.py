@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationLimiter:
+    """
+    Admission control for LLM generations.
+    At most max_concurrent generations run at once; up to max_queue more
+    wait (each for at most queue_timeout seconds). Anything beyond that is
+    rejected straight away with 429 and a Retry-After header.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives belong to one event loop; rebuild if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+            self.active = 0
+            self.waiting = 0
+        return self._semaphore
+
+    def _reject(self, reason: str) -> HTTPException:
+        self.rejected += 1
+        metrics.LLM_REJECTED.inc()
+        logger.warning(f"Generation rejected: {reason}")
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Server is busy ({reason}). Please retry shortly.",
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+    def check_admission(self):
+        """Raise 429 now if a new generation would be rejected anyway."""
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.waiting >= self.max_queue:
+            raise self._reject("generation queue is full")
+
+    async def acquire(self):
+        semaphore = self._get_semaphore()
+        self.check_admission()
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("timed out waiting for a generation slot")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._get_semaphore().release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue
+        }
+
+
+generation_limiter = GenerationLimiter(
+    max_concurrent=settings.LLM_MAX_CONCURRENCY,
+    max_queue=settings.LLM_MAX_QUEUE,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+    retry_after=settings.LLM_RETRY_AFTER_SECONDS
+)
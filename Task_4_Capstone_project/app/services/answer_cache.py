@@ -0,0 +1,157 @@
+import itertools
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.response import QueryResponse
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Tokens containing a digit: amounts, years, section codes ("80C", "10(13A)" -> "10", "13a")
+_KEY_TERM = re.compile(r"\w*\d[\w,.]*")
+
+
+def key_terms(question: str) -> frozenset[str]:
+    """Numbers and section codes of a question, which its embedding barely reflects."""
+    return frozenset(
+        term.replace(",", "").rstrip(".").lower()
+        for term in _KEY_TERM.findall(question)
+    )
+
+
+class SemanticAnswerCache:
+    """
+    Session-scoped cache of generated answers, keyed by question embedding.
+    A lookup hits when a cached question of the same session has cosine
+    similarity >= threshold with the new one and the same key_terms():
+    "deduction under 80C" and "... 80D" embed almost identically but must
+    not share an answer. Sessions and their entries
+    are evicted least-recently-used first.
+
+    Every invalidation gives the session a new generation. A request
+    reads generation() before it retrieves and passes it to store(), so
+    an answer built from documents that changed in the meantime (or for
+    a session deleted meanwhile) is dropped instead of cached.
+    """
+
+    def __init__(self, threshold: float, max_entries_per_session: int, max_sessions: int):
+        self.threshold = threshold
+        self.max_entries_per_session = max_entries_per_session
+        self.max_sessions = max_sessions
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # session_id -> {"vectors": np.ndarray (n, dim), "terms": list[frozenset[str]],
+        #                "responses": list[QueryResponse]}
+        self._sessions: OrderedDict[str, dict] = OrderedDict()
+        # session_id -> generation of its last invalidation, from one
+        # process-wide counter so a generation is never handed out twice.
+        # Sessions evicted from this map report _generation_floor, which is
+        # at least any generation they had, so stale writes still fail.
+        self._clock = itertools.count(1)
+        self._generations: OrderedDict[str, int] = OrderedDict()
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def generation(self, session_id: str) -> int:
+        with self._lock:
+            return self._generations.get(session_id, self._generation_floor)
+
+    def lookup(self, session_id: str, embedding: list[float], question: str) -> Optional[QueryResponse]:
+        terms = key_terms(question)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and len(entry["responses"]):
+                query = self._normalize(embedding)
+                if query.shape[0] == entry["vectors"].shape[1]:
+                    scores = entry["vectors"] @ query
+                    # Most similar cached question that also names the same numbers/sections
+                    for best in np.argsort(-scores):
+                        if scores[best] < self.threshold:
+                            break
+                        if entry["terms"][best] == terms:
+                            self._sessions.move_to_end(session_id)
+                            self.hits += 1
+                            metrics.ANSWER_CACHE_HITS.inc()
+                            return entry["responses"][best].model_copy(deep=True)
+
+            self.misses += 1
+            metrics.ANSWER_CACHE_MISSES.inc()
+            return None
+
+    def store(self, session_id: str, embedding: list[float], question: str, response: QueryResponse,
+              generation: Optional[int] = None):
+        """Cache response; skipped if the session was invalidated since generation was read."""
+        vector = self._normalize(embedding)[np.newaxis, :]
+        terms = key_terms(question)
+        with self._lock:
+            if generation is not None and generation != self._generations.get(session_id, self._generation_floor):
+                logger.info(f"Answer for session {session_id} not cached: its documents changed meanwhile")
+                return
+            entry = self._sessions.get(session_id)
+            if entry is None or entry["vectors"].shape[1] != vector.shape[1]:
+                entry = {"vectors": vector, "terms": [terms], "responses": [response]}
+            else:
+                entry["vectors"] = np.vstack([entry["vectors"], vector])[-self.max_entries_per_session:]
+                entry["terms"] = (entry["terms"] + [terms])[-self.max_entries_per_session:]
+                entry["responses"] = (entry["responses"] + [response])[-self.max_entries_per_session:]
+
+            self._sessions[session_id] = entry
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def invalidate_session(self, session_id: str):
+        """Drop a session's answers (its documents changed)."""
+        with self._lock:
+            self._generations[session_id] = next(self._clock)
+            self._generations.move_to_end(session_id)
+            while len(self._generations) > self.max_sessions:
+                _, evicted = self._generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, evicted)
+            if self._sessions.pop(session_id, None) is not None:
+                self.invalidations += 1
+                metrics.ANSWER_CACHE_INVALIDATIONS.inc()
+                logger.info(f"Answer cache invalidated for session {session_id}")
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            # Answers still being generated predate the clear
+            self._generations.clear()
+            self._generation_floor = next(self._clock)
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._sessions),
+                "entries": sum(len(entry["responses"]) for entry in self._sessions.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "threshold": self.threshold
+            }
+
+
+answer_cache = SemanticAnswerCache(
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    max_entries_per_session=settings.ANSWER_CACHE_MAX_PER_SESSION,
+    max_sessions=settings.ANSWER_CACHE_MAX_SESSIONS
+)
@@ -0,0 +1,188 @@
+import bisect
+import re
+from typing import Iterable, Iterator
+
+from app.services import metrics
+
+# Break points, strongest first: paragraph, line, word; a hard cut is the fallback
+SEPARATORS = ("\n\n", "\n", " ")
+# A chunk ends at a weaker separator rather than fill less than this share
+# of chunk_size (a stray blank line must not leave a fragment behind)
+MIN_FILL = 0.5
+# Sub-word tokens: runs of up to 6 word characters, or one punctuation
+# mark. Tracks BPE/WordPiece counts for English text and Indian-format
+# amounts closely enough to budget chunks, with no tokenizer dependency.
+TOKEN_RE = re.compile(r"\w{1,6}|[^\w\s]")
+PAGE_BREAK = "\n\n"
+_NON_SPACE = re.compile(r"\S")
+_SPACE = re.compile(r"\s")
+
+
+class _CharLength:
+    """Positions measured in characters."""
+
+    def __init__(self, text: str):
+        self.length = len(text)
+
+    def forward(self, start: int, amount: int) -> int:
+        return min(start + amount, self.length)
+
+    def back(self, end: int, amount: int) -> int:
+        return max(end - amount, 0)
+
+
+class _TokenLength:
+    """Positions measured in TOKEN_RE tokens (offsets found by one regex scan)."""
+
+    def __init__(self, text: str):
+        self.length = len(text)
+        self.starts = [match.start() for match in TOKEN_RE.finditer(text)]
+
+    def forward(self, start: int, amount: int) -> int:
+        # Offset where token number `amount` (counting from start) begins
+        index = bisect.bisect_left(self.starts, start) + amount
+        return self.starts[index] if index < len(self.starts) else self.length
+
+    def back(self, end: int, amount: int) -> int:
+        index = bisect.bisect_left(self.starts, end) - amount
+        return self.starts[index] if index > 0 else 0
+
+
+def count_tokens(text: str) -> int:
+    return sum(1 for _ in TOKEN_RE.finditer(text))
+
+
+def _page_at(page_starts: list[tuple[int, int]], pos: int) -> int:
+    """Page number of buffer offset pos, given (offset, page) for each page start."""
+    index = bisect.bisect_right(page_starts, (pos, float("inf"))) - 1
+    return page_starts[max(index, 0)][1]
+
+
+def _skip_space(text: str, pos: int) -> int:
+    match = _NON_SPACE.search(text, pos)
+    return match.start() if match else len(text)
+
+
+class Chunker:
+    """
+    Splits page text into overlapping chunks of at most chunk_size
+    characters (or tokens) in one forward pass. Each chunk ends at the
+    strongest separator in the back half of its window: paragraph, then
+    line, then word, then a hard cut. The next chunk starts overlap units
+    before that end, aligned to a word.
+
+    With across_pages, pages are joined into one stream so a paragraph
+    or table split by a page break becomes one chunk instead of two
+    fragments; chunks then carry "page" (where they start) and
+    "page_end" (where they end). Pages are consumed lazily and only the
+    unfinished tail of the stream is buffered.
+    """
+
+    def __init__(self, chunk_size: int, overlap: int, length_unit: str = "chars", across_pages: bool = False):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("overlap must be >= 0 and smaller than chunk_size")
+        if length_unit not in ("chars", "tokens"):
+            raise ValueError(f"Unknown length unit: {length_unit}")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.length_unit = length_unit
+        self.across_pages = across_pages
+
+    def _length(self, text: str):
+        return _TokenLength(text) if self.length_unit == "tokens" else _CharLength(text)
+
+    def _end(self, text: str, start: int, limit: int) -> int:
+        floor = start + max(int((limit - start) * MIN_FILL), 1)
+        for separator in SEPARATORS:
+            pos = text.rfind(separator, floor, limit)
+            if pos != -1:
+                return pos + len(separator)
+        return limit
+
+    def _next_start(self, text: str, length, start: int, end: int) -> int:
+        if not self.overlap:
+            return end
+        pos = length.back(end, self.overlap)
+        if pos > 0 and not text[pos - 1].isspace():
+            # Don't open the overlap mid-word
+            match = _SPACE.search(text, pos, end)
+            pos = match.end() if match else pos
+        return max(pos, start + 1)
+
+    def spans(self, text: str, final: bool = True) -> tuple[list[tuple[int, int]], int]:
+        """
+        (start, end) offsets of the chunks of text, and the offset where
+        unconsumed text begins. Unless final, stops before the last window
+        that still fits: more text may follow and extend it.
+        """
+        length = self._length(text)
+        spans = []
+        start = _skip_space(text, 0)
+        while start < len(text):
+            limit = length.forward(start, self.chunk_size)
+            if limit >= len(text):
+                if not final:
+                    break
+                spans.append((start, len(text)))
+                start = len(text)
+                break
+            end = self._end(text, start, limit)
+            spans.append((start, end))
+            start = _skip_space(text, self._next_start(text, length, start, end))
+        return spans, start
+
+    def split_text(self, text: str) -> list[str]:
+        spans, _ = self.spans(text)
+        return [chunk for chunk in (text[start:end].strip() for start, end in spans) if chunk]
+
+    def split(self, pages: Iterable[dict]) -> Iterator[dict]:
+        """Chunks {"page", "text"} pages as they arrive."""
+        if not self.across_pages:
+            for page in pages:
+                with metrics.timed("chunk"):
+                    texts = self.split_text(page["text"] or "")
+                for text in texts:
+                    yield {"text": text, "page": page["page"]}
+            return
+
+        buffer = ""
+        page_starts: list[tuple[int, int]] = []  # (offset in buffer, page number)
+        for page in pages:
+            text = (page["text"] or "").strip()
+            if not text:
+                continue
+            if buffer:
+                buffer += PAGE_BREAK
+            page_starts.append((len(buffer), page["page"]))
+            buffer += text
+
+            with metrics.timed("chunk"):
+                spans, rest = self.spans(buffer, final=False)
+                chunks = self._with_pages(buffer, spans, page_starts)
+                # Keep only the unfinished tail (and the pages it covers)
+                page_starts = [(0, _page_at(page_starts, rest))] + [
+                    (offset - rest, number) for offset, number in page_starts if offset > rest
+                ]
+                buffer = buffer[rest:]
+            yield from chunks
+
+        if buffer:
+            with metrics.timed("chunk"):
+                spans, _ = self.spans(buffer)
+                chunks = self._with_pages(buffer, spans, page_starts)
+            yield from chunks
+
+    def _with_pages(self, buffer: str, spans: list[tuple[int, int]], page_starts: list[tuple[int, int]]) -> list[dict]:
+        chunks = []
+        for start, end in spans:
+            # spans start on a non-space character, so only the end is stripped
+            text = buffer[start:end].rstrip()
+            if text:
+                chunks.append({
+                    "text": text,
+                    "page": _page_at(page_starts, start),
+                    "page_end": _page_at(page_starts, start + len(text) - 1)
+                })
+        return chunks
@@ -0,0 +1,187 @@
+import threading
+import logging
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATIONS = ("none", "float16", "int8")
+# Rows scored per step of a first pass (bounds the float32 temporary)
+SCORE_BLOCK = 4096
+
+
+def truncate(vectors, dimensions: int) -> np.ndarray:
+    """
+    Matryoshka prefix: the first `dimensions` values of each row, scaled
+    back to unit length. nomic-embed-text is trained so these prefixes
+    (768 -> 512, 256, 128, 64) stay usable embeddings. dimensions <= 0,
+    or at least the vector size, keeps the vectors whole.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimensions <= 0 or dimensions >= vectors.shape[-1]:
+        return vectors
+    prefix = vectors[..., :dimensions]
+    norms = np.linalg.norm(prefix, axis=-1, keepdims=True)
+    return prefix / np.where(norms == 0, 1.0, norms)
+
+
+def squared_l2(query, vectors) -> np.ndarray:
+    """Exact float32 squared L2 distances (Chroma's default "l2" space)."""
+    query = np.asarray(query, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    diff = vectors - query
+    return np.einsum("ij,ij->i", diff, diff)
+
+
+class QuantizedVectors:
+    """
+    One set of vectors stored as float16, or as int8 with a float32 scale per
+    row (symmetric, scale = max |value| / 127), plus each row's float32
+    squared norm. search() ranks every row by approximate squared L2:
+    |v|^2 - 2 q.v with v decoded block by block.
+    """
+
+    def __init__(self, quantization: str):
+        if quantization not in ("float16", "int8"):
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.quantization = quantization
+        self.ids: list[str] = []
+        self._codes: list[np.ndarray] = []
+        self._scales: list[np.ndarray] = []
+        self._norms: list[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: list[str], vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(ids):
+            return
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            self._codes.append(np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8))
+            self._scales.append(scales.astype(np.float32))
+        else:
+            self._codes.append(vectors.astype(np.float16))
+        self.ids.extend(ids)
+        self._norms.append(np.einsum("ij,ij->i", vectors, vectors))
+
+    def _compact(self):
+        # Added batches are merged into one matrix on the next search
+        if len(self._codes) > 1:
+            self._codes = [np.concatenate(self._codes)]
+            self._norms = [np.concatenate(self._norms)]
+            if self._scales:
+                self._scales = [np.concatenate(self._scales)]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(part.nbytes for parts in (self._codes, self._scales, self._norms) for part in parts)
+
+    def search(self, query, top_n: int) -> list[str]:
+        """Ids of the top_n rows closest to query, best first."""
+        if not self.ids or top_n <= 0:
+            return []
+        self._compact()
+        codes, norms = self._codes[0], self._norms[0]
+        scales = self._scales[0] if self._scales else None
+        query = np.asarray(query, dtype=np.float32)
+
+        distances = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK):
+            block = slice(start, start + SCORE_BLOCK)
+            dots = codes[block].astype(np.float32) @ query
+            if scales is not None:
+                dots *= scales[block]
+            distances[block] = norms[block] - 2 * dots
+
+        top_n = min(top_n, len(distances))
+        best = np.argpartition(distances, top_n - 1)[:top_n]
+        best = best[np.argsort(distances[best], kind="stable")]
+        return [self.ids[i] for i in best]
+
+
+class QuantizedIndex:
+    """
+    Per-session QuantizedVectors used as the first pass of dense search.
+    Like the BM25 index, sessions are loaded lazily from the vector store
+    on first search, kept up to date by store_chunks, and the least
+    recently used ones are dropped beyond max_sessions.
+    """
+
+    def __init__(self, quantization: str, max_sessions: int):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.quantization = quantization
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, QuantizedVectors] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.quantization != "none"
+
+    def is_loaded(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def load_session(self, session_id: str, ids: list[str], vectors):
+        """Build a session's index from all of its stored vectors."""
+        index = QuantizedVectors(self.quantization)
+        if len(ids):
+            index.add(list(ids), vectors)
+        with self._lock:
+            self._sessions[session_id] = index
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def add(self, session_id: str, ids: Iterable[str], vectors):
+        """
+        Index newly stored vectors. Sessions that are not loaded are
+        skipped; so is a batch overwriting ids already indexed (an upsert):
+        the session is dropped and reloaded on its next search instead.
+        """
+        ids = list(ids)
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is None:
+                return
+            if not set(ids).isdisjoint(index.ids):
+                del self._sessions[session_id]
+                return
+            index.add(ids, vectors)
+
+    def drop_session(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def search(self, session_id: str, query, top_n: int) -> Optional[list[str]]:
+        """Candidate ids of a loaded session, best first (None if not loaded)."""
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            return index.search(query, top_n)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "quantization": self.quantization,
+                "sessions": len(self._sessions),
+                "vectors": sum(len(index) for index in self._sessions.values()),
+                "bytes": sum(index.nbytes for index in self._sessions.values())
+            }
+
+
+quantized_index = QuantizedIndex(settings.VECTOR_QUANTIZATION, max_sessions=settings.QUANTIZED_MAX_SESSIONS)
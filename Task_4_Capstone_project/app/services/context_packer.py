@@ -0,0 +1,158 @@
+import logging
+import math
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough Mistral/Llama tokenizer ratio for English text; no tokenizer needed
+CHARS_PER_TOKEN = 4
+# "[Page N] " tag and blank line build_prompt adds around each context
+CONTEXT_OVERHEAD_TOKENS = 6
+# Shortest shared text treated as splitter overlap (not a coincidence)
+MIN_MERGE_OVERLAP = 20
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_order(query_embedding: list[float], embeddings, lambda_mult: float) -> list[int]:
+    """
+    Maximal marginal relevance ordering of candidates: each step picks
+    argmax(lambda * sim(query, c) - (1 - lambda) * max sim(c, picked)),
+    so near-duplicates of what is already picked sink to the end.
+    """
+    vectors = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    # Stored vectors may be a Matryoshka prefix (EMBEDDING_DIMENSIONS)
+    query = _normalize_rows(np.asarray(query_embedding, dtype=np.float32)[:vectors.shape[1]])
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    order = []
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    remaining = np.ones(len(vectors), dtype=bool)
+    for _ in range(len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return order
+
+
+def _overlap(head: str, tail: str) -> int:
+    """
+    Length of the longest suffix of head that is a prefix of tail.
+    Not capped by CHUNK_OVERLAP, whose unit may be tokens: every overlap
+    starts with tail's first MIN_MERGE_OVERLAP characters, so only the
+    places where those occur in head are tried, earliest (longest) first.
+    """
+    limit = min(len(head), len(tail))
+    if limit < MIN_MERGE_OVERLAP:
+        return 0
+    anchor = tail[:MIN_MERGE_OVERLAP]
+    start = head.find(anchor, len(head) - limit)
+    while start != -1:
+        if tail.startswith(head[start:]):
+            return len(head) - start
+        start = head.find(anchor, start + 1)
+    return 0
+
+
+def _merge(existing: str, text: str) -> Optional[str]:
+    """existing + text joined at their shared overlap, or None if they are unrelated."""
+    if text in existing:
+        return existing
+    if existing in text:
+        return text
+    size = _overlap(existing, text)
+    if size:
+        return existing + text[size:]
+    size = _overlap(text, existing)
+    if size:
+        return text + existing[size:]
+    return None
+
+
+def pack_context(query_embedding: list[float], documents: list[str], metadatas: list[dict],
+                 embeddings=None, token_budget: Optional[int] = None,
+                 lambda_mult: Optional[float] = None) -> list[dict]:
+    """
+    Assembles the prompt context from retrieved chunks:
+      1. re-ranks them by MMR over their embeddings (search order if missing),
+      2. merges a chunk into an already packed one from the same document
+         and page when they overlap (splitter overlap or duplicates),
+      3. stops adding chunks that no longer fit the token budget.
+    Returns [{"text", "page", "source"}] in packing order.
+    """
+    token_budget = settings.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    lambda_mult = settings.MMR_LAMBDA if lambda_mult is None else lambda_mult
+
+    usable = (
+        embeddings is not None
+        and len(embeddings) == len(documents) > 1
+        and all(embedding is not None for embedding in embeddings)
+    )
+    if usable:
+        order = mmr_order(query_embedding, embeddings, lambda_mult)
+    else:
+        order = range(len(documents))
+
+    packed: list[dict] = []
+    used = 0
+    for idx in order:
+        text = (documents[idx] or "").strip()
+        if not text:
+            continue
+        meta = metadatas[idx] or {}
+        key = (meta.get("doc_hash") or meta.get("source"), meta.get("page"))
+
+        merged = False
+        for context in packed:
+            if context["key"] != key:
+                continue
+            combined = _merge(context["text"], text)
+            if combined is None:
+                continue
+            extra = estimate_tokens(combined) + CONTEXT_OVERHEAD_TOKENS - context["tokens"]
+            if used + extra <= token_budget:
+                used += extra
+                context["text"] = combined
+                context["tokens"] += extra
+            merged = True
+            break
+        if merged:
+            continue
+
+        tokens = estimate_tokens(text) + CONTEXT_OVERHEAD_TOKENS
+        if used + tokens > token_budget:
+            if packed:
+                continue
+            # Never send an empty context: trim the best chunk to the budget
+            text = text[:max(token_budget - CONTEXT_OVERHEAD_TOKENS, 1) * CHARS_PER_TOKEN]
+            tokens = estimate_tokens(text) + CONTEXT_OVERHEAD_TOKENS
+
+        packed.append({
+            "key": key,
+            "text": text,
+            "page": meta.get("page"),
+            "source": meta.get("source", "uploaded_pdf"),
+            "tokens": tokens
+        })
+        used += tokens
+
+    logger.debug(f"Packed {len(packed)} of {len(documents)} chunks into ~{used} tokens")
+    return [
+        {"text": context["text"], "page": context["page"], "source": context["source"]}
+        for context in packed
+    ]
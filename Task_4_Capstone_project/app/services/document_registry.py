@@ -0,0 +1,240 @@
+import json
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentRegistry:
+    """
+    Persistent registry of processed PDFs, keyed by the SHA-256 of their bytes.
+    Records which sessions already hold the document's chunks in the vector
+    store, so identical re-uploads can skip extraction and embedding.
+
+    Each (session, source filename) also has a current version: the
+    document last uploaded under that name. Documents keep a content hash
+    and chunk count per page, so a changed re-upload only re-embeds the
+    pages that differ from the current version.
+
+    Documents that were password protected are flagged as encrypted: a
+    re-upload of the same bytes must unlock the PDF before it may reuse
+    the stored (decrypted) chunks.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " doc_hash TEXT PRIMARY KEY,"
+                " filename TEXT NOT NULL,"
+                " file_path TEXT,"
+                " chunk_count INTEGER NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_sessions ("
+                " doc_hash TEXT NOT NULL,"
+                " session_id TEXT NOT NULL,"
+                " added_at REAL NOT NULL,"
+                " PRIMARY KEY (doc_hash, session_id))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_versions ("
+                " session_id TEXT NOT NULL,"
+                " source TEXT NOT NULL,"
+                " doc_hash TEXT NOT NULL,"
+                " version INTEGER NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (session_id, source))"
+            )
+            # Registries created before per-page tracking / the encrypted flag lack these columns
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+            for column, column_type in (("page_hashes", "TEXT"), ("page_chunks", "TEXT"), ("encrypted", "INTEGER")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE documents ADD COLUMN {column} {column_type}")
+            self._conn = conn
+        return self._conn
+
+    def get(self, doc_hash: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT * FROM documents WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone()
+            return dict(row) if row else None
+
+    def has_session(self, doc_hash: str, session_id: str) -> bool:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT 1 FROM document_sessions WHERE doc_hash = ? AND session_id = ?",
+                (doc_hash, session_id)
+            ).fetchone()
+            return row is not None
+
+    def register(self, doc_hash: str, filename: str, file_path: Optional[str], chunk_count: int, session_id: str,
+                 page_hashes: Optional[list[str]] = None, page_chunks: Optional[list[int]] = None,
+                 encrypted: bool = False) -> int:
+        """
+        Record a freshly processed document and the session that owns its
+        chunks, and make it the session's current version of filename.
+        Returns that version number.
+        """
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO documents"
+                " (doc_hash, filename, file_path, chunk_count, created_at, page_hashes, page_chunks, encrypted)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_hash, filename, file_path, chunk_count, now,
+                 json.dumps(page_hashes) if page_hashes is not None else None,
+                 json.dumps(page_chunks) if page_chunks is not None else None,
+                 int(encrypted))
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO document_sessions (doc_hash, session_id, added_at) VALUES (?, ?, ?)",
+                (doc_hash, session_id, now)
+            )
+            version = self._set_version(conn, session_id, filename, doc_hash, now)
+            conn.commit()
+            return version
+
+    def _set_version(self, conn: sqlite3.Connection, session_id: str, source: str, doc_hash: str, now: float) -> int:
+        conn.execute(
+            "INSERT INTO document_versions (session_id, source, doc_hash, version, updated_at)"
+            " VALUES (?, ?, ?, 1, ?)"
+            " ON CONFLICT(session_id, source) DO UPDATE SET"
+            " doc_hash = excluded.doc_hash, version = version + 1, updated_at = excluded.updated_at"
+            " WHERE doc_hash != excluded.doc_hash",
+            (session_id, source, doc_hash, now)
+        )
+        return conn.execute(
+            "SELECT version FROM document_versions WHERE session_id = ? AND source = ?", (session_id, source)
+        ).fetchone()["version"]
+
+    def current_version(self, session_id: str, source: str) -> Optional[dict]:
+        """
+        The document a session last uploaded as source: doc_hash, version,
+        and page_hashes / page_chunks (None if recorded without them).
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT v.doc_hash, v.version, d.page_hashes, d.page_chunks"
+                " FROM document_versions v LEFT JOIN documents d ON d.doc_hash = v.doc_hash"
+                " WHERE v.session_id = ? AND v.source = ?",
+                (session_id, source)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "doc_hash": row["doc_hash"],
+            "version": row["version"],
+            "page_hashes": json.loads(row["page_hashes"]) if row["page_hashes"] else None,
+            "page_chunks": json.loads(row["page_chunks"]) if row["page_chunks"] else None
+        }
+
+    def sessions(self, doc_hash: str) -> list[str]:
+        """Sessions holding a copy of the document's chunks, oldest first."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT session_id FROM document_sessions WHERE doc_hash = ? ORDER BY added_at",
+                (doc_hash,)
+            ).fetchall()
+            return [row["session_id"] for row in rows]
+
+    def add_session(self, doc_hash: str, session_id: str, source: Optional[str] = None) -> Optional[int]:
+        """Link a session to a stored document; with source, it becomes that name's current version."""
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            conn.execute(
+                "INSERT OR IGNORE INTO document_sessions (doc_hash, session_id, added_at) VALUES (?, ?, ?)",
+                (doc_hash, session_id, now)
+            )
+            version = self._set_version(conn, session_id, source, doc_hash, now) if source else None
+            conn.commit()
+            return version
+
+    def release(self, doc_hash: str, session_id: str) -> list[str]:
+        """
+        Detach one document from a session (a superseded or rolled back
+        version). Returns the file paths nothing references any more.
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM document_sessions WHERE doc_hash = ? AND session_id = ?", (doc_hash, session_id)
+            )
+            conn.execute(
+                "DELETE FROM document_versions WHERE doc_hash = ? AND session_id = ?", (doc_hash, session_id)
+            )
+            return self._drop_orphans(conn, [doc_hash])
+
+    def remove_session(self, session_id: str) -> list[str]:
+        """
+        Detach a session from all its documents. Documents no other session
+        holds are forgotten; returns the file paths nothing references any more.
+        """
+        with self._lock:
+            conn = self._connect()
+            doc_hashes = [
+                row["doc_hash"] for row in conn.execute(
+                    "SELECT doc_hash FROM document_sessions WHERE session_id = ?", (session_id,)
+                )
+            ]
+            conn.execute("DELETE FROM document_sessions WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM document_versions WHERE session_id = ?", (session_id,))
+            return self._drop_orphans(conn, doc_hashes)
+
+    def _drop_orphans(self, conn: sqlite3.Connection, doc_hashes: list[str]) -> list[str]:
+        # Forgets the documents no session holds any more, then commits
+        orphaned_paths = set()
+        for doc_hash in doc_hashes:
+            if conn.execute(
+                "SELECT 1 FROM document_sessions WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone():
+                continue
+            row = conn.execute("SELECT file_path FROM documents WHERE doc_hash = ?", (doc_hash,)).fetchone()
+            conn.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,))
+            if row and row["file_path"]:
+                orphaned_paths.add(row["file_path"])
+        conn.commit()
+
+        return [
+            path for path in sorted(orphaned_paths)
+            if not conn.execute("SELECT 1 FROM documents WHERE file_path = ?", (path,)).fetchone()
+        ]
+
+    def forget(self, doc_hash: str):
+        """Drop a document whose chunks are no longer in the vector store."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM document_sessions WHERE doc_hash = ?", (doc_hash,))
+            conn.execute("DELETE FROM document_versions WHERE doc_hash = ?", (doc_hash,))
+            conn.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM document_sessions")
+            conn.execute("DELETE FROM document_versions")
+            conn.execute("DELETE FROM documents")
+            conn.commit()
+        logger.info("Document registry cleared")
+
+
+registry = DocumentRegistry(settings.DOCUMENT_REGISTRY_PATH)
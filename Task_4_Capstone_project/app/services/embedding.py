@@ -1,13 +1,207 @@
 import requests
 import logging
 import ollama
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from fastapi import HTTPException, status
+from app.core.config import settings
+from app.services import metrics
+from app.utils.profiler import run_in_threadpool
+from app.utils.singleflight import SingleFlight, AsyncSingleFlight
 
 EMBED_MODEL = "nomic-embed-text"
 MAX_TEXT_LENGTH = 4000 
+DOCUMENT_PREFIX = "search_document: "
+QUERY_PREFIX = "search_query: "
 
 logger = logging.getLogger(__name__)
 
+
+class EmbeddingCache:
+    """
+    Disk-backed, content-addressed cache of embedding vectors.
+    Keys are a SHA-256 of (model, prefix, cleaned text); vectors are stored
+    as packed float32 blobs in SQLite. Least-recently-used rows are evicted
+    once the stored vectors exceed max_bytes.
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._total_bytes = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, prefix: str, text: str, form: str = "unit") -> str:
+        # form: how the vector was post-processed (see _unit), so vectors
+        # cached before normalisation are never mixed with unit ones
+        raw = f"{model}\0{prefix}\0{form}\0{text}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " vector BLOB NOT NULL,"
+                " nbytes INTEGER NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)"
+            )
+            row = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()
+            self._total_bytes = row[0]
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """Return cached vectors for the given keys and refresh their recency."""
+        if not keys:
+            return {}
+
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            unique_keys = list(dict.fromkeys(keys))
+            for i in range(0, len(unique_keys), 500):
+                part = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                conn.commit()
+
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        metrics.EMBEDDING_CACHE_HITS.inc(hits)
+        metrics.EMBEDDING_CACHE_MISSES.inc(len(keys) - hits)
+
+        return found
+
+    def get(self, key: str) -> Optional[list[float]]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: dict[str, list[float]]):
+        """Store vectors, then evict least-recently-used rows over the size limit."""
+        if not items:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            for key, embedding in items.items():
+                blob = array("f", embedding).tobytes()
+                old = conn.execute("SELECT nbytes FROM embeddings WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, nbytes, last_used) VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), now)
+                )
+                self._total_bytes += len(blob) - (old[0] if old else 0)
+
+            self._evict(conn)
+            conn.commit()
+
+    def put(self, key: str, embedding: list[float]):
+        self.put_many({key: embedding})
+
+    def _evict(self, conn: sqlite3.Connection):
+        while self._total_bytes > self.max_bytes:
+            rows = conn.execute(
+                "SELECT key, nbytes FROM embeddings ORDER BY last_used ASC LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for key, nbytes in rows:
+                conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self._total_bytes -= nbytes
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM embeddings")
+            conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+embedding_cache = (
+    EmbeddingCache(settings.EMBED_CACHE_PATH, settings.EMBED_CACHE_MAX_MB * 1024 * 1024)
+    if settings.EMBED_CACHE_ENABLED
+    else None
+)
+
+_async_client: Optional[ollama.AsyncClient] = None
+
+# Identical embedding requests that are in flight at the same time share one
+# Ollama call (e.g. Streamlit reruns firing the same question twice)
+_query_flight = SingleFlight()
+_async_query_flight = AsyncSingleFlight()
+_batch_flight = SingleFlight()
+
+# Shared pool so concurrent uploads together never exceed
+# EMBED_MAX_WORKERS in-flight requests against Ollama.
+_executor = ThreadPoolExecutor(
+    max_workers=max(settings.EMBED_MAX_WORKERS, 1),
+    thread_name_prefix="embed"
+)
+
+def _unit(embedding) -> list[float]:
+    """
+    embedding scaled to unit length. /api/embed returns normalised vectors
+    and /api/embeddings does not; documents and queries come from either
+    depending on EMBED_BATCH_SIZE, so every vector is normalised before it
+    is cached or stored, keeping distances comparable in any HNSW space.
+    """
+    vector = np.asarray(embedding, dtype=np.float64)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
 def _clean_text(text: str) -> str:
     if not text:
         return ""
@@ -16,19 +210,93 @@ def _clean_text(text: str) -> str:
         text = text[:MAX_TEXT_LENGTH]
     return text
 
+def embedding_cache_stats() -> Optional[dict]:
+    """Counters of the embedding cache, or None when it is disabled."""
+    return embedding_cache.stats() if embedding_cache is not None else None
+
+
+def embedding_coalescing_stats() -> dict:
+    """How many embedding requests were merged into an in-flight one."""
+    query_stats = [_query_flight.stats(), _async_query_flight.stats()]
+    return {
+        "query_calls": sum(s["calls"] for s in query_stats),
+        "query_merged": sum(s["merged"] for s in query_stats),
+        "batch_calls": _batch_flight.stats()["calls"],
+        "batch_merged": _batch_flight.stats()["merged"]
+    }
+
+
+def _embed_batch(batch: list[tuple[int, str]]) -> list[list[float]]:
+    """
+    Embed one batch of (original_index, clean_text) pairs.
+    Sends every 'search_document: ' prompt of the batch in a single
+    /api/embed request (or one /api/embeddings call per text when
+    batching is disabled). Failures are reported by chunk index.
+    """
+    first_idx, last_idx = batch[0][0], batch[-1][0]
+    failed_at = f"indices {first_idx}-{last_idx}" if first_idx != last_idx else f"index {first_idx}"
+
+    try:
+        # --- FIX: Add specific prefix for Documents ---
+        # This tells the model: "Store this as a retrieval target"
+        prompts = [f"{DOCUMENT_PREFIX}{text}" for _, text in batch]
+
+        if settings.EMBED_BATCH_SIZE <= 1:
+            vectors = []
+            for (idx, _), prompt_text in zip(batch, prompts):
+                failed_at = f"index {idx}"
+                response = ollama.embeddings(
+                    model=EMBED_MODEL,
+                    prompt=prompt_text
+                )
+                vectors.append(response.get("embedding"))
+        else:
+            response = ollama.embed(
+                model=EMBED_MODEL,
+                input=prompts
+            )
+            vectors = list(response.get("embeddings") or [])
+
+            if len(vectors) != len(batch):
+                raise ValueError(
+                    f"Expected {len(batch)} embeddings, got {len(vectors)}"
+                )
+
+        for (idx, _), embedding in zip(batch, vectors):
+            if not embedding:
+                failed_at = f"index {idx}"
+                raise ValueError("Empty embedding returned")
+
+        return [_unit(embedding) for embedding in vectors]
+
+    except Exception as e:
+        logger.exception(f"Embedding failed at {failed_at}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Embedding generation failed: {str(e)}"
+        )
+
+
+def _embed_batch_shared(batch: list[tuple[int, str]]) -> list[list[float]]:
+    # Concurrent uploads of the same content produce identical batches
+    key = hashlib.sha256("\0".join(text for _, text in batch).encode("utf-8")).hexdigest()
+    return _batch_flight.do(key, lambda: _embed_batch(batch))
+
+
 def embed_texts(texts: list[str]) -> list[list[float]]:
     """
     Generate embeddings for multiple texts (safe, validated, logged)
     Adds 'search_document: ' prefix for Nomic.
+    Texts are sent in batches of settings.EMBED_BATCH_SIZE, with up to
+    settings.EMBED_MAX_WORKERS batches in flight; output order matches input.
     """
-    embeddings = []
-
     if not texts:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No text provided for embedding"
         )
 
+    pending = []
     for idx, text in enumerate(texts):
         clean_text = _clean_text(text)
 
@@ -36,28 +304,35 @@ def embed_texts(texts: list[str]) -> list[list[float]]:
             logger.warning(f"Skipping empty text at index {idx}")
             continue
 
-        try:
-            # --- FIX: Add specific prefix for Documents ---
-            # This tells the model: "Store this as a retrieval target"
-            prompt_text = f"search_document: {clean_text}"
+        pending.append((idx, clean_text))
 
-            response = ollama.embeddings(
-                model=EMBED_MODEL,
-                prompt=prompt_text
-            )
+    # Serve what we can from the cache; only the misses go to Ollama
+    results = {}
+    keys = {}
+    if embedding_cache is not None and pending:
+        keys = {idx: EmbeddingCache.make_key(EMBED_MODEL, DOCUMENT_PREFIX, text) for idx, text in pending}
+        cached = embedding_cache.get_many(list(keys.values()))
+        results = {idx: cached[key] for idx, key in keys.items() if key in cached}
+        pending = [(idx, text) for idx, text in pending if idx not in results]
 
-            embedding = response.get("embedding")
-            if not embedding:
-                raise ValueError("Empty embedding returned")
+    batch_size = max(settings.EMBED_BATCH_SIZE, 1)
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    futures = [_executor.submit(_embed_batch_shared, batch) for batch in batches]
+    try:
+        for batch, future in zip(batches, futures):
+            for (idx, _), embedding in zip(batch, future.result()):
+                results[idx] = embedding
+    except Exception:
+        for future in futures:
+            future.cancel()
+        raise
 
-            embeddings.append(embedding)
+    if embedding_cache is not None and pending:
+        embedding_cache.put_many({keys[idx]: results[idx] for idx, _ in pending})
 
-        except Exception as e:
-            logger.exception(f"Embedding failed at index {idx}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Embedding generation failed: {str(e)}"
-            )
+    # Output order matches input order
+    embeddings = [results[idx] for idx in sorted(results)]
 
     if not embeddings:
         raise HTTPException(
@@ -65,10 +340,34 @@ def embed_texts(texts: list[str]) -> list[list[float]]:
             detail="No valid embeddings could be generated"
         )
 
-    logger.info(f"Generated {len(embeddings)} embeddings")
+    logger.info(f"Generated {len(embeddings)} embeddings in {len(batches)} batch(es)")
     return embeddings
 
 
+def _request_query_embedding(prompt_text: str) -> list[float]:
+    response = ollama.embeddings(
+        model=EMBED_MODEL,
+        prompt=prompt_text
+    )
+
+    embedding = response.get("embedding")
+    if not embedding:
+        raise ValueError("Empty embedding returned")
+    return _unit(embedding)
+
+
+async def _arequest_query_embedding(prompt_text: str) -> list[float]:
+    response = await _get_async_client().embeddings(
+        model=EMBED_MODEL,
+        prompt=prompt_text
+    )
+
+    embedding = response.get("embedding")
+    if not embedding:
+        raise ValueError("Empty embedding returned")
+    return _unit(embedding)
+
+
 def embed_query(text: str) -> list[float]:
     """
     Generate embedding for a single query (safe)
@@ -82,19 +381,68 @@ def embed_query(text: str) -> list[float]:
             detail="Query text is empty"
         )
 
+    cache_key = EmbeddingCache.make_key(EMBED_MODEL, QUERY_PREFIX, clean_text)
+    if embedding_cache is not None:
+        cached = embedding_cache.get(cache_key)
+        if cached:
+            return cached
+
     try:
         # --- FIX: Add specific prefix for Questions ---
         # This tells the model: "Align this with the document vector space"
-        prompt_text = f"search_query: {clean_text}"
+        prompt_text = f"{QUERY_PREFIX}{clean_text}"
+
+        embedding = _query_flight.do(cache_key, lambda: _request_query_embedding(prompt_text))
+
+        if embedding_cache is not None:
+            embedding_cache.put(cache_key, embedding)
+
+        return embedding
+
+    except Exception as e:
+        logger.exception("Query embedding failed")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Query embedding failed: {str(e)}"
+        )
+
+
+def _get_async_client() -> ollama.AsyncClient:
+    # Created on first use so importing the module needs no running loop
+    global _async_client
+    if _async_client is None:
+        _async_client = ollama.AsyncClient()
+    return _async_client
+
+
+async def aembed_query(text: str) -> list[float]:
+    """
+    Async variant of embed_query for the async query path.
+    Uses the Ollama AsyncClient, so the event loop is never blocked; the
+    embedding cache (SQLite, behind a lock ingestion threads also take)
+    is read and written from the threadpool for the same reason.
+    """
+    clean_text = _clean_text(text)
+
+    if not clean_text:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Query text is empty"
+        )
 
-        response = ollama.embeddings(
-            model=EMBED_MODEL,
-            prompt=prompt_text
+    cache_key = EmbeddingCache.make_key(EMBED_MODEL, QUERY_PREFIX, clean_text)
+    if embedding_cache is not None:
+        cached = await run_in_threadpool(embedding_cache.get, cache_key)
+        if cached:
+            return cached
+
+    try:
+        embedding = await _async_query_flight.do(
+            cache_key, lambda: _arequest_query_embedding(f"{QUERY_PREFIX}{clean_text}")
         )
 
-        embedding = response.get("embedding")
-        if not embedding:
-            raise ValueError("Empty embedding returned")
+        if embedding_cache is not None:
+            await run_in_threadpool(embedding_cache.put, cache_key, embedding)
 
         return embedding
 
@@ -103,4 +451,4 @@ def embed_query(text: str) -> list[float]:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Query embedding failed: {str(e)}"
-        )
\ No newline at end of file
+        )
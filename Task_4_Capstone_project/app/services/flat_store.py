@@ -0,0 +1,337 @@
+import json
+import os
+import shutil
+import threading
+import logging
+import weakref
+from pathlib import Path
+from typing import Optional
+
+import chromadb
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.json"
+JOURNAL_FILE = "chunks.jsonl"
+# Rows allocated up front; the matrix file doubles when it fills up
+INITIAL_CAPACITY = 64
+# The journal is folded into chunks.json once it holds this many records
+# and at least as many as there are chunks, so rewrites stay amortized O(1)
+MIN_JOURNAL_RECORDS = 1024
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def _matches(metadata: dict, where: Optional[dict]) -> bool:
+    # The subset of Chroma's where syntax vector_store uses: equality and $and
+    if not where:
+        return True
+    if "$and" in where:
+        return all(_matches(metadata, clause) for clause in where["$and"])
+    return all(metadata.get(key) == value for key, value in where.items())
+
+
+class FlatCollection:
+    """
+    One partition's chunks for exact (brute-force) search: embeddings as a
+    contiguous, unit-length float32 matrix in a memory-mapped .npy file,
+    texts and metadata in a JSON snapshot beside it. A query is one
+    matrix-vector product plus argpartition, with no graph to walk and no
+    SQLite metadata filter; pages of the matrix are read through the OS
+    page cache, so an idle partition costs no process memory.
+
+    Writes append one JSON line per changed row to a journal, replayed
+    over the snapshot on open, instead of rewriting the snapshot. Live
+    rows are never written to: a new or replaced chunk's vector goes to a
+    free row first, and its journal record (which also frees the row it
+    replaces) is what makes it live. A crash at any point therefore
+    leaves every chunk with its own text and vector, old or new. Deleted
+    rows are only marked free and reused by later writes. A torn last
+    line is ignored.
+
+    Several instances for one directory would keep diverging free lists
+    and corrupt each other's rows; open collections through FlatClient,
+    which hands out one instance per directory.
+
+    Implements the part of Chroma's Collection API that vector_store
+    uses (add, upsert, get, update, delete, query, count) with the same
+    argument and result shapes. Distances are squared L2 between unit
+    vectors (2 - 2 cos), what Chroma's default space returns for
+    normalized embeddings.
+    """
+
+    def __init__(self, name: str, path: Path):
+        self.name = name
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.memmap] = None
+        # Indexed by matrix row; None marks a free (deleted) row
+        self.ids: list[Optional[str]] = []
+        self.documents: list[Optional[str]] = []
+        self.metadatas: list[Optional[dict]] = []
+        self._rows: dict[str, int] = {}
+        self._free: list[int] = []
+        self._journal_records = 0
+        self._load()
+
+    # --- persistence ---
+
+    def _load(self):
+        chunks_file = self.path / CHUNKS_FILE
+        if chunks_file.exists():
+            data = json.loads(chunks_file.read_text(encoding="utf-8"))
+            self.ids, self.documents, self.metadatas = data["ids"], data["documents"], data["metadatas"]
+        journal = self.path / JOURNAL_FILE
+        if journal.exists():
+            with journal.open("r+b") as lines:
+                replayed = 0
+                for line in lines:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated record")
+                        record = json.loads(line)
+                    except ValueError:
+                        # Cut it off so that later appends start on a clean line
+                        logger.warning(f"Dropping torn journal record at byte {replayed} of {journal}")
+                        lines.truncate(replayed)
+                        break
+                    self._apply(record)
+                    self._journal_records += 1
+                    replayed += len(line)
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids) if chunk_id is not None}
+        self._free = [row for row, chunk_id in enumerate(self.ids) if chunk_id is None]
+        if (self.path / VECTORS_FILE).exists():
+            self._vectors = np.lib.format.open_memmap(self.path / VECTORS_FILE, mode="r+")
+
+    def _apply(self, record: dict):
+        # Replaying a record twice gives the same state, so a crash between
+        # writing a snapshot and emptying the journal is harmless
+        row = record.get("row")
+        if record["op"] == "put":
+            missing = row + 1 - len(self.ids)
+            if missing > 0:
+                self.ids.extend([None] * missing)
+                self.documents.extend([None] * missing)
+                self.metadatas.extend([None] * missing)
+            self.ids[row], self.documents[row], self.metadatas[row] = (
+                record["id"], record["document"], record["metadata"]
+            )
+            replaced = record.get("replaces")
+            if replaced is not None and self.ids[replaced] == record["id"]:
+                self.ids[replaced] = self.documents[replaced] = self.metadatas[replaced] = None
+        elif record["op"] == "update":
+            if self.metadatas[row] is not None:
+                self.metadatas[row].update(record["metadata"])
+        elif record["op"] == "delete":
+            for row in record["rows"]:
+                self.ids[row] = self.documents[row] = self.metadatas[row] = None
+
+    def _journal(self, records: list[dict]):
+        if not records:
+            return
+        # Vectors first: a journaled row must find its vector on disk
+        if self._vectors is not None:
+            self._vectors.flush()
+        if not (self.path / CHUNKS_FILE).exists():
+            self._save()
+            return
+        with (self.path / JOURNAL_FILE).open("a", encoding="utf-8") as journal:
+            journal.write("".join(json.dumps(record) + "\n" for record in records))
+        self._journal_records += len(records)
+        if self._journal_records >= max(MIN_JOURNAL_RECORDS, len(self._rows)):
+            self._save()
+
+    def _save(self):
+        """Writes the full snapshot and empties the journal it supersedes."""
+        temp = self.path / f"{CHUNKS_FILE}.tmp"
+        temp.write_text(json.dumps({
+            "ids": self.ids, "documents": self.documents, "metadatas": self.metadatas
+        }), encoding="utf-8")
+        os.replace(temp, self.path / CHUNKS_FILE)
+        (self.path / JOURNAL_FILE).unlink(missing_ok=True)
+        self._journal_records = 0
+
+    def _reserve(self, rows: int, dimensions: int):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if self._vectors is not None and self._vectors.shape[1] != dimensions:
+            raise ValueError(
+                f"Embedding dimension {dimensions} does not match collection dimensionality {self._vectors.shape[1]}"
+            )
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, INITIAL_CAPACITY)
+        temp = self.path / f"{VECTORS_FILE}.tmp"
+        grown = np.lib.format.open_memmap(temp, mode="w+", dtype=np.float32, shape=(capacity, dimensions))
+        if self._vectors is not None:
+            grown[:len(self.ids)] = self._vectors[:len(self.ids)]
+        grown.flush()
+        # Release both mappings before the rename (required on Windows)
+        self._vectors = None
+        del grown
+        os.replace(temp, self.path / VECTORS_FILE)
+        self._vectors = np.lib.format.open_memmap(self.path / VECTORS_FILE, mode="r+")
+
+    # --- Chroma Collection API ---
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, replace=False)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, replace=True)
+
+    def _write(self, ids, embeddings, documents, metadatas, replace: bool):
+        vectors = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [{}] * len(ids)
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            writes = len(ids) if replace else len({chunk_id for chunk_id in ids if chunk_id not in self._rows})
+            self._reserve(len(self.ids) + max(writes - len(self._free), 0), vectors.shape[1])
+            records = []
+            replaced_rows = []
+            for i, chunk_id in enumerate(ids):
+                previous = self._rows.get(chunk_id)
+                if previous is not None and not replace:
+                    # Like Chroma, adding an existing id leaves it untouched
+                    continue
+                row = self._free.pop() if self._free else len(self.ids)
+                self._vectors[row] = vectors[i]
+                self._rows[chunk_id] = row
+                record = {
+                    "op": "put", "row": row, "id": chunk_id,
+                    "document": documents[i], "metadata": dict(metadatas[i] or {})
+                }
+                if previous is not None:
+                    record["replaces"] = previous
+                    replaced_rows.append(previous)
+                self._apply(record)
+                records.append(record)
+            self._journal(records)
+            # Only reusable once the records that replaced them are on disk
+            self._free.extend(reversed(replaced_rows))
+
+    def _select(self, ids=None, where=None) -> list[int]:
+        if ids is not None:
+            rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+        else:
+            rows = [row for row, chunk_id in enumerate(self.ids) if chunk_id is not None]
+        return [row for row in rows if _matches(self.metadatas[row], where)]
+
+    def _result(self, rows: list[int], include) -> dict:
+        return {
+            "ids": [self.ids[row] for row in rows],
+            "documents": [self.documents[row] for row in rows] if "documents" in include else None,
+            "metadatas": [self.metadatas[row] for row in rows] if "metadatas" in include else None,
+            "embeddings": np.array(self._vectors[rows]) if "embeddings" in include and rows else (
+                np.empty((0, 0), dtype=np.float32) if "embeddings" in include else None
+            )
+        }
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")) -> dict:
+        with self._lock:
+            return self._result(self._select(ids, where), include)
+
+    def update(self, ids, metadatas=None):
+        with self._lock:
+            records = []
+            for chunk_id, metadata in zip(ids, metadatas or []):
+                row = self._rows.get(chunk_id)
+                if row is not None and metadata:
+                    record = {"op": "update", "row": row, "metadata": dict(metadata)}
+                    self._apply(record)
+                    records.append(record)
+            self._journal(records)
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            drop = sorted(set(self._select(ids, where)))
+            if not drop:
+                return
+            for row in drop:
+                del self._rows[self.ids[row]]
+            # The rows stay in the matrix until an add reuses them
+            record = {"op": "delete", "rows": drop}
+            self._apply(record)
+            self._free.extend(reversed(drop))
+            self._journal([record])
+
+    def query(self, query_embeddings, n_results: int = 10, where=None,
+              include=("documents", "metadatas", "distances")) -> dict:
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        with self._lock:
+            subset = bool(where or self._free)
+            candidates = np.asarray(self._select(None, where) if subset else range(len(self.ids)), dtype=np.int64)
+            matrix = self._vectors[:len(self.ids)] if self._vectors is not None else None
+            for query in _normalize_rows(np.asarray(query_embeddings, dtype=np.float32)):
+                if matrix is None or not len(candidates):
+                    rows, distances = [], []
+                else:
+                    similarity = matrix[candidates] @ query if subset else matrix @ query
+                    top = min(n_results, len(similarity))
+                    best = np.argpartition(-similarity, top - 1)[:top]
+                    best = best[np.argsort(-similarity[best], kind="stable")]
+                    rows = candidates[best].tolist()
+                    distances = np.maximum(2 - 2 * similarity[best], 0).tolist()
+                found = self._result(rows, include)
+                results["ids"].append(found["ids"])
+                results["documents"].append(found["documents"])
+                results["metadatas"].append(found["metadatas"])
+                results["distances"].append(distances)
+                results["embeddings"].append(found["embeddings"])
+        return {key: (value if key == "ids" or key in include else None) for key, value in results.items()}
+
+
+class FlatClient:
+    """
+    Directory of FlatCollections (one subdirectory each) with the
+    collection-management calls of a Chroma client, so PartitionManager
+    can open, close and drop flat partitions exactly like Chroma ones.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        # One instance per collection while anything holds it, so a handle
+        # PartitionManager closed but a request still uses is the one a
+        # reopen gets back; unreferenced ones are freed like closed handles
+        self._open: weakref.WeakValueDictionary[str, FlatCollection] = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def _collection(self, name: str) -> FlatCollection:
+        with self._lock:
+            collection = self._open.get(name)
+            if collection is None:
+                collection = FlatCollection(name, self.path / name)
+                self._open[name] = collection
+            return collection
+
+    def get_or_create_collection(self, name: str, configuration: Optional[dict] = None) -> FlatCollection:
+        # configuration (HNSW parameters) has no meaning for exact search
+        return self._collection(name)
+
+    def get_collection(self, name: str) -> FlatCollection:
+        if not (self.path / name / CHUNKS_FILE).exists():
+            raise chromadb.errors.NotFoundError(f"Collection {name} does not exist")
+        return self._collection(name)
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            if not (self.path / name).exists():
+                raise chromadb.errors.NotFoundError(f"Collection {name} does not exist")
+            self._open.pop(name, None)
+            shutil.rmtree(self.path / name)
+
+    def list_collections(self) -> list[FlatCollection]:
+        return [
+            self._collection(entry.name)
+            for entry in sorted(self.path.iterdir())
+            if (entry / CHUNKS_FILE).exists()
+        ]
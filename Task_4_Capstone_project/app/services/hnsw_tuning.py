@@ -0,0 +1,224 @@
+"""
+HNSW autotuner for the Chroma collections.
+
+Takes a sample of stored embeddings (or an .npz with "documents" and
+optional "queries", e.g. from benchmarks/bench_compact.py --cache), builds
+a scratch collection for every space x M x ef_construction in the grid,
+and for every ef_search measures recall@k against exact search and query
+latency. The recommendation is the fastest setting (p95) whose recall
+reaches --target-recall, or the most accurate one if none does.
+
+Without queries, --queries stored vectors are held out of the index and
+used as queries (perturbed slightly, like a question close to a chunk).
+
+--apply sets the recommended ef_search on every stored collection, where
+Chroma persists it. Collections created later are built from the HNSW_*
+settings, so the recommendation is also printed as .env lines to copy
+(space, M and ef_construction can only take effect that way).
+
+Usage (from Task_4_Capstone_project):
+    python -m app.services.hnsw_tuning
+    python -m app.services.hnsw_tuning --sample 5000 --k 10 --target-recall 0.98 --apply
+    python -m app.services.hnsw_tuning --npz vectors.npz --m 8,16,32 --ef-search 10,20,50,100
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import chromadb
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def stored_sample(limit: int) -> np.ndarray:
+    """Up to limit embeddings from the global collection and the partitions."""
+    from app.services import vector_store
+
+    parts = []
+    remaining = limit
+    for stored in vector_store.client.list_collections():
+        if remaining <= 0:
+            break
+        if stored.name != settings.COLLECTION_NAME and not stored.name.startswith(vector_store.partitions.prefix):
+            continue
+        found = stored.get(limit=remaining, include=["embeddings"])
+        if found["ids"]:
+            parts.append(np.asarray(found["embeddings"], dtype=np.float32))
+            remaining -= len(found["ids"])
+    if not parts:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.concatenate(parts)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, space: str) -> list[set]:
+    """Ids (row numbers) of the true k nearest vectors of each query in space."""
+    if space == "l2":
+        distances = (vectors ** 2).sum(axis=1)[None, :] - 2 * queries @ vectors.T
+    elif space == "cosine":
+        unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        distances = -(queries @ unit.T)
+    elif space == "ip":
+        distances = -(queries @ vectors.T)
+    else:
+        raise ValueError(f"Unknown space: {space}")
+    best = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in best]
+
+
+def _percentile(samples_ms: list[float], q: float) -> float:
+    return round(float(np.percentile(samples_ms, q)), 3)
+
+
+def evaluate(vectors: np.ndarray, queries: np.ndarray, k: int, spaces: list[str], ms: list[int],
+             ef_constructions: list[int], ef_searches: list[int], workdir: Path) -> list[dict]:
+    """recall@k and latency of every grid point, built in scratch collections under workdir."""
+    client = chromadb.PersistentClient(path=str(workdir))
+    batch_size = client.get_max_batch_size()
+    ids = [str(i) for i in range(len(vectors))]
+    results = []
+
+    for space in spaces:
+        truth = exact_top_k(vectors, queries, k, space)
+        for m in ms:
+            for ef_construction in ef_constructions:
+                name = f"tune-{space}-{m}-{ef_construction}"
+                scratch = client.create_collection(name=name, configuration={
+                    "hnsw": {"space": space, "max_neighbors": m, "ef_construction": ef_construction}
+                })
+                started = time.perf_counter()
+                for start in range(0, len(ids), batch_size):
+                    scratch.add(ids=ids[start:start + batch_size], embeddings=vectors[start:start + batch_size])
+                build_seconds = time.perf_counter() - started
+
+                for ef_search in ef_searches:
+                    scratch.modify(configuration={"hnsw": {"ef_search": ef_search}})
+                    scratch = client.get_collection(name=name)
+                    latencies = []
+                    hits = 0
+                    for query, expected in zip(queries, truth):
+                        started = time.perf_counter()
+                        found = scratch.query(query_embeddings=[query], n_results=k, include=[])
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        hits += len({int(chunk_id) for chunk_id in found["ids"][0]} & expected)
+                    results.append({
+                        "space": space,
+                        "m": m,
+                        "ef_construction": ef_construction,
+                        "ef_search": ef_search,
+                        "recall_at_k": round(hits / (k * len(queries)), 4),
+                        "p50_ms": _percentile(latencies, 50),
+                        "p95_ms": _percentile(latencies, 95),
+                        "build_seconds": round(build_seconds, 3)
+                    })
+                    logger.info(f"{results[-1]}")
+                client.delete_collection(name=name)
+    return results
+
+
+def recommend(results: list[dict], target_recall: float) -> Optional[dict]:
+    """Fastest (p95, then build time) result reaching target_recall, else the most accurate."""
+    if not results:
+        return None
+    good = [result for result in results if result["recall_at_k"] >= target_recall]
+    if good:
+        return min(good, key=lambda result: (result["p95_ms"], result["build_seconds"]))
+    return max(results, key=lambda result: (result["recall_at_k"], -result["p95_ms"]))
+
+
+def env_lines(best: dict) -> list[str]:
+    return [
+        f'HNSW_SPACE="{best["space"]}"',
+        f"HNSW_M={best['m']}",
+        f"HNSW_EF_CONSTRUCTION={best['ef_construction']}",
+        f"HNSW_EF_SEARCH={best['ef_search']}"
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--npz", type=Path, help="embeddings to tune on instead of the stored ones")
+    parser.add_argument("--sample", type=int, default=5000, help="stored embeddings to index")
+    parser.add_argument("--queries", type=int, default=200, help="held-out queries when none are given")
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_TOP_K)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--space", default=settings.HNSW_SPACE, help="comma-separated spaces to try")
+    parser.add_argument("--m", type=int_list, default=[8, 16, 32])
+    parser.add_argument("--ef-construction", type=int_list, default=[100, 200])
+    parser.add_argument("--ef-search", type=int_list, default=[10, 20, 40, 80, 160])
+    parser.add_argument("--apply", action="store_true", help="set the recommended ef_search on stored collections")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="also write the JSON report here")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+    if settings.VECTOR_BACKEND != "chroma" and not args.npz:
+        sys.exit("VECTOR_BACKEND is not chroma: the flat backend searches exactly and has nothing to tune")
+
+    rng = np.random.default_rng(args.seed)
+    queries = None
+    if args.npz:
+        data = np.load(args.npz)
+        vectors = np.asarray(data["documents"], dtype=np.float32)
+        if "queries" in data:
+            queries = np.asarray(data["queries"], dtype=np.float32)
+    else:
+        vectors = stored_sample(args.sample + args.queries)
+
+    if queries is None:
+        if len(vectors) <= args.queries:
+            sys.exit(f"Need more than {args.queries} stored embeddings to hold out queries, found {len(vectors)}")
+        order = rng.permutation(len(vectors))
+        held_out, vectors = vectors[order[:args.queries]], vectors[order[args.queries:]]
+        queries = held_out + rng.normal(0, 0.01, held_out.shape).astype(np.float32)
+
+    k = min(args.k, len(vectors))
+    with tempfile.TemporaryDirectory(prefix="hnsw-tune-") as workdir:
+        results = evaluate(
+            vectors, queries, k, args.space.split(","), args.m,
+            args.ef_construction, args.ef_search, Path(workdir)
+        )
+    best = recommend(results, args.target_recall)
+
+    report = {
+        "config": {
+            "vectors": len(vectors),
+            "queries": len(queries),
+            "k": k,
+            "target_recall": args.target_recall
+        },
+        "current": {
+            "space": settings.HNSW_SPACE,
+            "m": settings.HNSW_M,
+            "ef_construction": settings.HNSW_EF_CONSTRUCTION,
+            "ef_search": settings.HNSW_EF_SEARCH
+        },
+        "recommended": best,
+        "env": env_lines(best),
+        "results": results
+    }
+    if args.apply:
+        from app.services import vector_store
+        report["applied_ef_search_to"] = vector_store.set_ef_search(best["ef_search"])
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import contextvars
+import hashlib
+import logging
+import queue
+import threading
+from typing import BinaryIO, Callable, Iterator, Optional
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.services.pdf_service import open_pdf, extract_pages, iter_chunks
+from app.services.embedding import embed_texts
+from app.services.vector_store import (
+    store_chunks, copy_document_to_session, delete_document, retag_chunks, document_key, document_chunk_ids
+)
+from app.services import document_registry
+from app.services.sessions import remove_upload
+from app.services.answer_cache import answer_cache
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# progress(stage, percent) is called as the pipeline advances
+ProgressCallback = Callable[[str, int], None]
+
+
+# Sentinel the producer thread sends after the last batch
+_DONE = object()
+
+
+def _noop_progress(stage: str, percent: int):
+    pass
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _retire_version(previous: Optional[dict], doc_hash: str, session_id: str):
+    """
+    Remove whatever is left in the vector store of the session's previous
+    version of a document, and the registry link (and file) only it used.
+    """
+    if not previous or previous["doc_hash"] == doc_hash:
+        return
+    delete_document(previous["doc_hash"], session_id)
+    for path in document_registry.registry.release(previous["doc_hash"], session_id):
+        remove_upload(path)
+
+
+def reuse_existing_document(doc_hash: str, session_id: str, filename: str, content: BinaryIO,
+                            password: Optional[str] = None) -> Optional[dict]:
+    """
+    Dedup check for a freshly uploaded file.
+    Returns an upload result if the same bytes were processed before
+    (attaching the stored vectors to this session if needed), else None.
+    A copy replaces the session's previous version of filename.
+    An encrypted document is only reused once password unlocks content;
+    otherwise this raises the same error as processing it would.
+    """
+    known = document_registry.registry.get(doc_hash)
+    if not known:
+        return None
+
+    if known["encrypted"]:
+        content.seek(0)
+        open_pdf(content, password=password)
+
+    if document_registry.registry.has_session(doc_hash, session_id):
+        logger.info(f"{filename} already indexed for session {session_id}, skipping")
+        return {
+            "status": "success",
+            "message": "Document already processed for this session",
+            "chunks_stored": 0,
+            "filename": filename,
+            "deduplicated": True
+        }
+
+    previous = document_registry.registry.current_version(session_id, filename)
+    copied = copy_document_to_session(
+        doc_hash, session_id, document_registry.registry.sessions(doc_hash),
+        doc_key=document_key(session_id, filename)
+    )
+    if copied:
+        version = document_registry.registry.add_session(doc_hash, session_id, source=filename)
+        _retire_version(previous, doc_hash, session_id)
+        answer_cache.invalidate_session(session_id)
+        return {
+            "status": "success",
+            "message": "Document reused from a previous upload",
+            "chunks_stored": copied,
+            "filename": filename,
+            "deduplicated": True,
+            "version": version
+        }
+
+    # Registry entry is stale (chunks were removed); process it again
+    document_registry.registry.forget(doc_hash)
+    return None
+
+
+def _put(out_queue: queue.Queue, item, stop: threading.Event) -> bool:
+    # Blocks while the queue is full, but gives up once the consumer has stopped
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _changed_pages(pages: Iterator[dict], page_hashes: list[str], previous_hashes: list[str]) -> Iterator[dict]:
+    """
+    Records the content hash of every page into page_hashes and passes on
+    only the pages whose hash differs from the same page of the previous
+    version (all of them when previous_hashes is empty).
+    """
+    try:
+        for page in pages:
+            digest = page_hash(page["text"] or "")
+            page_hashes.append(digest)
+            number = page["page"]
+            if number <= len(previous_hashes) and previous_hashes[number - 1] == digest:
+                continue
+            yield page
+    finally:
+        pages.close()
+
+
+def _produce_batches(pages: Iterator[dict], out_queue: queue.Queue, stop: threading.Event, batch_size: int,
+                     page_chunks: dict):
+    """
+    Producer thread: parses pages and chunks them as they come, handing
+    fixed-size chunk batches to the consumer through a bounded queue.
+    Each chunk gets its "chunk_index" on its page; page_chunks collects
+    the number of chunks per page.
+    """
+    try:
+        batch = []
+        for chunk in iter_chunks(pages):
+            chunk["chunk_index"] = page_chunks.get(chunk["page"], 0)
+            page_chunks[chunk["page"]] = chunk["chunk_index"] + 1
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                if not _put(out_queue, batch, stop):
+                    return
+                batch = []
+
+        if batch and not _put(out_queue, batch, stop):
+            return
+        _put(out_queue, _DONE, stop)
+
+    except Exception as e:
+        _put(out_queue, e, stop)
+
+    finally:
+        # Shuts down the extraction process pool if we stopped early
+        pages.close()
+
+
+def ingest_document(
+    file_path: str,
+    filename: str,
+    session_id: str,
+    doc_hash: str,
+    password: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+    content: Optional[BinaryIO] = None
+) -> dict:
+    """
+    Runs the blocking extract -> chunk -> embed -> store pipeline for one PDF.
+    Pages are chunked as they are parsed (in a producer thread) while earlier
+    chunks are embedded and flushed to the vector store in batches of
+    settings.INGEST_BATCH_SIZE, so memory stays flat regardless of page count.
+    If anything fails after chunks were written, they are removed again so
+    the collection never holds half a document.
+    content (the uploaded bytes, when still in memory) is parsed instead
+    of reading file_path back from disk.
+
+    A file uploaded under a name the session already holds is a new
+    version of that document: only pages whose text changed are chunked,
+    embedded and stored (under ids of the new version, beside the old
+    chunks), unchanged pages keep their vectors and are moved over to the
+    new version, and once it is registered the old version's remaining
+    chunks (changed and removed pages) are deleted. Until then a failure
+    leaves the previous version as it was. With CHUNK_ACROSS_PAGES chunks
+    are not tied to one page, so every page is re-embedded.
+    """
+    progress = progress or _noop_progress
+    stored = False
+    registered = False
+    retagged: list[str] = []
+    stop = threading.Event()
+    doc_key = document_key(session_id, filename)
+    previous = document_registry.registry.current_version(session_id, filename)
+    if previous and previous["doc_hash"] == doc_hash:
+        previous = None
+    incremental = bool(
+        previous and previous["page_hashes"] and previous["page_chunks"] is not None
+        and not settings.CHUNK_ACROSS_PAGES
+    )
+    previous_hashes = previous["page_hashes"] if incremental else []
+
+    try:
+        # 1. Open & unlock the PDF (Pass Password)
+        progress("extracting", 0)
+        source = content if content is not None else file_path
+        reader = open_pdf(source, password=password)
+        encrypted = bool(reader.is_encrypted)
+        total_pages = max(len(reader.pages), 1)
+
+        page_hashes: list[str] = []
+        page_chunks: dict[int, int] = {}
+        batches: queue.Queue = queue.Queue(maxsize=max(settings.INGEST_QUEUE_DEPTH, 1))
+        # Runs in a copy of this context so its stage timings reach the request
+        producer = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(
+                _produce_batches,
+                _changed_pages(extract_pages(source, reader, password=password), page_hashes, previous_hashes),
+                batches,
+                stop,
+                max(settings.INGEST_BATCH_SIZE, 1),
+                page_chunks
+            ),
+            name="ingest-parse",
+            daemon=True
+        )
+        producer.start()
+
+        chunk_count = 0
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+
+            # 2. Generate Embeddings for this batch
+            progress("embedding", _percent(batch[-1]["page"], total_pages))
+            with metrics.timed("embed"):
+                embeddings = embed_texts([chunk["text"] for chunk in batch])
+
+            if not embeddings or len(embeddings) != len(batch):
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Embedding generation failed"
+                )
+
+            # 3. Store in Vector DB (Pass Session ID)
+            progress("storing", _percent(batch[-1]["page"], total_pages))
+            stored = True
+            with metrics.timed("store"):
+                store_chunks(batch, embeddings, session_id=session_id, doc_hash=doc_hash, doc_key=doc_key)
+            metrics.CHUNKS_STORED.inc(len(batch))
+            chunk_count += len(batch)
+
+        # Pages the producer skipped keep the chunks of the previous version
+        unchanged = [
+            number for number, digest in enumerate(page_hashes, start=1)
+            if number <= len(previous_hashes) and previous_hashes[number - 1] == digest
+        ]
+        for number in unchanged:
+            page_chunks[number] = previous["page_chunks"][number - 1]
+        per_page = [page_chunks.get(number, 0) for number in range(1, len(page_hashes) + 1)]
+
+        if not sum(per_page):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="No text could be extracted from the PDF"
+            )
+
+        if previous and unchanged:
+            stored = True
+            retagged = document_chunk_ids(previous["doc_hash"], session_id, pages=unchanged)
+            retag_chunks(retagged, session_id, doc_hash)
+
+        version = document_registry.registry.register(
+            doc_hash, filename, file_path, sum(per_page), session_id,
+            page_hashes=page_hashes, page_chunks=per_page, encrypted=encrypted
+        )
+        # The new version is complete; only now drop what is left of the old one
+        registered = True
+        _retire_version(previous, doc_hash, session_id)
+        # Cached answers were generated without this document
+        answer_cache.invalidate_session(session_id)
+
+        logger.info(f"Stored {chunk_count} chunks from {filename} (version {version})")
+        progress("completed", 100)
+
+        result = {
+            "status": "success",
+            "message": "Document processed successfully",
+            "chunks_stored": chunk_count,
+            "filename": filename,
+            "version": version
+        }
+        if previous:
+            result["pages_unchanged"] = len(unchanged)
+            result["pages_reindexed"] = len(page_hashes) - len(unchanged)
+            result["pages_removed"] = max(len(previous["page_hashes"] or []) - len(page_hashes), 0)
+        return result
+
+    except Exception:
+        if stored and not registered:
+            logger.warning(f"Rolling back partially stored chunks of {filename}")
+            try:
+                # Hand the unchanged pages back before the new version's chunks go
+                if retagged:
+                    retag_chunks(retagged, session_id, previous["doc_hash"])
+                delete_document(doc_hash, session_id)
+                document_registry.registry.release(doc_hash, session_id)
+            except Exception:
+                logger.exception("Rollback failed")
+        raise
+
+    finally:
+        stop.set()
+
+
+def _percent(page: int, total_pages: int) -> int:
+    # 0-95% tracks pages processed; the last 5% is bookkeeping
+    return min(95, int(95 * page / total_pages))
@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from fastapi import HTTPException, status
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are kept this long so clients can still poll their result
+JOB_RETENTION_SECONDS = 3600
+
+
+class JobManager:
+    """
+    Runs ingestion jobs on a bounded background thread pool and tracks
+    their stage and percent complete for the /api/jobs endpoint.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(max_workers, 1),
+            thread_name_prefix="ingest"
+        )
+        self._jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[..., dict], *, filename: str, session_id: str, **kwargs) -> str:
+        """
+        Queue func(**kwargs, progress=...) and return the new job id.
+        Raises 429 when too many jobs are already waiting or running.
+        """
+        with self._lock:
+            self._prune()
+            active = sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+            if active >= self.max_pending:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many documents are being processed. Please retry shortly."
+                )
+
+            job_id = str(uuid.uuid4())
+            now = time.time()
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "stage": "queued",
+                "progress": 0,
+                "filename": filename,
+                "session_id": session_id,
+                "result": None,
+                "error": None,
+                "error_code": None,
+                "created_at": now,
+                "updated_at": now
+            }
+
+        kwargs.update(filename=filename, session_id=session_id)
+        self._executor.submit(self._run, job_id, func, kwargs)
+        logger.info(f"Queued ingestion job {job_id} for {filename}")
+        return job_id
+
+    def _run(self, job_id: str, func: Callable[..., dict], kwargs: dict):
+        self._update(job_id, status="running", stage="starting")
+
+        def progress(stage: str, percent: int):
+            self._update(job_id, stage=stage, progress=percent)
+
+        try:
+            result = func(**kwargs, progress=progress)
+            self._update(job_id, status="completed", stage="completed", progress=100, result=result)
+
+        except HTTPException as e:
+            self._update(job_id, status="failed", error=str(e.detail), error_code=e.status_code)
+
+        except Exception as e:
+            logger.exception(f"Ingestion job {job_id} failed")
+            self._update(
+                job_id,
+                status="failed",
+                error=f"Upload failed: {str(e)}",
+                error_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in ("completed", "failed") and job["updated_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+job_manager = JobManager(settings.INGEST_WORKERS, settings.INGEST_MAX_PENDING)
@@ -0,0 +1,157 @@
+import math
+import re
+import threading
+import logging
+from collections import Counter, OrderedDict
+from typing import Iterable
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Keeps tax tokens intact: "80C", "TDS", PAN numbers, "10(13A)"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\([a-z0-9]+\))*")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lower-cases and splits text into search terms. Section references
+    like "10(13A)" are kept whole and also indexed by their base number.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if "(" in token:
+            tokens.append(token.split("(", 1)[0])
+    return tokens
+
+
+class _SessionIndex:
+    """Inverted index of one session's chunks."""
+
+    def __init__(self):
+        self.doc_terms: dict[str, Counter] = {}
+        self.doc_lengths: dict[str, int] = {}
+        self.postings: dict[str, dict[str, int]] = {}
+        self.total_length = 0
+
+    def add(self, chunk_id: str, text: str):
+        if chunk_id in self.doc_terms:
+            self.remove(chunk_id)
+        terms = Counter(tokenize(text))
+        self.doc_terms[chunk_id] = terms
+        self.doc_lengths[chunk_id] = sum(terms.values())
+        self.total_length += self.doc_lengths[chunk_id]
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+
+    def remove(self, chunk_id: str):
+        terms = self.doc_terms.pop(chunk_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(chunk_id)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(chunk_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query: str, top_k: int) -> list[tuple[str, float]]:
+        n_docs = len(self.doc_terms)
+        if not n_docs:
+            return []
+
+        avg_length = self.total_length / n_docs or 1.0
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
+class LexicalIndex:
+    """
+    Per-session BM25 inverted indexes over stored chunks.
+    Sessions are loaded lazily from the vector store on first search and
+    then kept up to date incrementally by store_chunks; the least recently
+    used sessions are dropped beyond max_sessions (and reloaded on demand).
+    """
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, _SessionIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_loaded(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def load_session(self, session_id: str, ids: Iterable[str], texts: Iterable[str]):
+        """Build a session's index from all of its stored chunks."""
+        index = _SessionIndex()
+        for chunk_id, text in zip(ids, texts):
+            index.add(chunk_id, text or "")
+        with self._lock:
+            self._sessions[session_id] = index
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def add(self, session_id: str, ids: Iterable[str], texts: Iterable[str]):
+        """
+        Index newly stored chunks. Sessions that are not loaded are skipped:
+        their next search loads everything, including these chunks.
+        """
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is None:
+                return
+            for chunk_id, text in zip(ids, texts):
+                index.add(chunk_id, text or "")
+
+    def remove(self, session_id: str, ids: Iterable[str]):
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is None:
+                return
+            for chunk_id in ids:
+                index.remove(chunk_id)
+
+    def drop_session(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def search(self, session_id: str, query: str, top_k: int) -> list[tuple[str, float]]:
+        """Top-k (chunk_id, bm25_score) of a loaded session, best first."""
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            return index.search(query, top_k)
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Fuses several ranked id lists: score(id) = sum of 1 / (k + rank)."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+lexical_index = LexicalIndex(max_sessions=settings.LEXICAL_MAX_SESSIONS)
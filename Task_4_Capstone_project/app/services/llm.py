@@ -1,17 +1,24 @@
 import ollama
 import re
+from typing import AsyncIterator, Iterator, Optional
+from app.services import metrics
 
 LLM_MODEL = "mistral:7b"
+NO_CONTEXT_ANSWER = "The document does not contain this information."
 
-def generate_answer(question: str, contexts: list[dict]) -> str:
-    """
-    Generate a grounded answer strictly from retrieved document context.
-    Handles gibberish checks and enforces page number citations.
-    """
+_async_client: Optional[ollama.AsyncClient] = None
 
-    if not contexts:
-        return "The document does not contain this information."
+LLM_OPTIONS = {
+    "temperature": 0,   # Strict factual answers
+    "top_p": 0.9,
+    "num_ctx": 4096
+}
 
+def build_prompt(question: str, contexts: list[dict]) -> str:
+    """
+    Builds the grounded RAG prompt: page-tagged context plus the rules
+    for gibberish checks and page number citations.
+    """
     # Prepare context string with Page indicators
     context_text = ""
     for ctx in contexts:
@@ -46,21 +53,113 @@ USER QUESTION:
 FINAL ANSWER:
 """
 
+    return prompt
+
+def generate_answer(question: str, contexts: list[dict]) -> str:
+    """
+    Generate a grounded answer strictly from retrieved document context.
+    Handles gibberish checks and enforces page number citations.
+    """
+
+    if not contexts:
+        return NO_CONTEXT_ANSWER
+
     response = ollama.chat(
         model=LLM_MODEL,
         messages=[
             {
                 "role": "user",
-                "content": prompt
+                "content": build_prompt(question, contexts)
             }
         ],
-        options={
-            "temperature": 0,   # Strict factual answers
-            "top_p": 0.9,
-            "num_ctx": 4096
-        }
+        options=LLM_OPTIONS
     )
 
+    metrics.record_ollama_usage(LLM_MODEL, response)
     answer = response["message"]["content"].strip()
 
-    return answer
\ No newline at end of file
+    return answer
+
+def generate_answer_stream(question: str, contexts: list[dict]) -> Iterator[str]:
+    """
+    Same as generate_answer, but yields answer tokens as soon as
+    the model produces them.
+    """
+    if not contexts:
+        yield NO_CONTEXT_ANSWER
+        return
+
+    stream = ollama.chat(
+        model=LLM_MODEL,
+        messages=[
+            {
+                "role": "user",
+                "content": build_prompt(question, contexts)
+            }
+        ],
+        options=LLM_OPTIONS,
+        stream=True
+    )
+
+    for part in stream:
+        token = part["message"]["content"]
+        if token:
+            yield token
+        if part.get("done"):
+            # The final chunk carries token counts and prefill/decode timings
+            metrics.record_ollama_usage(LLM_MODEL, part)
+
+def _get_async_client() -> ollama.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = ollama.AsyncClient()
+    return _async_client
+
+async def agenerate_answer(question: str, contexts: list[dict]) -> str:
+    """
+    Async variant of generate_answer (Ollama AsyncClient).
+    """
+    if not contexts:
+        return NO_CONTEXT_ANSWER
+
+    response = await _get_async_client().chat(
+        model=LLM_MODEL,
+        messages=[
+            {
+                "role": "user",
+                "content": build_prompt(question, contexts)
+            }
+        ],
+        options=LLM_OPTIONS
+    )
+
+    metrics.record_ollama_usage(LLM_MODEL, response)
+    return response["message"]["content"].strip()
+
+async def agenerate_answer_stream(question: str, contexts: list[dict]) -> AsyncIterator[str]:
+    """
+    Async variant of generate_answer_stream (Ollama AsyncClient).
+    """
+    if not contexts:
+        yield NO_CONTEXT_ANSWER
+        return
+
+    stream = await _get_async_client().chat(
+        model=LLM_MODEL,
+        messages=[
+            {
+                "role": "user",
+                "content": build_prompt(question, contexts)
+            }
+        ],
+        options=LLM_OPTIONS,
+        stream=True
+    )
+
+    async for part in stream:
+        token = part["message"]["content"]
+        if token:
+            yield token
+        if part.get("done"):
+            # The final chunk carries token counts and prefill/decode timings
+            metrics.record_ollama_usage(LLM_MODEL, part)
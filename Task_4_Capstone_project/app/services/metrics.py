@@ -0,0 +1,306 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable, Iterator, Optional
+
+from app.core.config import settings
+
+# Latency buckets in seconds: sub-millisecond (cache hits, BM25) up to
+# multi-minute (LLM generation on CPU, 500-page PDFs)
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0
+)
+SIZE_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally labelled."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Text format 0.0.4 names a counter family after its samples
+        self.family = f"{name}_total"
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.family}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram (Prometheus semantics). observe() is a
+    bisect plus a few additions under a lock, cheap enough for every request.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., sum, count]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return series[-1] if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            le = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{le} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(float(series[-2]))}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Gauge:
+    """Point-in-time value read from a callback when metrics are rendered."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = ()
+        self.func = func
+
+    def samples(self) -> Iterator[str]:
+        yield f"{self.name} {_format_value(self.func())}"
+
+    def reset(self):
+        pass
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, func: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, func))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception:
+                continue  # a failing gauge callback must not break the scrape
+            family = getattr(metric, "family", metric.name)
+            lines.append(f"# HELP {family} {metric.documentation}")
+            lines.append(f"# TYPE {family} {metric.type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+registry = MetricsRegistry(enabled=settings.METRICS_ENABLED)
+
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_duration_seconds",
+    "Latency of each RAG pipeline stage.",
+    ("stage",)
+)
+STAGE_ERRORS = registry.counter(
+    "rag_stage_errors",
+    "Pipeline stages that raised an error.",
+    ("stage",)
+)
+OLLAMA_TOKENS = registry.counter(
+    "rag_ollama_tokens",
+    "Tokens processed by Ollama (kind: prompt or completion).",
+    ("model", "kind")
+)
+SEARCH_RESULTS = registry.histogram(
+    "rag_search_results",
+    "Chunks returned by a vector store search.",
+    ("mode",),
+    buckets=SIZE_BUCKETS
+)
+CONTEXT_CHUNKS = registry.histogram(
+    "rag_context_chunks",
+    "Chunks packed into the LLM context.",
+    buckets=SIZE_BUCKETS
+)
+PAGES_EXTRACTED = registry.counter("rag_pages_extracted", "PDF pages extracted.")
+CHUNKS_STORED = registry.counter("rag_chunks_stored", "Chunks written to the vector store.")
+LLM_REJECTED = registry.counter("rag_llm_rejected", "Requests rejected by LLM admission control.")
+ANSWER_CACHE_HITS = registry.counter("rag_answer_cache_hits", "Semantic answer cache hits.")
+ANSWER_CACHE_MISSES = registry.counter("rag_answer_cache_misses", "Semantic answer cache misses.")
+ANSWER_CACHE_INVALIDATIONS = registry.counter(
+    "rag_answer_cache_invalidations", "Sessions whose cached answers were dropped."
+)
+EMBEDDING_CACHE_HITS = registry.counter("rag_embedding_cache_hits", "Embedding cache hits.")
+EMBEDDING_CACHE_MISSES = registry.counter("rag_embedding_cache_misses", "Embedding cache misses.")
+
+
+# (stage, seconds) observed while serving the current request; read by the
+# Server-Timing middleware. A list because append is atomic across the
+# threads one request fans out to.
+_request_stages: ContextVar[Optional[list]] = ContextVar("request_stages", default=None)
+
+
+def start_request_timing() -> list:
+    """Starts collecting stage durations for the current request (context)."""
+    stages: list = []
+    _request_stages.set(stages)
+    return stages
+
+
+def observe_stage(stage: str, seconds: float):
+    if registry.enabled:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str):
+    """Records the block's duration under stage (and an error if it raises)."""
+    if not registry.enabled and _request_stages.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if registry.enabled:
+            STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def timed_iter(items: Iterable, stage: str) -> Iterator:
+    """Yields from items, recording how long each item took to produce."""
+    iterator = iter(items)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            observe_stage(stage, time.perf_counter() - started)
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
+
+
+def record_ollama_usage(model: str, response) -> None:
+    """
+    Token counts and Ollama's own prefill (prompt eval) / decode timings
+    from a final chat response or last stream chunk.
+    """
+    if response is None:
+        return
+
+    def field(name: str) -> Optional[int]:
+        value = response.get(name) if hasattr(response, "get") else getattr(response, name, None)
+        return value or None
+
+    prompt_tokens = field("prompt_eval_count")
+    completion_tokens = field("eval_count")
+    if prompt_tokens and registry.enabled:
+        OLLAMA_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    if completion_tokens and registry.enabled:
+        OLLAMA_TOKENS.inc(completion_tokens, model=model, kind="completion")
+
+    prefill_ns = field("prompt_eval_duration")
+    generate_ns = field("eval_duration")
+    if prefill_ns:
+        observe_stage("llm_prefill", prefill_ns / 1e9)
+    if generate_ns:
+        observe_stage("llm_generate", generate_ns / 1e9)
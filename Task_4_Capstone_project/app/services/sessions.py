@@ -0,0 +1,202 @@
+import shutil
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Optional
+from app.core.config import settings
+from app.services import vector_store
+from app.services import document_registry
+from app.services.answer_cache import answer_cache
+
+logger = logging.getLogger(__name__)
+
+
+class SessionTracker:
+    """
+    Persistent last-access time of every session, used to expire idle ones.
+    Touches are cheap: the database is only written when the stored time is
+    older than touch_interval seconds. The in-memory write times behind that
+    throttle are dropped once they are that old, so they only cover the
+    sessions active in the last interval.
+    """
+
+    def __init__(self, path: Path, touch_interval: float):
+        self.path = Path(path)
+        self.touch_interval = touch_interval
+        self._written: dict[str, float] = {}
+        self._pruned_at = float("-inf")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)")
+            self._conn = conn
+        return self._conn
+
+    def touch(self, session_id: str, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            if now - self._written.get(session_id, float("-inf")) < self.touch_interval:
+                return
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO sessions (session_id, created_at, last_access) VALUES (?, ?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+                (session_id, now, now)
+            )
+            conn.commit()
+            self._written[session_id] = now
+            if now - self._pruned_at >= self.touch_interval:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        self._written = {
+            session_id: written for session_id, written in self._written.items()
+            if now - written < self.touch_interval
+        }
+        self._pruned_at = now
+
+    def prune(self, now: Optional[float] = None):
+        """Forget write times too old to throttle a touch."""
+        with self._lock:
+            self._prune(time.time() if now is None else now)
+
+    def last_access(self, session_id: str) -> Optional[float]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            return row[0] if row else None
+
+    def idle_sessions(self, cutoff: float) -> list[str]:
+        """Sessions last accessed before cutoff (a unix timestamp)."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT session_id FROM sessions WHERE last_access < ? ORDER BY last_access", (cutoff,)
+            ).fetchall()
+            return [row[0] for row in rows]
+
+    def forget(self, session_id: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.commit()
+            self._written.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM sessions")
+            conn.commit()
+            self._written.clear()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+session_tracker = SessionTracker(settings.SESSION_DB_PATH, settings.SESSION_TOUCH_INTERVAL)
+
+
+def remove_upload(file_path: str) -> bool:
+    # Only ever delete files inside the upload directory
+    path = Path(file_path).resolve()
+    upload_dir = settings.UPLOAD_DIR.resolve()
+    if upload_dir not in path.parents or not path.is_file():
+        return False
+    path.unlink()
+    return True
+
+
+def delete_session(session_id: str) -> dict:
+    """
+    Remove everything a session owns: its chunks, its registry links, the
+    uploaded PDFs no other session uses, and its cached answers.
+    """
+    vector_store.delete_session(session_id)
+    orphaned_files = document_registry.registry.remove_session(session_id)
+    files_deleted = sum(remove_upload(path) for path in orphaned_files)
+    answer_cache.invalidate_session(session_id)
+    session_tracker.forget(session_id)
+
+    logger.info(f"Session {session_id} deleted ({files_deleted} uploaded files removed)")
+    return {"session_id": session_id, "files_deleted": files_deleted}
+
+
+def expire_idle_sessions(ttl_seconds: float, now: Optional[float] = None) -> list[str]:
+    """Delete every session idle for longer than ttl_seconds; returns their ids."""
+    now = time.time() if now is None else now
+    expired = session_tracker.idle_sessions(now - ttl_seconds)
+    for session_id in expired:
+        try:
+            delete_session(session_id)
+        except Exception:
+            logger.exception(f"Failed to expire session {session_id}")
+    session_tracker.prune(now)
+    if expired:
+        logger.info(f"Expired {len(expired)} idle sessions")
+    return expired
+
+
+def reset_all() -> int:
+    """Wipe every session: vector store, registry, caches and uploaded files."""
+    document_registry.registry.clear()
+    answer_cache.clear()
+    session_tracker.clear()
+    for path in settings.UPLOAD_DIR.iterdir():
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink()
+    return vector_store.reset_store()
+
+
+class SessionSweeper:
+    """
+    Background thread that expires idle sessions every interval seconds
+    and closes idle vector store partition handles (the indexes they
+    loaded stay in Chroma's bounded cache until evicted).
+    """
+
+    def __init__(self, ttl_seconds: float, interval: float):
+        self.ttl_seconds = ttl_seconds
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.ttl_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+        self._thread.start()
+        logger.info(f"Session sweeper started (TTL {self.ttl_seconds}s, every {self.interval}s)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                expire_idle_sessions(self.ttl_seconds)
+                vector_store.partitions.close_idle()
+            except Exception:
+                logger.exception("Session sweep failed")
+
+
+session_sweeper = SessionSweeper(settings.SESSION_TTL_SECONDS, settings.SESSION_SWEEP_INTERVAL)
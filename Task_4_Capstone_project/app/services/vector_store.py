@@ -1,32 +1,299 @@
 import chromadb
+import hashlib
+import threading
+import time
 import uuid
 import logging
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from chromadb.config import Settings as ChromaSettings
 from fastapi import HTTPException, status
 from app.core.config import settings  
+from app.services.lexical_index import lexical_index, reciprocal_rank_fusion
+from app.services.compact_vectors import quantized_index, squared_l2, truncate
+from app.services.flat_store import FlatClient
 
 # Initialize Logger
 logger = logging.getLogger(__name__)
 
+# The only chromadb release persistent_client's HNSW cache override has
+# been verified against (requirements.txt pins it)
+CHROMADB_VERSION = "1.4.1"
+
+def hnsw_configuration() -> dict:
+    """Chroma HNSW configuration for new collections, from the HNSW_* settings."""
+    return {
+        "hnsw": {
+            "space": settings.HNSW_SPACE,
+            "max_neighbors": settings.HNSW_M,
+            "ef_construction": settings.HNSW_EF_CONSTRUCTION,
+            "ef_search": settings.HNSW_EF_SEARCH,
+            "sync_threshold": settings.HNSW_SYNC_THRESHOLD
+        }
+    }
+
+
+def open_collection(chroma_client, name: str, create: bool = True):
+    """
+    Opens a collection, creating it with hnsw_configuration(). An existing
+    collection keeps the HNSW parameters it is stored with, including an
+    ef_search set later by set_ef_search (hnsw_tuning --apply); only a
+    sync_threshold above HNSW_SYNC_THRESHOLD is lowered, so that its index
+    is on disk before the client's cache evicts it.
+    """
+    if create:
+        opened = chroma_client.get_or_create_collection(name=name, configuration=hnsw_configuration())
+    else:
+        opened = chroma_client.get_collection(name=name)
+    # Flat collections have no HNSW configuration
+    hnsw = (getattr(opened, "configuration", None) or {}).get("hnsw") or {}
+    if hnsw.get("sync_threshold", 0) > settings.HNSW_SYNC_THRESHOLD:
+        opened.modify(configuration={"hnsw": {"sync_threshold": settings.HNSW_SYNC_THRESHOLD}})
+    return opened
+
+
+def persistent_client(path: str):
+    """
+    Chroma client whose loaded indexes are bounded. The LRU segment cache
+    (CHROMA_MEMORY_LIMIT_MB) is honoured by Chroma's Python segment
+    backend; the Rust bindings PersistentClient runs on ignore it and
+    instead keep up to hnsw_cache_size HNSW indexes loaded, evicting the
+    rest. Chroma has no public setting for that size (it derives it from
+    the open-file limit), so the bindings are restarted with
+    CHROMA_HNSW_CACHE_SIZE before first use. That goes through private
+    attributes: it is only attempted on CHROMADB_VERSION, and any other
+    version, or a restart that did not take, fails startup with a
+    RuntimeError instead of silently running unbounded.
+    CHROMA_HNSW_CACHE_SIZE=0 keeps Chroma's own default and skips all this.
+    Collections opened with open_collection sync their index often enough
+    to be reloaded after eviction.
+    """
+    options = {}
+    if settings.CHROMA_MEMORY_LIMIT_MB > 0:
+        options = {
+            "chroma_segment_cache_policy": "LRU",
+            "chroma_memory_limit_bytes": settings.CHROMA_MEMORY_LIMIT_MB * 1024 * 1024
+        }
+    chroma_client = chromadb.PersistentClient(path=path, settings=ChromaSettings(**options))
+
+    cache_size = settings.CHROMA_HNSW_CACHE_SIZE
+    if cache_size <= 0:
+        return chroma_client
+    if chromadb.__version__ != CHROMADB_VERSION:
+        raise RuntimeError(
+            f"CHROMA_HNSW_CACHE_SIZE needs chromadb {CHROMADB_VERSION}, found {chromadb.__version__}; "
+            "install the pinned version or set CHROMA_HNSW_CACHE_SIZE=0"
+        )
+    from chromadb.api.rust import RustBindingsAPI
+
+    server = getattr(chroma_client, "_server", None)
+    if not isinstance(server, RustBindingsAPI):
+        raise RuntimeError(f"CHROMA_HNSW_CACHE_SIZE needs Chroma's Rust bindings, found {type(server).__name__}")
+    if server.hnsw_cache_size != cache_size:
+        server.hnsw_cache_size = cache_size
+        server.stop()
+        server.start()
+        if server.hnsw_cache_size != cache_size or getattr(server, "bindings", None) is None:
+            raise RuntimeError("Chroma's bindings were not restarted with CHROMA_HNSW_CACHE_SIZE")
+    logger.info(f"Chroma keeps at most {cache_size} HNSW indexes loaded")
+    return chroma_client
+
+
 # --- 1. INITIALIZE CLIENT SAFELY ---
 
 try:
-    client = chromadb.PersistentClient(
-        path=str(settings.CHROMA_DB_DIR)
-    )
+    client = persistent_client(str(settings.CHROMA_DB_DIR))
     
-    collection = client.get_or_create_collection(
-        name=settings.COLLECTION_NAME
-    )
+    collection = open_collection(client, settings.COLLECTION_NAME)
     logger.info(f"Connected to ChromaDB at {settings.CHROMA_DB_DIR}")
 
 except Exception as e:
     logger.critical(f"Failed to connect to ChromaDB: {e}")
     raise RuntimeError("Database connection failed")
 
-def store_chunks(chunks: list[dict], embeddings: list[list[float]], session_id: str):
+
+class PartitionManager:
+    """
+    Maps sessions to their own Chroma collections ("session" mode) or to
+    one of a fixed number of hash buckets ("bucket" mode), so a search only
+    walks the HNSW graph of its own partition instead of the global one.
+
+    client is the vector backend: a Chroma client, or any object with its
+    collection-management calls whose collections implement the Chroma
+    Collection methods used here (FlatClient for VECTOR_BACKEND "flat").
+
+    Partitions are created on first write and opened lazily on first use.
+    Open handles are kept in LRU order; beyond max_open, or after
+    idle_seconds without use, they are closed and simply reopened on the
+    next access. Closing only drops the Python Collection handle (and its
+    cached metadata); the loaded HNSW index belongs to the client, which
+    bounds them separately (CHROMA_HNSW_CACHE_SIZE, see persistent_client).
+    """
+
+    def __init__(self, client, mode: str, buckets: int, max_open: int, idle_seconds: float):
+        self.client = client
+        self.mode = mode
+        self.buckets = max(buckets, 1)
+        self.max_open = max(max_open, 1)
+        self.idle_seconds = idle_seconds
+        self.opened = 0
+        self.closed = 0
+        # partition name -> (collection, last used)
+        self._handles: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def prefix(self) -> str:
+        return f"{settings.COLLECTION_NAME}-{self.mode[0]}"
+
+    def name_for(self, session_id: str) -> str:
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        if self.mode == "bucket":
+            return f"{self.prefix}{int(digest, 16) % self.buckets:04d}"
+        return f"{self.prefix}{digest[:32]}"
+
+    def get(self, session_id: str, create: bool = True):
+        """
+        The session's partition collection. With create=False a partition
+        that was never written returns None instead of being created.
+        """
+        name = self.name_for(session_id)
+        now = time.monotonic()
+        with self._lock:
+            self._close_idle(now)
+            handle = self._handles.get(name)
+            if handle is not None:
+                self._handles[name] = (handle[0], now)
+                self._handles.move_to_end(name)
+                return handle[0]
+
+            try:
+                partition = open_collection(self.client, name, create=create)
+            except chromadb.errors.NotFoundError:
+                return None
+
+            self._handles[name] = (partition, now)
+            self.opened += 1
+            while len(self._handles) > self.max_open:
+                self._handles.popitem(last=False)
+                self.closed += 1
+            return partition
+
+    def _close_idle(self, now: float):
+        # Handles are in LRU order, so only the expired head is visited
+        while self._handles:
+            name, (_, last_used) = next(iter(self._handles.items()))
+            if now - last_used < self.idle_seconds:
+                break
+            del self._handles[name]
+            self.closed += 1
+
+    def close_idle(self) -> int:
+        with self._lock:
+            before = self.closed
+            self._close_idle(time.monotonic())
+            return self.closed - before
+
+    def drop(self, session_id: str):
+        """Delete a session's chunks (its whole collection in session mode)."""
+        name = self.name_for(session_id)
+        if self.mode == "bucket":
+            partition = self.get(session_id, create=False)
+            if partition is not None:
+                partition.delete(where={"session_id": session_id})
+            return
+
+        with self._lock:
+            self._handles.pop(name, None)
+        try:
+            self.client.delete_collection(name=name)
+        except chromadb.errors.NotFoundError:
+            pass
+
+    def drop_all(self) -> int:
+        """Delete every partition collection; returns how many chunks they held."""
+        with self._lock:
+            self._handles.clear()
+            deleted = 0
+            for partition in self.client.list_collections():
+                if partition.name.startswith(self.prefix):
+                    deleted += partition.count()
+                    self.client.delete_collection(name=partition.name)
+            return deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "open": len(self._handles),
+                "opened": self.opened,
+                "closed": self.closed
+            }
+
+
+if settings.VECTOR_BACKEND == "flat":
+    partition_client = FlatClient(settings.FLAT_STORE_DIR)
+    partition_mode = settings.PARTITION_MODE if settings.PARTITION_MODE != "global" else "session"
+    logger.info(f"Using flat vector store at {settings.FLAT_STORE_DIR}")
+else:
+    partition_client, partition_mode = client, settings.PARTITION_MODE
+
+partitions = PartitionManager(
+    partition_client,
+    mode=partition_mode,
+    buckets=settings.PARTITION_BUCKETS,
+    max_open=settings.PARTITION_MAX_OPEN,
+    idle_seconds=settings.PARTITION_IDLE_SECONDS
+)
+
+
+def _collection_for(session_id: str, create: bool = True):
+    """Collection holding a session's chunks (None if it was never written)."""
+    if partitions.mode == "global":
+        return collection
+    return partitions.get(session_id, create=create)
+
+
+def _session_filter(session_id: str) -> Optional[dict]:
+    # A per-session collection holds nothing else, so it needs no filter
+    if partitions.mode == "session":
+        return None
+    return {"session_id": session_id}  # <--- SESSION FILTERING
+
+
+# Embeddings are returned too: the context packer re-ranks with them (MMR)
+QUERY_INCLUDE = ["documents", "metadatas", "distances", "embeddings"]
+
+
+def _empty_results() -> dict:
+    return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]], "embeddings": [[]]}
+
+
+def document_key(session_id: str, source: str) -> str:
+    """Stable key of a session's document named source, shared by all its versions."""
+    return hashlib.sha1(f"{session_id}\0{source}".encode("utf-8")).hexdigest()[:24]
+
+
+def chunk_id(doc_key: str, doc_hash: str, page: int, index: int) -> str:
+    """
+    Deterministic id of the index-th chunk starting on page of one version
+    (doc_hash) of a document. Versions never share ids, so writing a new
+    version leaves the previous one intact until it is retired.
+    """
+    return f"{doc_key}-{doc_hash[:16]}-{page}-{index}"
+
+
+def store_chunks(chunks: list[dict], embeddings: list[list[float]], session_id: str, doc_hash: Optional[str] = None,
+                 doc_key: Optional[str] = None):
     """
     Store text chunks and their embeddings in ChromaDB safely.
     Requires session_id to isolate user data.
+    doc_hash (content hash of the source PDF) lets the chunks be reused
+    when the same file is uploaded again.
+    With doc_key (see document_key) and doc_hash, chunks need a
+    "chunk_index" (their position on their page) and are upserted under
+    chunk_id ids, so storing the same version again replaces its chunks.
     """
 
     if not chunks or not embeddings:
@@ -55,15 +322,23 @@ def store_chunks(chunks: list[dict], embeddings: list[list[float]], session_id:
             logger.warning(f"Skipping empty chunk at index {idx}")
             continue
 
-        ids.append(str(uuid.uuid4()))
+        ids.append(chunk_id(doc_key, doc_hash, chunk["page"], chunk["chunk_index"]) if doc_key else str(uuid.uuid4()))
         documents.append(text)
         valid_embeddings.append(embedding)
 
-        metadatas.append({
+        metadata = {
             "page": chunk.get("page"),
             "source": chunk.get("source", "uploaded_pdf"),
             "session_id": session_id 
-        })
+        }
+        if chunk.get("page_end") is not None:
+            metadata["page_end"] = chunk["page_end"]
+        if doc_hash:
+            metadata["doc_hash"] = doc_hash
+        if doc_key:
+            metadata["doc_key"] = doc_key
+            metadata["chunk_index"] = chunk["chunk_index"]
+        metadatas.append(metadata)
     
     if not documents:
         raise HTTPException(
@@ -71,13 +346,21 @@ def store_chunks(chunks: list[dict], embeddings: list[list[float]], session_id:
             detail="No valid text content found to store"
         )
 
+    if settings.EMBEDDING_DIMENSIONS > 0:
+        valid_embeddings = truncate(valid_embeddings, settings.EMBEDDING_DIMENSIONS).tolist()
+
     try:
-        collection.add(
+        partition = _collection_for(session_id)
+        write = partition.upsert if doc_key else partition.add
+        write(
             ids=ids,
             documents=documents,
             embeddings=valid_embeddings, 
             metadatas=metadatas
         )
+        lexical_index.add(session_id, ids, documents)
+        if quantized_index.enabled:
+            quantized_index.add(session_id, ids, valid_embeddings)
         logger.info(f"Stored {len(documents)} chunks for session {session_id}")
 
     except Exception as e:
@@ -87,10 +370,319 @@ def store_chunks(chunks: list[dict], embeddings: list[list[float]], session_id:
             detail=f"Vector store failed: {str(e)}"
         )
 
-def search_similar(query_embedding: list[float], session_id: str, top_k: int = settings.TOP_K):
+def set_ef_search(ef_search: int) -> int:
+    """
+    Set ef_search on every stored Chroma collection (the global one and
+    all partitions); returns how many were changed. Chroma persists it
+    with the collection, so it outlasts restarts; handles already open in
+    other processes pick it up when they reopen the collection. New
+    collections still start with HNSW_EF_SEARCH.
+    """
+    changed = 0
+    for stored in client.list_collections():
+        if stored.name != settings.COLLECTION_NAME and not stored.name.startswith(partitions.prefix):
+            continue
+        hnsw = (stored.configuration or {}).get("hnsw") or {}
+        if hnsw.get("ef_search") != ef_search:
+            stored.modify(configuration={"hnsw": {"ef_search": ef_search}})
+            changed += 1
+    logger.info(f"ef_search set to {ef_search} on {changed} collections")
+    return changed
+
+
+def _find_document(doc_hash: str, source_sessions: Optional[list[str]]) -> dict:
+    if partitions.mode == "global":
+        return collection.get(
+            where={"doc_hash": doc_hash},
+            include=["documents", "metadatas", "embeddings"]
+        )
+
+    # Partitioned: look in the partitions of the sessions known to hold it
+    for source in source_sessions or []:
+        partition = _collection_for(source, create=False)
+        if partition is None:
+            continue
+        existing = partition.get(
+            where={"$and": [{"doc_hash": doc_hash}, {"session_id": source}]},
+            include=["documents", "metadatas", "embeddings"]
+        )
+        if existing.get("ids"):
+            return existing
+    return {"ids": []}
+
+
+def copy_document_to_session(doc_hash: str, session_id: str, source_sessions: Optional[list[str]] = None,
+                             doc_key: Optional[str] = None) -> int:
+    """
+    Attach an already-embedded document to another session by copying its
+    stored chunks and vectors (no re-extraction or re-embedding).
+    source_sessions (sessions known to hold the document) is required to
+    find it when the store is partitioned.
+    With doc_key the copies are upserted under chunk_id ids, as store_chunks does.
+    Returns the number of chunks copied; 0 if the document is no longer stored.
+    """
+    try:
+        existing = _find_document(doc_hash, source_sessions)
+
+        ids = existing.get("ids") or []
+        if not ids:
+            return 0
+
+        # Every session holding the document has its own copy; take one of them
+        metadatas = existing["metadatas"]
+        source_session = metadatas[0].get("session_id")
+
+        documents = []
+        embeddings = []
+        new_metadatas = []
+        new_ids = []
+        for doc, embedding, meta in zip(existing["documents"], existing["embeddings"], metadatas):
+            if meta.get("session_id") != source_session:
+                continue
+            documents.append(doc)
+            embeddings.append(embedding)
+            meta = {**meta, "session_id": session_id}
+            meta.pop("doc_key", None)
+            # Chunks stored before chunk_index existed keep random ids
+            if doc_key and meta.get("chunk_index") is not None:
+                new_ids.append(chunk_id(doc_key, doc_hash, meta["page"], meta["chunk_index"]))
+                meta["doc_key"] = doc_key
+            else:
+                new_ids.append(str(uuid.uuid4()))
+            new_metadatas.append(meta)
+
+        partition = _collection_for(session_id)
+        (partition.upsert if doc_key else partition.add)(
+            ids=new_ids,
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=new_metadatas
+        )
+        lexical_index.add(session_id, new_ids, documents)
+        if quantized_index.enabled:
+            quantized_index.add(session_id, new_ids, embeddings)
+        logger.info(f"Copied {len(documents)} chunks of document {doc_hash[:12]} to session {session_id}")
+        return len(documents)
+
+    except Exception as e:
+        logger.exception("Failed to copy document chunks")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Vector store failed: {str(e)}"
+        )
+
+def document_chunk_ids(doc_hash: str, session_id: str, pages: Optional[list[int]] = None) -> list[str]:
+    """Ids of one session's chunks of a document, optionally only those starting on pages."""
+    partition = _collection_for(session_id, create=False)
+    if partition is None:
+        return []
+    try:
+        found = partition.get(
+            where={"$and": [{"doc_hash": doc_hash}, {"session_id": session_id}]},
+            include=["metadatas"]
+        )
+    except Exception as e:
+        logger.exception("Failed to read document chunks")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Vector store failed: {str(e)}"
+        )
+    wanted = set(pages) if pages is not None else None
+    return [
+        found_id for found_id, meta in zip(found["ids"], found["metadatas"])
+        if wanted is None or meta.get("page") in wanted
+    ]
+
+def retag_chunks(ids: list[str], session_id: str, doc_hash: str):
+    """
+    Point stored chunks at a new version of their document (pages a
+    re-upload left unchanged keep their vectors, only doc_hash moves).
+    """
+    if not ids:
+        return
+    try:
+        _collection_for(session_id).update(ids=ids, metadatas=[{"doc_hash": doc_hash} for _ in ids])
+        logger.info(f"Moved {len(ids)} unchanged chunks to document {doc_hash[:12]} for session {session_id}")
+
+    except Exception as e:
+        logger.exception("Failed to update chunk metadata")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Vector store failed: {str(e)}"
+        )
+
+def delete_document(doc_hash: str, session_id: str):
+    """
+    Remove one session's chunks of a document (used to roll back a failed ingest).
+    """
+    try:
+        partition = _collection_for(session_id, create=False)
+        if partition is not None:
+            partition.delete(
+                where={"$and": [{"doc_hash": doc_hash}, {"session_id": session_id}]}
+            )
+        # Rebuilt from the remaining chunks on the next hybrid search
+        lexical_index.drop_session(session_id)
+        quantized_index.drop_session(session_id)
+        logger.info(f"Deleted chunks of document {doc_hash[:12]} for session {session_id}")
+
+    except Exception as e:
+        logger.exception("Failed to delete document chunks")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Vector store failed: {str(e)}"
+        )
+
+def delete_session(session_id: str):
+    """Remove every chunk of a session (its whole partition when partitioned)."""
+    try:
+        if partitions.mode == "global":
+            collection.delete(where={"session_id": session_id})
+        else:
+            partitions.drop(session_id)
+        lexical_index.drop_session(session_id)
+        quantized_index.drop_session(session_id)
+        logger.info(f"Deleted all chunks of session {session_id}")
+
+    except Exception as e:
+        logger.exception("Failed to delete session chunks")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Vector store failed: {str(e)}"
+        )
+
+def reset_store() -> int:
+    """
+    Drop and recreate the collection (much cheaper than deleting it row
+    by row), plus every partition. Returns how many chunks were removed.
+    """
+    global collection
+
+    count = collection.count()
+    client.delete_collection(name=settings.COLLECTION_NAME)
+    collection = open_collection(client, settings.COLLECTION_NAME)
+    if partitions.mode != "global":
+        count += partitions.drop_all()
+    lexical_index.clear()
+    quantized_index.clear()
+    logger.info(f"Vector store reset, {count} chunks removed")
+    return count
+
+def _load_lexical_session(session_id: str):
+    # Builds the session's BM25 index from everything it has stored
+    partition = _collection_for(session_id, create=False)
+    if partition is None:
+        lexical_index.load_session(session_id, [], [])
+        return
+    existing = partition.get(where=_session_filter(session_id), include=["documents"])
+    lexical_index.load_session(session_id, existing.get("ids") or [], existing.get("documents") or [])
+
+
+def _load_quantized_session(partition, session_id: str):
+    existing = partition.get(where=_session_filter(session_id), include=["embeddings"])
+    ids = existing.get("ids") or []
+    quantized_index.load_session(session_id, ids, existing["embeddings"] if ids else [])
+
+
+def _dense_query(partition, query_embedding: list[float], session_id: str, n_results: int) -> dict:
+    """
+    Nearest chunks by vector. With VECTOR_QUANTIZATION the first pass runs
+    over the session's quantized vectors instead of Chroma's HNSW index;
+    its best QUANTIZED_RERANK_MULTIPLIER x n_results candidates are then
+    fetched and re-scored with their stored float32 vectors, so the
+    distances returned are exact.
+    """
+    if not quantized_index.enabled:
+        return partition.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=_session_filter(session_id),
+            include=QUERY_INCLUDE
+        )
+
+    if not quantized_index.is_loaded(session_id):
+        _load_quantized_session(partition, session_id)
+    candidates = quantized_index.search(
+        session_id, query_embedding, n_results * max(settings.QUANTIZED_RERANK_MULTIPLIER, 1)
+    )
+    if not candidates:
+        return _empty_results()
+
+    found = partition.get(ids=candidates, include=["documents", "metadatas", "embeddings"])
+    if not found.get("ids"):
+        return _empty_results()
+    distances = squared_l2(query_embedding, found["embeddings"])
+    order = np.argsort(distances, kind="stable")[:n_results]
+    return {
+        "ids": [[found["ids"][i] for i in order]],
+        "documents": [[found["documents"][i] for i in order]],
+        "metadatas": [[found["metadatas"][i] for i in order]],
+        "distances": [[float(distances[i]) for i in order]],
+        "embeddings": [[found["embeddings"][i] for i in order]]
+    }
+
+
+def _hybrid_search(partition, query_embedding: list[float], query_text: str, session_id: str, top_k: int) -> dict:
+    """
+    Dense (Chroma) + lexical (BM25) retrieval fused with reciprocal rank
+    fusion. Both retrievers return a wider candidate pool than top_k so
+    exact-token matches ("80C", "TDS", PAN) missed by the embedding can
+    still make the cut.
+    """
+    candidates = max(top_k * settings.HYBRID_CANDIDATE_MULTIPLIER, top_k)
+
+    dense = _dense_query(partition, query_embedding, session_id, candidates)
+    dense_ids = dense["ids"][0] if dense.get("ids") else []
+
+    if not lexical_index.is_loaded(session_id):
+        _load_lexical_session(session_id)
+    lexical_ids = [chunk_id for chunk_id, _ in lexical_index.search(session_id, query_text, candidates)]
+
+    fused = reciprocal_rank_fusion([dense_ids, lexical_ids], k=settings.HYBRID_RRF_K)[:top_k]
+    if not fused:
+        return {"ids": [[]], "documents": [[]], "metadatas": [[]], "embeddings": [[]], "scores": [[]]}
+
+    def _column(result: dict, name: str, nested: bool) -> list:
+        values = result.get(name)
+        if values is None:
+            return [None] * len(result["ids"][0] if nested else result["ids"])
+        return values[0] if nested else values
+
+    # Text, metadata and vector for every fused id (dense hits already have them)
+    known = {
+        chunk_id: (doc, meta, emb)
+        for chunk_id, doc, meta, emb in zip(
+            dense_ids, _column(dense, "documents", True),
+            _column(dense, "metadatas", True), _column(dense, "embeddings", True)
+        )
+    }
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in known]
+    if missing:
+        extra = partition.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+        for chunk_id, doc, meta, emb in zip(
+            extra["ids"], _column(extra, "documents", False),
+            _column(extra, "metadatas", False), _column(extra, "embeddings", False)
+        ):
+            known[chunk_id] = (doc, meta, emb)
+
+    fused = [(chunk_id, score) for chunk_id, score in fused if chunk_id in known]
+    return {
+        "ids": [[chunk_id for chunk_id, _ in fused]],
+        "documents": [[known[chunk_id][0] for chunk_id, _ in fused]],
+        "metadatas": [[known[chunk_id][1] for chunk_id, _ in fused]],
+        "embeddings": [[known[chunk_id][2] for chunk_id, _ in fused]],
+        "scores": [[score for _, score in fused]]
+    }
+
+
+def search_similar(query_embedding: list[float], session_id: str, top_k: int = settings.TOP_K,
+                   query_text: Optional[str] = None, mode: Optional[str] = None):
     """
     Search for similar documents using vector similarity.
-    Filters strictly by session_id.
+    Filters strictly by session_id (or searches only the session's
+    partition when the store is partitioned).
+    mode "hybrid" (default: settings.RETRIEVAL_MODE) fuses the vector
+    results with BM25 over query_text; without query_text it stays dense.
     """
 
     if not query_embedding:
@@ -99,12 +691,20 @@ def search_similar(query_embedding: list[float], session_id: str, top_k: int = s
             detail="Query embedding is empty"
         )
 
+    mode = mode or settings.RETRIEVAL_MODE
+    if settings.EMBEDDING_DIMENSIONS > 0:
+        query_embedding = truncate(query_embedding, settings.EMBEDDING_DIMENSIONS).tolist()
+
     try:
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k, 
-            where={"session_id": session_id}  # <--- SESSION FILTERING
-        )
+        partition = _collection_for(session_id, create=False)
+        if partition is None:
+            logger.warning(f"No partition found for session {session_id}")
+            return _empty_results()
+
+        if mode == "hybrid" and query_text:
+            return _hybrid_search(partition, query_embedding, query_text, session_id, top_k)
+
+        results = _dense_query(partition, query_embedding, session_id, top_k)
         
         if not results or not results.get("documents"):
             logger.warning(f"No matching documents found for session {session_id}")
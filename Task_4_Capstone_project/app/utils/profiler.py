@@ -0,0 +1,124 @@
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
+
+# Only stacks that pass through our own code are kept; idle pool and
+# server threads would otherwise drown the profile
+APP_DIR = str(Path(__file__).resolve().parent.parent)
+
+# Profiler of the current request, inherited by the tasks and threadpool
+# calls it spawns
+_active_profiler: ContextVar[Optional["SamplingProfiler"]] = ContextVar("active_profiler", default=None)
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler: a background thread snapshots the stacks
+    of the threads a request runs on each interval seconds
+    (sys._current_frames) and counts identical stacks. Output is the
+    "folded" format read by flamegraph.pl and speedscope: one
+    "root;caller;callee count" line per stack.
+
+    The thread that calls start() (the event loop, for a request) is
+    sampled throughout; threadpool workers only while they run a call
+    dispatched through run_in_threadpool() below for this request. The
+    event loop is shared, so coroutines of concurrent requests can still
+    appear in its samples.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # thread ident -> calls being sampled on it
+        self._threads: Counter = Counter()
+        self._threads_lock = threading.Lock()
+        self.started_at = 0.0
+        self.duration = 0.0
+
+    def start(self):
+        self.track(threading.get_ident())
+        _active_profiler.set(self)
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return self
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def track(self, thread_id: int):
+        with self._threads_lock:
+            self._threads[thread_id] += 1
+
+    def untrack(self, thread_id: int):
+        with self._threads_lock:
+            self._threads[thread_id] -= 1
+            if self._threads[thread_id] <= 0:
+                del self._threads[thread_id]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._threads_lock:
+                thread_ids = list(self._threads)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = self._fold(frame)
+                if stack:
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+    def _fold(self, frame) -> Optional[str]:
+        names = []
+        in_app = False
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            in_app = in_app or code.co_filename.startswith(APP_DIR)
+            names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+            frame = frame.f_back
+        if not in_app:
+            return None
+        return ";".join(reversed(names))
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def save(self, path: Path) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.folded(), encoding="utf-8")
+        return path
+
+
+def _call_tracked(profiler: SamplingProfiler, func, *args, **kwargs):
+    thread_id = threading.get_ident()
+    profiler.track(thread_id)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.untrack(thread_id)
+
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """fastapi's run_in_threadpool; the worker is sampled while it runs func for a profiled request."""
+    profiler = _active_profiler.get()
+    if profiler is None:
+        return await _run_in_threadpool(func, *args, **kwargs)
+    return await _run_in_threadpool(_call_tracked, profiler, func, *args, **kwargs)
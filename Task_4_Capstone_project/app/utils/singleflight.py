@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key (thread version).
+    The first caller runs func; callers arriving while it is in flight
+    wait for and share its result (or exception) instead of repeating it.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.merged = 0
+        self._inflight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.calls += 1
+            else:
+                self.merged += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "merged": self.merged, "in_flight": len(self._inflight)}
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent coroutine calls with the same key (asyncio version).
+    The shared work runs as a task, so one caller disconnecting does not
+    cancel it for the others.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.merged = 0
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self.merged += 1
+            return await asyncio.shield(task)
+
+        self.calls += 1
+        task = asyncio.ensure_future(func())
+        self._inflight[key] = task
+
+        def _forget(done: asyncio.Task):
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+
+        task.add_done_callback(_forget)
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "merged": self.merged, "in_flight": len(self._inflight)}
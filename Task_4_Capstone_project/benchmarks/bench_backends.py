@@ -0,0 +1,146 @@
+"""
+Chroma (HNSW) vs. the flat memory-mapped backend for one session's chunks.
+
+For every --sizes session size, stores the same synthetic chunks (random
+unit vectors with text and metadata) in a throwaway database of each
+backend, through PartitionManager in "session" mode like the app, then
+runs perturbed copies of stored chunks as queries with the app's include
+list (documents, metadatas, distances, embeddings) and reports:
+
+  ingest_seconds    storing every chunk in --batch-size batches
+  cold_ms           first query after reopening the database
+  query             warm query latency percentiles
+  recall_at_k       overlap with the exact top-k
+  disk_mb           size of the database directory
+
+as JSON.
+
+Usage (from Task_4_Capstone_project):
+    python -m benchmarks.bench_backends
+    python -m benchmarks.bench_backends --sizes 100,1000,10000 --dim 768 --output backends.json
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import chromadb
+import numpy as np
+
+from app.services.flat_store import FlatClient
+from app.services.vector_store import QUERY_INCLUDE, PartitionManager
+from benchmarks.bench_partitioning import dir_size_mb, percentiles
+
+BACKENDS = ("chroma", "flat")
+SESSION_ID = "bench-session"
+
+
+def int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def open_partitions(backend: str, path: Path) -> PartitionManager:
+    client = chromadb.PersistentClient(path=str(path)) if backend == "chroma" else FlatClient(path)
+    return PartitionManager(client, mode="session", buckets=1, max_open=4, idle_seconds=float("inf"))
+
+
+def run_backend(backend: str, vectors: np.ndarray, queries: np.ndarray, exact: list[set], args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-{backend}-"))
+    partitions = open_partitions(backend, workdir)
+    collection = partitions.get(SESSION_ID)
+
+    started = time.perf_counter()
+    for start in range(0, len(vectors), args.batch_size):
+        end = min(start + args.batch_size, len(vectors))
+        collection.add(
+            ids=[f"c{i}" for i in range(start, end)],
+            embeddings=vectors[start:end],
+            documents=[f"Synthetic chunk {i} of the salary statement" for i in range(start, end)],
+            metadatas=[{"page": i // 5 + 1, "session_id": SESSION_ID, "doc_hash": "bench"} for i in range(start, end)]
+        )
+    ingest_seconds = time.perf_counter() - started
+    del collection, partitions
+
+    # Reopen, so the first query pays for loading the index from disk
+    partitions = open_partitions(backend, workdir)
+    started = time.perf_counter()
+    partitions.get(SESSION_ID, create=False).query(
+        query_embeddings=[queries[0]], n_results=args.top_k, include=QUERY_INCLUDE
+    )
+    cold_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+    hits = 0
+    for query, truth in zip(queries, exact):
+        started = time.perf_counter()
+        result = partitions.get(SESSION_ID, create=False).query(
+            query_embeddings=[query], n_results=args.top_k, include=QUERY_INCLUDE
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len({int(chunk_id[1:]) for chunk_id in result["ids"][0]} & truth)
+
+    report = {
+        "backend": backend,
+        "chunks": len(vectors),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "cold_ms": round(cold_ms, 3),
+        "query": percentiles(latencies),
+        "recall_at_k": round(hits / (len(exact) * args.top_k), 4),
+        "disk_mb": dir_size_mb(workdir)
+    }
+    del partitions
+    shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int_list, default=[100, 300, 1000, 3000, 10000],
+                        help="chunks per session (default: 100,300,1000,3000,10000)")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per add (INGEST_BATCH_SIZE)")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        picks = rng.integers(size, size=args.queries)
+        queries = vectors[picks] + rng.normal(0, 0.05, (args.queries, args.dim)).astype(np.float32)
+        top_k = min(args.top_k, size)
+        exact = [set(np.argsort(-(vectors @ query))[:top_k].tolist()) for query in queries]
+
+        for backend in args.backends.split(","):
+            results.append(run_backend(backend, vectors, queries, exact, args))
+            latest = results[-1]
+            print(f"{size:>6} chunks {backend:>6}: p50 {latest['query']['p50_ms']} ms, "
+                  f"recall {latest['recall_at_k']}", file=sys.stderr)
+
+    report = {
+        "config": {
+            "sizes": args.sizes,
+            "dim": args.dim,
+            "queries": args.queries,
+            "top_k": args.top_k,
+            "batch_size": args.batch_size
+        },
+        "results": results
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text)
+
+
+if __name__ == "__main__":
+    main()
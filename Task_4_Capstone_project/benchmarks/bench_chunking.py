@@ -0,0 +1,161 @@
+"""
+Native chunker vs. LangChain's RecursiveCharacterTextSplitter.
+
+Chunks the text of synthetic tax-document pages (no PDF parsing, so only
+splitting is timed) with:
+
+  langchain_per_call   a new splitter per document, as pdf_service used to
+  langchain_reused     one splitter built up front
+  native               app.services.chunker.Chunker, per page
+  native_across_pages  Chunker with across_pages (page tails merged)
+  native_tokens        Chunker measuring --token-size tokens
+
+and reports pages/sec, chunk counts and sizes, fragments (chunks under a
+quarter of the target size, each still costing an embedding call) and the
+import time each splitter adds to startup, as JSON.
+
+Usage (from Task_4_Capstone_project):
+    python -m benchmarks.bench_chunking
+    python -m benchmarks.bench_chunking --pages 2000 --short-page-every 3 --output chunking.json
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import page_lines
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def build_pages(count: int, short_every: int, seed: int) -> list[dict]:
+    """Synthetic pages; every short_every-th page only holds a table row carried over from the previous one."""
+    rng = random.Random(seed)
+    pages = []
+    for number in range(1, count + 1):
+        lines = page_lines(number, rng)
+        if short_every and number % short_every == 0:
+            lines = [lines[1][:60]]
+        pages.append({"page": number, "text": "\n".join(lines)})
+    return pages
+
+
+def import_seconds(module: str) -> float:
+    """Import time of module in a fresh interpreter (best of 3)."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    runs = [
+        float(subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR,
+                             capture_output=True, text=True, check=True).stdout)
+        for _ in range(3)
+    ]
+    return round(min(runs), 4)
+
+
+def summarize(name: str, chunks: list[dict], seconds: float, pages: int, target: int, measure) -> dict:
+    sizes = np.asarray([measure(chunk["text"]) for chunk in chunks])
+    return {
+        "splitter": name,
+        "seconds": round(seconds, 4),
+        "pages_per_sec": round(pages / seconds, 1),
+        "chunks": len(chunks),
+        "mean_size": round(float(sizes.mean()), 1),
+        "max_size": int(sizes.max()),
+        "fragments": int((sizes < target / 4).sum()),
+        "cross_page_chunks": sum(chunk.get("page_end", chunk["page"]) != chunk["page"] for chunk in chunks)
+    }
+
+
+def best_of(repeats: int, func):
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--documents", type=int, default=20, help="pages are split over this many documents")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--token-size", type=int, default=128)
+    parser.add_argument("--token-overlap", type=int, default=12)
+    parser.add_argument("--short-page-every", type=int, default=4, help="0 = no short pages")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from app.services.chunker import Chunker, count_tokens
+
+    pages = build_pages(args.pages, args.short_page_every, args.seed)
+    per_doc = max(len(pages) // max(args.documents, 1), 1)
+    documents = [pages[i:i + per_doc] for i in range(0, len(pages), per_doc)]
+
+    def langchain_splitter():
+        return RecursiveCharacterTextSplitter(
+            chunk_size=args.chunk_size, chunk_overlap=args.overlap,
+            length_function=len, separators=["\n\n", "\n", " ", ""]
+        )
+
+    def run_langchain(splitter_for_doc):
+        chunks = []
+        for document in documents:
+            splitter = splitter_for_doc()
+            for page in document:
+                chunks.extend({"text": text, "page": page["page"]} for text in splitter.split_text(page["text"]))
+        return chunks
+
+    reused = langchain_splitter()
+    native = Chunker(args.chunk_size, args.overlap)
+    across = Chunker(args.chunk_size, args.overlap, across_pages=True)
+    tokens = Chunker(args.token_size, args.token_overlap, length_unit="tokens")
+
+    def run_native(chunker):
+        return [chunk for document in documents for chunk in chunker.split(document)]
+
+    runs = [
+        ("langchain_per_call", lambda: run_langchain(langchain_splitter), args.chunk_size, len),
+        ("langchain_reused", lambda: run_langchain(lambda: reused), args.chunk_size, len),
+        ("native", lambda: run_native(native), args.chunk_size, len),
+        ("native_across_pages", lambda: run_native(across), args.chunk_size, len),
+        ("native_tokens", lambda: run_native(tokens), args.token_size, count_tokens),
+    ]
+    results = []
+    for name, func, target, measure in runs:
+        seconds, chunks = best_of(args.repeats, func)
+        results.append(summarize(name, chunks, seconds, len(pages), target, measure))
+        print(f"{name:>20}: {results[-1]['pages_per_sec']} pages/s, {len(chunks)} chunks", file=sys.stderr)
+
+    report = {
+        "config": {
+            "pages": args.pages,
+            "documents": len(documents),
+            "chunk_size": args.chunk_size,
+            "overlap": args.overlap,
+            "token_size": args.token_size,
+            "short_page_every": args.short_page_every
+        },
+        "import_seconds": {
+            "langchain_text_splitters": import_seconds("langchain_text_splitters"),
+            "app.services.chunker": import_seconds("app.services.chunker")
+        },
+        "results": results
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text)
+
+
+if __name__ == "__main__":
+    main()
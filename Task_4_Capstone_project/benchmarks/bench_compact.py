@@ -0,0 +1,183 @@
+"""
+Recall vs. memory of the compact vector settings (EMBEDDING_DIMENSIONS,
+VECTOR_QUANTIZATION, QUANTIZED_RERANK_MULTIPLIER).
+
+Chunks and embeds PDFs the way the app does (default: every readable PDF
+in data/uploads plus a --synthetic-pages document, so there are enough
+chunks to rank), embeds --queries questions (tax questions about the
+synthetic pages plus the opening words of random chunks) and, for every
+combination of Matryoshka dimensions, quantization and re-rank multiplier,
+reports:
+
+  recall_at_k              overlap with the exact full-size float32 top-k
+  index_bytes_per_vector   first-pass index (float32 rows, or the quantized copy)
+  stored_bytes_per_vector  float32 vectors kept in Chroma
+  search_ms                mean time of the first pass + re-rank per query
+
+Embeddings come from the configured Ollama (OLLAMA_HOST); recall is only
+meaningful with the real nomic-embed-text (the fake server's vectors have
+no Matryoshka structure). --cache stores them in an .npz so settings can
+be re-explored without Ollama.
+
+Usage (from Task_4_Capstone_project):
+    python -m benchmarks.bench_compact
+    python -m benchmarks.bench_compact --pdf form16.pdf --dims 0,256,128 --k 10 --cache vectors.npz
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import make_pdf, questions
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def load_chunks(pdfs: list[Path], synthetic_pages: int) -> list[str]:
+    from app.services.pdf_service import extract_text_from_pdf
+
+    texts = []
+    for pdf in pdfs:
+        try:
+            texts.extend(chunk["text"] for chunk in extract_text_from_pdf(str(pdf)))
+        except Exception as e:
+            print(f"skipping {pdf.name}: {getattr(e, 'detail', e)}", file=sys.stderr)
+    if synthetic_pages:
+        texts.extend(chunk["text"] for chunk in extract_text_from_pdf(io.BytesIO(make_pdf(synthetic_pages))))
+    return texts
+
+
+def make_queries(chunks: list[str], synthetic_pages: int, count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    asked = questions(synthetic_pages, count // 2, seed) if synthetic_pages else []
+    while len(asked) < count:
+        words = rng.choice(chunks).split()
+        asked.append(" ".join(words[:12]))
+    return asked
+
+
+def embed(chunks: list[str], queries: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    from app.services.embedding import embed_query, embed_texts
+
+    documents = np.asarray(embed_texts(chunks), dtype=np.float32)
+    asked = np.asarray([embed_query(question) for question in queries], dtype=np.float32)
+    return documents, asked
+
+
+def top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    best = np.argpartition(distances, k - 1)[:k]
+    return best[np.argsort(distances[best], kind="stable")]
+
+
+def run_config(documents, queries, exact, dims: int, quantization: str, multiplier: int, k: int) -> dict:
+    from app.services.compact_vectors import QuantizedVectors, squared_l2, truncate
+
+    stored = truncate(documents, dims)
+    asked = truncate(queries, dims)
+    if quantization == "float32":
+        index = None
+        index_bytes = stored.shape[1] * 4
+    else:
+        index = QuantizedVectors(quantization)
+        index.add([str(i) for i in range(len(stored))], stored)
+        index_bytes = index.nbytes / len(stored)
+
+    hits = 0
+    started = time.perf_counter()
+    for query, truth in zip(asked, exact):
+        if index is None:
+            found = top_k(squared_l2(query, stored), k)
+        else:
+            candidates = np.asarray([int(i) for i in index.search(query, k * multiplier)])
+            found = candidates[top_k(squared_l2(query, stored[candidates]), min(k, len(candidates)))]
+        hits += len(set(found.tolist()) & set(truth.tolist()))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "dimensions": stored.shape[1],
+        "quantization": quantization,
+        "rerank_multiplier": multiplier if index is not None else None,
+        "recall_at_k": round(hits / (k * len(exact)), 4),
+        "index_bytes_per_vector": round(index_bytes, 1),
+        "stored_bytes_per_vector": stored.shape[1] * 4,
+        "search_ms": round(1000 * elapsed / len(exact), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", type=Path, nargs="*", help="PDFs to index (default: data/uploads/*.pdf)")
+    parser.add_argument("--synthetic-pages", type=int, default=100, help="pages of synthetic Form 16 text to add")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10, help="results per query (RETRIEVAL_TOP_K)")
+    parser.add_argument("--dims", type=int_list, default=[0, 512, 256, 128, 64],
+                        help="Matryoshka prefixes to try (0 = full vector)")
+    parser.add_argument("--quantization", default="float32,float16,int8")
+    parser.add_argument("--rerank", type=int_list, default=[1, 2, 4, 8], help="re-rank multipliers to try")
+    parser.add_argument("--cache", type=Path, help="npz of embeddings: read if present, else written")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    # Benchmark embeddings must not land in (or come from) the app's cache
+    os.environ["EMBED_CACHE_ENABLED"] = "false"
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+    if args.cache and args.cache.exists():
+        cached = np.load(args.cache)
+        documents, queries = cached["documents"], cached["queries"]
+    else:
+        # stdout is reserved for the report; the app's own prints go to stderr
+        with redirect_stdout(sys.stderr):
+            pdfs = args.pdf if args.pdf is not None else sorted((PROJECT_DIR / "data" / "uploads").glob("*.pdf"))
+            chunks = load_chunks(pdfs, args.synthetic_pages)
+            asked = make_queries(chunks, args.synthetic_pages, args.queries, args.seed)
+            print(f"embedding {len(chunks)} chunks and {len(asked)} queries", file=sys.stderr)
+            documents, queries = embed(chunks, asked)
+        if args.cache:
+            np.savez(args.cache, documents=documents, queries=queries)
+
+    from app.services.compact_vectors import squared_l2
+
+    k = min(args.k, len(documents))
+    exact = [top_k(squared_l2(query, documents), k) for query in queries]
+
+    results = []
+    for dims in args.dims:
+        for quantization in args.quantization.split(","):
+            for multiplier in ([None] if quantization == "float32" else args.rerank):
+                result = run_config(documents, queries, exact, dims, quantization, multiplier, k)
+                results.append(result)
+                print(f"{result['dimensions']:>4}d {quantization:>7} x{multiplier or '-'}: "
+                      f"recall {result['recall_at_k']}, {result['index_bytes_per_vector']} B/vector",
+                      file=sys.stderr)
+
+    report = {
+        "config": {
+            "chunks": len(documents),
+            "queries": len(queries),
+            "k": k,
+            "model_dimensions": int(documents.shape[1])
+        },
+        "results": results
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text)
+
+
+if __name__ == "__main__":
+    main()
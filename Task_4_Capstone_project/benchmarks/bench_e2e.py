@@ -0,0 +1,376 @@
+"""
+End-to-end upload and query throughput of the API, with no real Ollama.
+
+Starts the fake Ollama server from the repository root (unless
+--ollama-host is given), points DATA_DIR at a temporary directory, serves
+the app with uvicorn inside this process and drives it over HTTP:
+
+  upload   one synthetic PDF per --pages size, each in its own session:
+           pages/sec, chunks/sec embedded and stored, Server-Timing stages
+  query    --queries questions at each --concurrency level, spread over
+           those sessions: p50/p95/p99 latency, requests/sec, errors
+  memory   peak RSS of the process during each upload and query level
+
+The fake server answers instantly by default, so the numbers measure this
+app (parsing, chunking, Chroma, HTTP) and catch regressions between
+commits; --ollama-latency-scale 1 adds nomic-embed-text / mistral:7b-like
+model time. The JSON report goes to stdout (and --output); --baseline
+adds ratios against a previous report.
+
+Usage (from Task_4_Capstone_project):
+    python -m benchmarks.bench_e2e
+    python -m benchmarks.bench_e2e --pages 1,10,100,500 --concurrency 1,4,16 --output bench.json
+    python -m benchmarks.bench_e2e --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import make_pdf, questions
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+REPO_ROOT = PROJECT_DIR.parent
+
+
+def percentiles(samples_ms: list[float]) -> dict:
+    if not samples_ms:
+        return {}
+    values = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(values.mean()), 2)
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def current_rss_mb() -> Optional[float]:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1e6
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RssSampler:
+    """Polls this process's RSS in the background; peak() since the last reset()."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self._peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None:
+            self._peak = max(self._peak, rss)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def reset(self):
+        self._peak = 0.0
+        self._sample()
+
+    def peak(self) -> Optional[float]:
+        self._sample()
+        return round(self._peak, 1) if self._peak else None
+
+
+def parse_server_timing(header: str) -> dict:
+    """'embed;dur=12.5, store;dur=3.0' -> {"embed": 12.5, "store": 3.0} (ms)."""
+    stages = {}
+    for part in filter(None, (item.strip() for item in header.split(","))):
+        name, _, params = part.partition(";")
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "dur":
+                stages[name] = float(value)
+    return stages
+
+
+def start_fake_ollama(args) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "fake_ollama", "--port", str(port),
+         "--latency-scale", str(args.ollama_latency_scale)],
+        cwd=REPO_ROOT
+    )
+    host = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(host)
+    except RuntimeError:
+        process.kill()
+        raise
+    return process, host
+
+
+def serve(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-server", daemon=True)
+    thread.start()
+    wait_until_up(f"http://127.0.0.1:{port}/docs")
+    return server, thread
+
+
+def bench_uploads(client: httpx.Client, args, sampler: RssSampler) -> list[dict]:
+    results = []
+    for pages in args.pages:
+        pdf = make_pdf(pages, seed=args.seed)
+        sampler.reset()
+        started = time.perf_counter()
+        response = client.post(
+            "/api/upload",
+            files={"file": (f"bench_{pages}p.pdf", pdf, "application/pdf")},
+            data={"session_id": f"bench-{pages}p"}
+        )
+        seconds = time.perf_counter() - started
+        body = response.json() if response.status_code == 200 else {}
+        chunks = body.get("chunks_stored", 0)
+        stages = parse_server_timing(response.headers.get("server-timing", ""))
+
+        result = {
+            "pages": pages,
+            "bytes": len(pdf),
+            "status": response.status_code,
+            "chunks": chunks,
+            "seconds": round(seconds, 3),
+            "pages_per_sec": round(pages / seconds, 2),
+            "chunks_per_sec": round(chunks / seconds, 2),
+            "stages_ms": stages,
+            "peak_rss_mb": sampler.peak()
+        }
+        for stage in ("embed", "store"):
+            if stages.get(stage):
+                result[f"{stage}_chunks_per_sec"] = round(chunks / (stages[stage] / 1000), 2)
+        if response.status_code != 200:
+            result["error"] = response.text[:500]
+        results.append(result)
+        print(f"upload {pages:>4} pages: {result['pages_per_sec']} pages/s, "
+              f"{result['chunks_per_sec']} chunks/s", file=sys.stderr)
+    return results
+
+
+def bench_queries(client: httpx.Client, args, sampler: RssSampler) -> list[dict]:
+    per_document = {pages: questions(pages, args.queries, seed=args.seed) for pages in args.pages}
+    # Round-robin over the uploaded documents (one session each)
+    workload = []
+    for i in range(args.queries):
+        pages = args.pages[i % len(args.pages)]
+        workload.append((f"bench-{pages}p", per_document[pages][i]))
+
+    def ask(item) -> tuple[float, int]:
+        session_id, question = item
+        started = time.perf_counter()
+        try:
+            status = client.post("/api/query", json={"question": question, "session_id": session_id}).status_code
+        except httpx.HTTPError:
+            status = 0
+        return (time.perf_counter() - started) * 1000, status
+
+    # Warm-up: first-query costs (BM25 build, partition open) aren't steady state
+    for item in workload[:min(3, len(workload))]:
+        ask(item)
+
+    results = []
+    for concurrency in args.concurrency:
+        sampler.reset()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(ask, workload))
+        seconds = time.perf_counter() - started
+
+        latencies = [ms for ms, status in outcomes if status == 200]
+        result = {
+            "concurrency": concurrency,
+            "requests": len(outcomes),
+            "errors": sum(status != 200 for _, status in outcomes),
+            "requests_per_sec": round(len(outcomes) / seconds, 2),
+            "latency": percentiles(latencies),
+            "peak_rss_mb": sampler.peak()
+        }
+        results.append(result)
+        print(f"query concurrency {concurrency:>3}: {result['latency'].get('p95_ms')} ms p95, "
+              f"{result['requests_per_sec']} req/s", file=sys.stderr)
+    return results
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """Current / baseline ratios (>1 = higher than before) for matching runs."""
+    def ratio(current, previous):
+        return round(current / previous, 3) if current and previous else None
+
+    old_uploads = {row["pages"]: row for row in baseline.get("uploads", [])}
+    old_queries = {row["concurrency"]: row for row in baseline.get("queries", [])}
+    return {
+        "baseline_commit": baseline.get("environment", {}).get("commit"),
+        "uploads": [
+            {"pages": row["pages"], "pages_per_sec": ratio(row["pages_per_sec"], old["pages_per_sec"])}
+            for row in report["uploads"] if (old := old_uploads.get(row["pages"]))
+        ],
+        "queries": [
+            {
+                "concurrency": row["concurrency"],
+                "p95_ms": ratio(row["latency"].get("p95_ms"), old["latency"].get("p95_ms")),
+                "requests_per_sec": ratio(row["requests_per_sec"], old["requests_per_sec"])
+            }
+            for row in report["queries"] if (old := old_queries.get(row["concurrency"]))
+        ]
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int_list, default=[1, 10, 50, 100, 500],
+                        help="PDF sizes to upload (default: 1,10,50,100,500)")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4, 16],
+                        help="concurrent /api/query clients (default: 1,4,16)")
+    parser.add_argument("--queries", type=int, default=100, help="queries per concurrency level")
+    parser.add_argument("--ollama-host", help="use this Ollama (real or fake) instead of starting one")
+    parser.add_argument("--ollama-latency-scale", type=float, default=0.0,
+                        help="latency scale of the started fake server (0 = instant, 1 = model-like)")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache on")
+    parser.add_argument("--keep-data", action="store_true", help="don't delete the temporary data dir")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", type=Path, help="previous report to compare against")
+    parser.add_argument("--output", type=Path, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    data_dir = Path(tempfile.mkdtemp(prefix="bench-e2e-"))
+    ollama_process = None
+    if args.ollama_host:
+        ollama_host = args.ollama_host
+    else:
+        ollama_process, ollama_host = start_fake_ollama(args)
+
+    # The app reads its settings (and the ollama client its host) at import
+    # time, so the environment has to be in place before the import below
+    os.environ["DATA_DIR"] = str(data_dir)
+    os.environ["OLLAMA_HOST"] = ollama_host
+    os.environ["ANSWER_CACHE_ENABLED"] = "true" if args.answer_cache else "false"
+    os.environ["SESSION_TTL_SECONDS"] = "0"
+    os.environ["SERVER_TIMING_ENABLED"] = "true"
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+    sampler = RssSampler().start()
+    server = None
+    try:
+        # stdout is reserved for the report; the app's own prints go to stderr
+        with redirect_stdout(sys.stderr):
+            from app.main import app
+
+            port = free_port()
+            server, thread = serve(app, port)
+            with httpx.Client(
+                base_url=f"http://127.0.0.1:{port}", timeout=600,
+                limits=httpx.Limits(max_connections=max(args.concurrency) + 1)
+            ) as client:
+                uploads = bench_uploads(client, args, sampler)
+                queries = bench_queries(client, args, sampler)
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=10)
+        sampler.stop()
+        if ollama_process is not None:
+            ollama_process.terminate()
+            ollama_process.wait(timeout=10)
+        if not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "environment": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "ollama": "fake" if ollama_process else ollama_host
+        },
+        "config": {
+            "pages": args.pages,
+            "concurrency": args.concurrency,
+            "queries": args.queries,
+            "ollama_latency_scale": args.ollama_latency_scale if ollama_process else None,
+            "answer_cache": args.answer_cache
+        },
+        "uploads": uploads,
+        "queries": queries,
+        "peak_rss_mb": max(
+            (row["peak_rss_mb"] for row in uploads + queries if row["peak_rss_mb"]), default=None
+        )
+    }
+    if args.baseline:
+        report["comparison"] = compare(report, json.loads(args.baseline.read_text()))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Query latency of the global filtered collection vs. partitioned collections.
+
+Builds the same synthetic corpus (random vectors, N sessions x M chunks)
+three times in throwaway Chroma databases:
+
+  global   one collection, queries filtered by where={"session_id": ...}
+  session  one collection per session (PartitionManager "session" mode)
+  bucket   sessions hashed into --buckets collections, still filtered
+
+then runs the same random per-session queries against each layout and
+reports ingest time, query latency percentiles, top-1 self-recall,
+on-disk size and resident memory as JSON. Each layout runs in its own
+process, so rss_mb (after ingest and after the queries) and peak_rss_mb
+are that layout's alone. Clients are built like the app's
+(vector_store.persistent_client), so --hnsw-cache-size shows how
+CHROMA_HNSW_CACHE_SIZE bounds memory with many partitions.
+
+Usage (from Task_4_Capstone_project):
+    python -m benchmarks.bench_partitioning --sessions 10000
+    python -m benchmarks.bench_partitioning --sessions 500 --dim 64 --output partitioning.json
+    python -m benchmarks.bench_partitioning --sessions 2000 --modes session --hnsw-cache-size 64
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.vector_store import PartitionManager, persistent_client
+from benchmarks.bench_e2e import RssSampler, current_rss_mb
+
+MODES = ("global", "session", "bucket")
+
+
+def percentiles(samples_ms: list[float]) -> dict:
+    values = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3)
+    }
+
+
+def dir_size_mb(path: Path) -> float:
+    return round(sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / 1e6, 2)
+
+
+def _rounded(rss_mb: Optional[float]) -> Optional[float]:
+    return round(rss_mb, 1) if rss_mb is not None else None
+
+
+def build_corpus(sessions: int, chunks: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    vectors = rng.standard_normal((sessions, chunks, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=2, keepdims=True)
+
+
+def add_batched(collection, ids, vectors, metadatas, batch_size):
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        collection.add(
+            ids=ids[start:end],
+            embeddings=vectors[start:end],
+            metadatas=metadatas[start:end]
+        )
+
+
+def run_mode(mode: str, corpus: np.ndarray, queries: list[tuple[int, int, np.ndarray]], args) -> dict:
+    sessions, chunks, _ = corpus.shape
+    sampler = RssSampler().start()
+    sampler.reset()
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-{mode}-"))
+    client = persistent_client(str(workdir))
+    batch_size = client.get_max_batch_size()
+    manager = PartitionManager(
+        client, mode=mode, buckets=args.buckets,
+        max_open=args.max_open, idle_seconds=float("inf")
+    )
+
+    def session_id(s: int) -> str:
+        return f"session-{s:06d}"
+
+    def chunk_id(s: int, c: int) -> str:
+        return f"{s}-{c}"
+
+    started = time.perf_counter()
+    if mode == "global":
+        target = client.get_or_create_collection(name="bench-global")
+        ids, vectors, metadatas = [], [], []
+        for s in range(sessions):
+            for c in range(chunks):
+                ids.append(chunk_id(s, c))
+                vectors.append(corpus[s, c])
+                metadatas.append({"session_id": session_id(s)})
+        add_batched(target, ids, vectors, metadatas, batch_size)
+    else:
+        grouped = defaultdict(lambda: ([], [], []))
+        for s in range(sessions):
+            name = manager.name_for(session_id(s))
+            group = grouped[name]
+            for c in range(chunks):
+                group[0].append(chunk_id(s, c))
+                group[1].append(corpus[s, c])
+                group[2].append({"session_id": session_id(s)})
+        for s in range(sessions):
+            name = manager.name_for(session_id(s))
+            if name in grouped:
+                add_batched(manager.get(session_id(s)), *grouped.pop(name), batch_size)
+    ingest_seconds = time.perf_counter() - started
+    ingest_rss_mb = _rounded(current_rss_mb())
+
+    latencies = []
+    hits = 0
+    for s, c, query in queries:
+        sid = session_id(s)
+        started = time.perf_counter()
+        if mode == "global":
+            result = target.query(query_embeddings=[query], n_results=args.top_k, where={"session_id": sid})
+        elif mode == "session":
+            result = manager.get(sid, create=False).query(query_embeddings=[query], n_results=args.top_k)
+        else:
+            result = manager.get(sid, create=False).query(
+                query_embeddings=[query], n_results=args.top_k, where={"session_id": sid}
+            )
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += bool(result["ids"][0]) and result["ids"][0][0] == chunk_id(s, c)
+
+    report = {
+        "mode": mode,
+        "collections": len(client.list_collections()),
+        "ingest_seconds": round(ingest_seconds, 2),
+        "query": percentiles(latencies),
+        "top1_recall": round(hits / len(queries), 4),
+        "disk_mb": dir_size_mb(workdir),
+        "rss_mb": {
+            "after_ingest": ingest_rss_mb,
+            "after_queries": _rounded(current_rss_mb())
+        },
+        "peak_rss_mb": sampler.peak(),
+        "partition_handles": manager.stats() if mode != "global" else None
+    }
+    sampler.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def run_mode_isolated(mode: str, corpus: np.ndarray, queries: list, args) -> dict:
+    # A fresh (spawned, not forked) process per layout, so memory is not
+    # inherited from the parent or left behind by the previous layout
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_mode, mode, corpus, queries, args).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--chunks-per-session", type=int, default=8)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--buckets", type=int, default=64)
+    parser.add_argument("--max-open", type=int, default=256)
+    parser.add_argument("--hnsw-cache-size", type=int,
+                        help="HNSW indexes Chroma keeps loaded (default: CHROMA_HNSW_CACHE_SIZE)")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="also write the JSON report here")
+    args = parser.parse_args()
+    if args.hnsw_cache_size is not None:
+        # Read by the settings of the spawned benchmark processes
+        os.environ["CHROMA_HNSW_CACHE_SIZE"] = str(args.hnsw_cache_size)
+
+    rng = np.random.default_rng(args.seed)
+    corpus = build_corpus(args.sessions, args.chunks_per_session, args.dim, rng)
+
+    # Each query is a slightly perturbed stored chunk of a random session
+    queries = []
+    for _ in range(args.queries):
+        s = int(rng.integers(args.sessions))
+        c = int(rng.integers(args.chunks_per_session))
+        queries.append((s, c, corpus[s, c] + rng.normal(0, 0.01, args.dim).astype(np.float32)))
+
+    report = {
+        "config": {
+            "sessions": args.sessions,
+            "chunks_per_session": args.chunks_per_session,
+            "dim": args.dim,
+            "queries": args.queries,
+            "top_k": args.top_k,
+            "buckets": args.buckets,
+            "hnsw_cache_size": (
+                args.hnsw_cache_size if args.hnsw_cache_size is not None else settings.CHROMA_HNSW_CACHE_SIZE
+            )
+        },
+        "results": [run_mode_isolated(mode, corpus, queries, args) for mode in args.modes.split(",")]
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text)
+
+
+if __name__ == "__main__":
+    main()
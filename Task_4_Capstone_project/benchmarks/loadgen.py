@@ -0,0 +1,351 @@
+"""
+Multi-session load generator for a running API (uvicorn app.main:app).
+
+Simulates Streamlit users: sessions arrive as a Poisson process at
+--arrival-rate per second, each uploads a few synthetic PDFs picked from
+--doc-mix (background job + polling, like frontend.py), then asks a burst
+of questions over /api/query/stream with exponential think-time between
+steps. Reports throughput, error rate, status codes and latency
+percentiles per endpoint as JSON.
+
+  --doc-mix "form16:4:0.5,itr:12:0.35,bank_statement:40:0.15"
+            kind:pages:weight; each kind has --doc-variants distinct PDFs,
+            so popular documents repeat across sessions (dedup path)
+  --record trace.jsonl   write every request (time offset, session, endpoint,
+                         document or question, status, latency)
+  --replay trace.jsonl   re-issue a recorded trace at its original offsets
+                         (--speed 2 = twice as fast); each session still
+                         waits for its previous request to finish
+
+/api/reset wipes every session, so it is only sent when asked
+(--reset start|end|both).
+
+Usage (from Task_4_Capstone_project, with the API on port 8000):
+    python -m benchmarks.loadgen --sessions 50 --arrival-rate 2 --think-time 3
+    python -m benchmarks.loadgen --sessions 200 --record trace.jsonl --output load.json
+    python -m benchmarks.loadgen --replay trace.jsonl --speed 4
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_e2e import percentiles
+from benchmarks.synthetic import make_pdf, questions
+
+JOB_POLL_INTERVAL = 0.5  # same as frontend.py
+
+
+def int_range(value: str) -> tuple[int, int]:
+    """'3' -> (3, 3), '1-3' -> (1, 3)."""
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+def doc_mix(value: str) -> list[tuple[str, int, float]]:
+    mix = []
+    for item in value.split(","):
+        kind, pages, weight = item.split(":")
+        mix.append((kind, int(pages), float(weight)))
+    return mix
+
+
+@lru_cache(maxsize=256)
+def pdf_bytes(pages: int, seed: int) -> bytes:
+    return make_pdf(pages, seed=seed)
+
+
+class Stats:
+    """Latency samples and status codes per endpoint."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self.errors: Counter = Counter()
+
+    def add(self, endpoint: str, status: int, latency_ms: float, ok: bool):
+        self.statuses[endpoint][status] += 1
+        if ok:
+            self.latencies[endpoint].append(latency_ms)
+        else:
+            self.errors[endpoint] += 1
+
+    def report(self, seconds: float) -> dict:
+        report = {}
+        for endpoint, statuses in sorted(self.statuses.items()):
+            requests = sum(statuses.values())
+            report[endpoint] = {
+                "requests": requests,
+                "errors": self.errors[endpoint],
+                "error_rate": round(self.errors[endpoint] / requests, 4),
+                "throughput_rps": round(requests / seconds, 3),
+                "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+                "latency": percentiles(self.latencies[endpoint])
+            }
+        return report
+
+
+class LoadRunner:
+    def __init__(self, client: httpx.AsyncClient, args, recorder=None):
+        self.client = client
+        self.args = args
+        self.recorder = recorder
+        self.stats = Stats()
+        self.started = 0.0
+        self.sessions = Counter()
+
+    def _record(self, step: dict, status: int, latency_ms: float):
+        if self.recorder is None:
+            return
+        event = {key: step[key] for key in ("session_id", "endpoint", "doc", "question") if step.get(key) is not None}
+        event.update(t=round(step["issued"], 4), status=status, latency_ms=round(latency_ms, 2))
+        self.recorder.write(json.dumps(event) + "\n")
+
+    async def upload(self, step: dict) -> bool:
+        doc = step["doc"]
+        background = not self.args.inline_uploads
+        started = time.perf_counter()
+        status = 0
+        try:
+            response = await self.client.post(
+                "/api/upload",
+                files={"file": (f"{doc['kind']}_{doc['seed']}.pdf", pdf_bytes(doc["pages"], doc["seed"]), "application/pdf")},
+                data={"session_id": step["session_id"], "background": str(background).lower()}
+            )
+            status = response.status_code
+            if status == 202:
+                job_id = response.json()["job_id"]
+                while True:
+                    await asyncio.sleep(JOB_POLL_INTERVAL)
+                    job = (await self.client.get(f"/api/jobs/{job_id}")).json()
+                    if job["status"] == "completed":
+                        status = 200
+                        break
+                    if job["status"] == "failed":
+                        status = job.get("error_code") or 500
+                        break
+        except httpx.HTTPError:
+            status = 0
+        latency_ms = (time.perf_counter() - started) * 1000
+        ok = status == 200
+        self.stats.add("upload", status, latency_ms, ok)
+        self._record(step, status, latency_ms)
+        return ok
+
+    async def query(self, step: dict) -> bool:
+        payload = {"question": step["question"], "session_id": step["session_id"]}
+        started = time.perf_counter()
+        status = 0
+        ok = False
+        try:
+            if self.args.no_stream:
+                response = await self.client.post("/api/query", json=payload)
+                status = response.status_code
+                ok = status == 200
+            else:
+                async with self.client.stream("POST", "/api/query/stream", json=payload) as response:
+                    status = response.status_code
+                    ok = status == 200
+                    first_token = None
+                    async for line in response.aiter_lines():
+                        if line == "event: token" and first_token is None:
+                            first_token = (time.perf_counter() - started) * 1000
+                        elif line == "event: error":
+                            ok = False
+                    if first_token is not None:
+                        self.stats.add("query_first_token", status, first_token, True)
+        except httpx.HTTPError:
+            ok = False
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.stats.add("query", status, latency_ms, ok)
+        self._record(step, status, latency_ms)
+        return ok
+
+    async def reset(self, step: dict) -> bool:
+        started = time.perf_counter()
+        try:
+            status = (await self.client.delete("/api/reset")).status_code
+        except httpx.HTTPError:
+            status = 0
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.stats.add("reset", status, latency_ms, status == 200)
+        self._record(step, status, latency_ms)
+        return status == 200
+
+    async def run_session(self, steps: list[dict]):
+        """
+        Runs one session's steps in order. A step waits until its offset "t"
+        (replay, arrival) or for its "think" seconds after the previous one.
+        """
+        self.sessions["started"] += 1
+        ok = True
+        for step in steps:
+            if "t" in step:
+                delay = self.started + step["t"] / self.args.speed - time.perf_counter()
+            else:
+                delay = step.get("think", 0) / self.args.speed
+            if delay > 0:
+                await asyncio.sleep(delay)
+            step["issued"] = time.perf_counter() - self.started
+            ok = await getattr(self, step["endpoint"])(step) and ok
+        self.sessions["completed" if ok else "failed"] += 1
+
+    async def run(self, plan: list[list[dict]], before: list[dict], after: list[dict]):
+        self.started = time.perf_counter()
+        for step in before:
+            step["issued"] = 0.0
+            await self.reset(step)
+        await asyncio.gather(*(self.run_session(steps) for steps in plan))
+        for step in after:
+            step["issued"] = time.perf_counter() - self.started
+            await self.reset(step)
+        return time.perf_counter() - self.started
+
+
+def generate_plan(args, prefix: str) -> list[list[dict]]:
+    """Synthetic sessions: arrival offset, uploads, then questions with think-time."""
+    rng = random.Random(args.seed)
+    kinds = [(kind, pages) for kind, pages, _ in args.doc_mix]
+    weights = [weight for _, _, weight in args.doc_mix]
+    plan = []
+    arrival = 0.0
+    for index in range(args.sessions):
+        session_id = f"{prefix}{index:05d}"
+        steps = []
+        docs = [
+            rng.choices(kinds, weights)[0]
+            for _ in range(rng.randint(*args.docs_per_session))
+        ]
+        for position, (kind, pages) in enumerate(docs):
+            step = {
+                "session_id": session_id,
+                "endpoint": "upload",
+                "doc": {"kind": kind, "pages": pages, "seed": rng.randrange(args.doc_variants)}
+            }
+            if position == 0:
+                step["t"] = arrival
+            else:
+                step["think"] = rng.expovariate(1 / args.think_time) if args.think_time else 0
+            steps.append(step)
+
+        max_pages = max(pages for _, pages in docs)
+        for question in questions(max_pages, rng.randint(*args.questions), seed=rng.randrange(1 << 30)):
+            steps.append({
+                "session_id": session_id,
+                "endpoint": "query",
+                "question": question,
+                "think": rng.expovariate(1 / args.think_time) if args.think_time else 0
+            })
+        plan.append(steps)
+        if args.arrival_rate > 0:
+            arrival += rng.expovariate(args.arrival_rate)
+    return plan
+
+
+def load_trace(path: Path, prefix: str) -> tuple[list[list[dict]], list[dict], list[dict]]:
+    """
+    Recorded events -> (per-session plans, resets before, resets after).
+    Session ids get a fresh prefix so caches and dedup from the recorded
+    run don't skew the replay.
+    """
+    sessions: dict[str, list[dict]] = {}
+    resets = []
+    for line in path.read_text().splitlines():
+        if not line.strip():
+            continue
+        event = json.loads(line)
+        step = {key: event[key] for key in ("endpoint", "doc", "question", "t") if key in event}
+        if event["endpoint"] == "reset":
+            resets.append(step)
+            continue
+        original = event["session_id"]
+        if original not in sessions:
+            sessions[original] = []
+        step["session_id"] = f"{prefix}{list(sessions).index(original):05d}"
+        sessions[original].append(step)
+
+    plan = [sorted(steps, key=lambda step: step["t"]) for steps in sessions.values()]
+    first_request = min((steps[0]["t"] for steps in plan), default=float("inf"))
+    before = [step for step in resets if step["t"] <= first_request]
+    after = [step for step in resets if step["t"] > first_request]
+    return plan, before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--arrival-rate", type=float, default=1.0, help="new sessions per second (0 = all at once)")
+    parser.add_argument("--doc-mix", type=doc_mix, default=doc_mix("form16:4:0.5,itr:12:0.35,bank_statement:40:0.15"))
+    parser.add_argument("--doc-variants", type=int, default=50, help="distinct PDFs per document kind")
+    parser.add_argument("--docs-per-session", type=int_range, default=(1, 3), help="e.g. 1-3")
+    parser.add_argument("--questions", type=int_range, default=(3, 8), help="questions per session, e.g. 3-8")
+    parser.add_argument("--think-time", type=float, default=5.0, help="mean seconds between a session's requests")
+    parser.add_argument("--inline-uploads", action="store_true", help="upload without background jobs")
+    parser.add_argument("--no-stream", action="store_true", help="use /api/query instead of /api/query/stream")
+    parser.add_argument("--reset", choices=("none", "start", "end", "both"), default="none")
+    parser.add_argument("--record", type=Path, help="write the issued requests to this JSONL trace")
+    parser.add_argument("--replay", type=Path, help="replay a recorded JSONL trace instead of generating load")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression for offsets and think-time")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    prefix = f"load-{int(time.time())}-"
+    if args.replay:
+        plan, before, after = load_trace(args.replay, prefix)
+    else:
+        plan = generate_plan(args, prefix)
+        before = [{"endpoint": "reset", "t": 0.0}] if args.reset in ("start", "both") else []
+        after = [{"endpoint": "reset"}] if args.reset in ("end", "both") else []
+
+    async def run() -> tuple[float, LoadRunner]:
+        recorder = args.record.open("w") if args.record else None
+        try:
+            async with httpx.AsyncClient(
+                base_url=args.url, timeout=args.timeout, limits=httpx.Limits(max_connections=None)
+            ) as client:
+                runner = LoadRunner(client, args, recorder)
+                seconds = await runner.run(plan, before, after)
+        finally:
+            if recorder:
+                recorder.close()
+        return seconds, runner
+
+    seconds, runner = asyncio.run(run())
+
+    report = {
+        "config": {
+            "url": args.url,
+            "mode": f"replay {args.replay}" if args.replay else "generated",
+            "sessions": len(plan),
+            "arrival_rate": None if args.replay else args.arrival_rate,
+            "think_time": None if args.replay else args.think_time,
+            "speed": args.speed,
+            "stream": not args.no_stream,
+            "background_uploads": not args.inline_uploads
+        },
+        "duration_seconds": round(seconds, 2),
+        "sessions": dict(runner.sessions),
+        "endpoints": runner.stats.report(seconds)
+    }
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:>18}: {row['requests']} requests, {row['error_rate']:.1%} errors, "
+              f"p95 {row['latency'].get('p95_ms')} ms", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Synthetic tax-document PDFs for benchmarks: deterministic, any page count,
+about 2 KB of text per page (a typical text-layer Form 16 / ITR page), with
+page-specific figures so questions have a single right page.
+"""
+import io
+import random
+
+LINES_PER_PAGE = 16
+
+SUBJECTS = (
+    "Gross salary", "House rent allowance", "Standard deduction", "Professional tax",
+    "Deduction under section 80C", "Deduction under section 80D", "Interest on housing loan",
+    "Tax deducted at source", "Advance tax paid", "Income from other sources",
+    "Leave travel allowance", "Employer contribution to NPS", "Taxable income", "Rebate under section 87A"
+)
+VERBS = ("reported for", "claimed in", "assessed for", "credited during", "declared for")
+FILLER = (
+    "as certified by the employer in the statement attached to this return",
+    "subject to verification against Form 26AS and the annual information statement",
+    "computed at the rates in force for the relevant assessment year",
+    "after adjusting exemptions allowed under section 10 of the Act",
+    "as per the details furnished by the deductor for the quarter"
+)
+
+
+def page_lines(page: int, rng: random.Random) -> list[str]:
+    lines = [f"ANNUAL TAX STATEMENT - PAGE {page}"]
+    for _ in range(LINES_PER_PAGE - 1):
+        amount = rng.randrange(1_000, 10_00_000)
+        lines.append(
+            f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} FY 2023-24 on page {page} is "
+            f"Rs {amount:,} {rng.choice(FILLER)}."
+        )
+    return lines
+
+
+def questions(pages: int, count: int, seed: int = 0) -> list[str]:
+    """Questions that each point at one page of a document from make_pdf."""
+    rng = random.Random(seed)
+    return [
+        f"What is the {rng.choice(SUBJECTS).lower()} on page {rng.randrange(1, pages + 1)}?"
+        for _ in range(count)
+    ]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    """A valid, uncompressed PDF with one font and a text layer on every page."""
+    rng = random.Random(f"{seed}-{pages}")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(1, pages + 1):
+        body = " Tj T* ".join(f"({_escape(line)})" for line in page_lines(page, rng))
+        stream = f"BT /F1 8 Tf 11 TL 40 760 Td {body} Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>".encode()
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (num, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
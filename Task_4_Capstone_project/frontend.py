@@ -1,9 +1,13 @@
 import streamlit as st
 import requests
 import uuid
+import time
+import json
 
 # --- CONFIGURATION ---
 API_URL = "http://127.0.0.1:8000/api" 
+JOB_POLL_SECONDS = 0.5
+JOB_MAX_WAIT_SECONDS = 600
 st.set_page_config(page_title="Tax Assistant AI", page_icon="⚖️")
 
 # --- INITIALIZE SESSION STATE ---
@@ -32,6 +36,47 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# --- HELPERS ---
+def wait_for_job(job_id, status_area, filename):
+    """
+    Polls a background ingestion job until it finishes. Returns (status_code, body).
+    Gives up after JOB_MAX_WAIT_SECONDS, or as soon as the job is unknown (404).
+    """
+    job_bar = st.progress(0)
+    deadline = time.monotonic() + JOB_MAX_WAIT_SECONDS
+    while True:
+        response = requests.get(f"{API_URL}/jobs/{job_id}", timeout=30)
+        if response.status_code == 404:
+            job_bar.empty()
+            return 404, {"detail": f"Job for {filename} no longer exists (was the server restarted?)"}
+        response.raise_for_status()
+        job = response.json()
+        job_bar.progress(job["progress"] / 100)
+        status_area.text(f"Processing {filename}: {job['stage']} ({job['progress']}%)")
+
+        if job["status"] == "completed":
+            job_bar.empty()
+            return 200, job["result"]
+        if job["status"] == "failed":
+            job_bar.empty()
+            return job.get("error_code") or 500, {"detail": job["error"]}
+        if time.monotonic() >= deadline:
+            job_bar.empty()
+            return 504, {"detail": f"Gave up waiting for {filename} after {JOB_MAX_WAIT_SECONDS} seconds"}
+
+        time.sleep(JOB_POLL_SECONDS)
+
+def read_sse(response):
+    """Yields (event, data) pairs from a server-sent events response."""
+    event = "message"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            event = "message"
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+
 # --- SIDEBAR: UPLOAD ---
 with st.sidebar:
     st.title("📂 Document Upload")
@@ -60,8 +105,8 @@ with st.sidebar:
             # 1. Reset File Pointer (Crucial)
             file.seek(0)
             
-            # 2. Prepare Data
-            data_payload = {"session_id": st.session_state.session_id}
+            # 2. Prepare Data (processed as a background job on the server)
+            data_payload = {"session_id": st.session_state.session_id, "background": "true"}
             
             # 3. Inject Password if it exists in State
             if file.name in st.session_state.file_passwords:
@@ -70,11 +115,18 @@ with st.sidebar:
             try:
                 files_payload = {"file": (file.name, file, "application/pdf")}
                 response = requests.post(f"{API_URL}/upload", files=files_payload, data=data_payload)
+                status_code, body = response.status_code, response.json()
+
+                if status_code == 202:
+                    status_code, body = wait_for_job(body["job_id"], status_area, file.name)
                 
-                if response.status_code == 200:
-                    st.success(f"✅ {file.name} Indexed!")
+                if status_code == 200:
+                    if body.get("deduplicated"):
+                        st.info(f"♻️ {file.name} was already processed, reused existing index.")
+                    else:
+                        st.success(f"✅ {file.name} Indexed!")
                 
-                elif response.status_code in [422, 400]:
+                elif status_code in [422, 400]:
                     all_success = False # We hit a snag
                     st.error(f"🔒 Password Required for {file.name}")
                     
@@ -95,7 +147,7 @@ with st.sidebar:
                     st.stop()
                         
                 else:
-                    st.error(f"❌ {file.name} Error: {response.json().get('detail')}")
+                    st.error(f"❌ {file.name} Error: {body.get('detail')}")
                     
             except Exception as e:
                 st.error(f"Server Error: {e}")
@@ -130,24 +182,39 @@ if prompt := st.chat_input("Ask about your tax documents..."):
         st.write(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Analyzing..."):
-            try:
-                payload = {"question": prompt, "session_id": st.session_state.session_id}
-                response = requests.post(f"{API_URL}/query", json=payload)
-                
+        answer_box = st.empty()
+        answer_box.markdown("_Analyzing..._")
+        try:
+            payload = {"question": prompt, "session_id": st.session_state.session_id}
+            # Stream the answer as server-sent events instead of waiting for the full reply
+            with requests.post(f"{API_URL}/query/stream", json=payload, stream=True) as response:
                 if response.status_code == 200:
-                    data = response.json()
-                    st.markdown(f"<div class='chat-answer'>{data['answer']}</div>", unsafe_allow_html=True)
-                    if data.get("citations"):
+                    answer = ""
+                    citations = []
+                    for event, data in read_sse(response):
+                        if event == "citations":
+                            citations = data
+                        elif event == "token":
+                            answer += data["text"]
+                            answer_box.markdown(f"<div class='chat-answer'>{answer}▌</div>", unsafe_allow_html=True)
+                        elif event == "done":
+                            answer = data["answer"]
+                        elif event == "error":
+                            st.error(f"Error: {data.get('detail')}")
+
+                    answer_box.markdown(f"<div class='chat-answer'>{answer}</div>", unsafe_allow_html=True)
+                    if citations:
                         with st.expander("📚 View Sources"):
-                            for cit in data["citations"]:
+                            for cit in citations:
                                 st.markdown(f"- **Page {cit['page']}** ({cit['source']}): _{cit['text']}..._")
                     st.session_state.messages.append({
                         "role": "assistant", 
-                        "content": data["answer"], 
-                        "citations": data.get("citations")
+                        "content": answer, 
+                        "citations": citations
                     })
                 else:
+                    answer_box.empty()
                     st.error(f"Error: {response.json().get('detail')}")
-            except Exception as e:
-                st.error(f"Connection Failed: {e}")
+        except Exception as e:
+            answer_box.empty()
+            st.error(f"Connection Failed: {e}")
@@ -1,13 +1,19 @@
 import pytest
 from unittest.mock import MagicMock, patch
 from fastapi.testclient import TestClient
+import io
 import sys
 from pathlib import Path
+from pypdf import PdfReader, PdfWriter
 
 # Add the project root to the python path so imports work
 sys.path.append(str(Path(__file__).parent.parent))
 
 from app.main import app
+from app.core.config import settings
+from app.services.document_registry import DocumentRegistry
+from app.services.answer_cache import answer_cache
+from app.services.sessions import SessionTracker
 
 @pytest.fixture
 def client():
@@ -33,4 +39,99 @@ def mock_settings():
         mock_settings.MAX_FILE_SIZE_MB = 10
         mock_settings.TOP_K = 2
         
-        yield mock_settings
\ No newline at end of file
+        yield mock_settings
+
+@pytest.fixture(autouse=True)
+def no_embedding_cache():
+    """
+    Disables the on-disk embedding cache so tests never read vectors
+    cached by earlier runs (or by a local dev server).
+    """
+    with patch("app.services.embedding.embedding_cache", None):
+        yield
+
+@pytest.fixture(autouse=True)
+def document_registry(tmp_path):
+    """Gives every test an empty, throwaway document registry."""
+    registry = DocumentRegistry(tmp_path / "documents.sqlite3")
+    with patch("app.services.document_registry.registry", registry):
+        yield registry
+
+@pytest.fixture(autouse=True)
+def session_tracker(tmp_path):
+    """Keeps session last-access tracking out of the real data directory."""
+    tracker = SessionTracker(tmp_path / "sessions.sqlite3", touch_interval=0)
+    with patch("app.services.sessions.session_tracker", tracker):
+        yield tracker
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path):
+    """Uploaded PDFs land in a per-test directory."""
+    path = tmp_path / "uploads"
+    path.mkdir()
+    with patch.object(settings, "UPLOAD_DIR", path):
+        yield path
+
+@pytest.fixture
+def fake_pdf_reader():
+    """Builds a mock PdfReader whose pages return the given texts."""
+    def _build(*page_texts):
+        reader = MagicMock()
+        reader.is_encrypted = False
+        reader.pages = []
+        for text in page_texts:
+            page = MagicMock()
+            page.extract_text.return_value = text
+            reader.pages.append(page)
+        return reader
+    return _build
+
+@pytest.fixture
+def make_pdf():
+    """Builds a real (optionally encrypted) PDF with one line of text per page."""
+    def _build(page_texts, password=None) -> bytes:
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            None,  # page tree, filled in below
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        ]
+        kids = []
+        for text in page_texts:
+            escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            stream = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode()
+            objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+            objects.append(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>".encode()
+            )
+            kids.append(f"{len(objects)} 0 R")
+        objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+        out = io.BytesIO()
+        out.write(b"%PDF-1.4\n")
+        offsets = []
+        for num, body in enumerate(objects, start=1):
+            offsets.append(out.tell())
+            out.write(b"%d 0 obj\n%s\nendobj\n" % (num, body))
+        xref = out.tell()
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            out.write(b"%010d 00000 n \n" % offset)
+        out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+        data = out.getvalue()
+
+        if password:
+            writer = PdfWriter(clone_from=PdfReader(io.BytesIO(data)))
+            writer.encrypt(password, algorithm="RC4-128")
+            encrypted = io.BytesIO()
+            writer.write(encrypted)
+            data = encrypted.getvalue()
+        return data
+    return _build
+
+@pytest.fixture(autouse=True)
+def empty_answer_cache():
+    """Answers cached by one test must not leak into the next."""
+    answer_cache.clear()
+    yield answer_cache
+    answer_cache.clear()
\ No newline at end of file
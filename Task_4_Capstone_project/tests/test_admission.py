@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+from app.services.admission import GenerationLimiter
+
+# --- TEST 1: Queue Bound ---
+def test_limiter_rejects_when_queue_is_full():
+    """With every slot busy and no queue room, callers get 429 + Retry-After."""
+    limiter = GenerationLimiter(max_concurrent=1, max_queue=0, queue_timeout=1, retry_after=7)
+
+    async def scenario():
+        await limiter.acquire()
+        with pytest.raises(HTTPException) as exc:
+            await limiter.acquire()
+        limiter.release()
+        return exc.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "7"
+
+# --- TEST 2: Queue Timeout ---
+def test_limiter_times_out_queued_requests():
+    """A queued request gives up after queue_timeout instead of hanging."""
+    limiter = GenerationLimiter(max_concurrent=1, max_queue=5, queue_timeout=0.05, retry_after=1)
+
+    async def scenario():
+        await limiter.acquire()
+        with pytest.raises(HTTPException) as exc:
+            await limiter.acquire()
+        return exc.value
+
+    assert asyncio.run(scenario()).status_code == 429
+    assert limiter.stats()["rejected"] == 1
+
+# --- TEST 3: Concurrency Bound ---
+def test_limiter_caps_concurrent_generations():
+    limiter = GenerationLimiter(max_concurrent=2, max_queue=10, queue_timeout=5, retry_after=1)
+    peak = 0
+
+    async def generate():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.active)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await asyncio.gather(*(generate() for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+    assert limiter.active == 0
+
+# --- TEST 4: Endpoint Maps Rejection to 429 ---
+@patch("app.api.query.aembed_query")
+@patch("app.services.vector_store.search_similar")
+def test_query_returns_429_when_overloaded(mock_search, mock_embed, client):
+    mock_embed.return_value = [0.1, 0.2]
+    mock_search.return_value = {
+        "documents": [["Tax info"]],
+        "metadatas": [[{"page": 1, "source": "doc.pdf"}]]
+    }
+    busy = HTTPException(status_code=429, detail="Server is busy", headers={"Retry-After": "5"})
+
+    with patch("app.api.query.generation_limiter.acquire", side_effect=busy):
+        response = client.post("/api/query", json={"question": "How much tax?", "session_id": "s1"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
@@ -0,0 +1,126 @@
+import pytest
+from unittest.mock import patch
+from app.models.response import QueryResponse, Citation
+from app.services.answer_cache import SemanticAnswerCache
+
+def _response(answer):
+    return QueryResponse(answer=answer, citations=[Citation(source="doc.pdf", page=1, text="Tax info")])
+
+# --- TEST 1: Similar Questions Hit ---
+def test_similar_question_hits_within_threshold():
+    cache = SemanticAnswerCache(threshold=0.95, max_entries_per_session=10, max_sessions=10)
+    cache.store("s1", [1.0, 0.0, 0.0], "How much tax?", _response("Income is 5L"))
+
+    assert cache.lookup("s1", [0.99, 0.05, 0.0], "How much tax?").answer == "Income is 5L"  # cosine ~0.999
+    assert cache.lookup("s1", [0.0, 1.0, 0.0], "How much tax?") is None                      # different question
+    assert cache.lookup("s2", [1.0, 0.0, 0.0], "How much tax?") is None                      # other session
+    assert cache.stats()["hit_rate"] == pytest.approx(1 / 3, abs=1e-3)
+
+# --- TEST 1b: Same Embedding, Different Section or Amount ---
+def test_hit_requires_matching_numbers_and_sections():
+    cache = SemanticAnswerCache(threshold=0.95, max_entries_per_session=10, max_sessions=10)
+    cache.store("s1", [1.0, 0.0], "What deduction is allowed under 80C?", _response("Up to 1.5L"))
+    cache.store("s1", [0.99, 0.05], "Is a deduction of 25,000 allowed?", _response("Yes, under 80D"))
+
+    # Embeddings nearly identical, but the section / amount differs
+    assert cache.lookup("s1", [1.0, 0.0], "What deduction is allowed under 80D?") is None
+    assert cache.lookup("s1", [1.0, 0.0], "Is a deduction of 50,000 allowed?") is None
+    assert cache.lookup("s1", [1.0, 0.0], "What deduction is allowed?") is None
+
+    # Same terms: the best match with matching terms wins, even if not the closest vector
+    assert cache.lookup("s1", [1.0, 0.0], "Which deduction applies under section 80c?").answer == "Up to 1.5L"
+    assert cache.lookup("s1", [1.0, 0.0], "Is a deduction of 25000 allowed?").answer == "Yes, under 80D"
+
+# --- TEST 2: Invalidation ---
+def test_invalidate_session_drops_answers():
+    cache = SemanticAnswerCache(threshold=0.95, max_entries_per_session=10, max_sessions=10)
+    cache.store("s1", [1.0, 0.0], "How much tax?", _response("Old answer"))
+
+    cache.invalidate_session("s1")
+
+    assert cache.lookup("s1", [1.0, 0.0], "How much tax?") is None
+    assert cache.stats()["invalidations"] == 1
+
+# --- TEST 3: Query Endpoint Uses the Cache ---
+@patch("app.api.query.settings.ANSWER_CACHE_ENABLED", True)
+@patch("app.api.query.agenerate_answer")
+@patch("app.api.query.aembed_query")
+@patch("app.services.vector_store.search_similar")
+def test_repeat_question_skips_search_and_llm(mock_search, mock_embed, mock_llm, client):
+    mock_embed.return_value = [0.1, 0.2]
+    mock_search.return_value = {
+        "documents": [["Tax info"]],
+        "metadatas": [[{"page": 1, "source": "doc.pdf"}]]
+    }
+    mock_llm.return_value = "Your tax is 10%."
+    payload = {"question": "How much tax?", "session_id": "session_123"}
+
+    first = client.post("/api/query", json=payload).json()
+    second = client.post("/api/query", json=payload).json()
+
+    assert first == second
+    mock_search.assert_called_once()
+    mock_llm.assert_called_once()
+    assert client.get("/api/cache/stats").json()["answer_cache"]["hits"] == 1
+
+
+# --- TEST 4: Invalidation While an Answer Is Being Generated ---
+@patch("app.api.query.settings.ANSWER_CACHE_ENABLED", True)
+@patch("app.api.query.agenerate_answer")
+@patch("app.api.query.aembed_query")
+@patch("app.services.vector_store.search_similar")
+def test_answer_generated_across_invalidation_is_not_cached(mock_search, mock_embed, mock_llm, client,
+                                                            empty_answer_cache):
+    mock_embed.return_value = [0.1, 0.2]
+    mock_search.return_value = {
+        "documents": [["Tax info"]],
+        "metadatas": [[{"page": 1, "source": "doc.pdf"}]]
+    }
+
+    async def generate_while_upload_finishes(question, contexts):
+        # An upload for the same session completes mid-generation
+        empty_answer_cache.invalidate_session("session_123")
+        return "Answer from the old documents."
+
+    mock_llm.side_effect = generate_while_upload_finishes
+    payload = {"question": "How much tax?", "session_id": "session_123"}
+
+    client.post("/api/query", json=payload)
+    client.post("/api/query", json=payload)
+
+    assert mock_llm.call_count == 2
+    assert empty_answer_cache.stats()["entries"] == 0
+
+
+def test_stale_generation_is_not_stored():
+    cache = SemanticAnswerCache(threshold=0.95, max_entries_per_session=10, max_sessions=1)
+    before = cache.generation("s1")
+    cache.invalidate_session("s1")
+    cache.store("s1", [1.0, 0.0], "How much tax?", _response("Stale"), generation=before)
+    assert cache.lookup("s1", [1.0, 0.0], "How much tax?") is None
+
+    # Still refused once s1's generation is evicted by another session's
+    cache.invalidate_session("s2")
+    cache.store("s1", [1.0, 0.0], "How much tax?", _response("Stale"), generation=before)
+    assert cache.lookup("s1", [1.0, 0.0], "How much tax?") is None
+
+    cache.store("s2", [1.0, 0.0], "How much tax?", _response("Fresh"), generation=cache.generation("s2"))
+    assert cache.lookup("s2", [1.0, 0.0], "How much tax?").answer == "Fresh"
+
+
+@patch("app.api.query.agenerate_answer")
+@patch("app.api.query.aembed_query")
+@patch("app.services.vector_store.search_similar")
+def test_answer_cache_is_off_by_default(mock_search, mock_embed, mock_llm, client):
+    mock_embed.return_value = [0.1, 0.2]
+    mock_search.return_value = {
+        "documents": [["Tax info"]],
+        "metadatas": [[{"page": 1, "source": "doc.pdf"}]]
+    }
+    mock_llm.return_value = "Your tax is 10%."
+    payload = {"question": "How much tax?", "session_id": "session_123"}
+
+    client.post("/api/query", json=payload)
+    client.post("/api/query", json=payload)
+
+    assert mock_llm.call_count == 2
@@ -1,13 +1,16 @@
+import hashlib
+import io
 import pytest
+import time
 from unittest.mock import patch
 
 # --- TEST UPLOAD ENDPOINT ---
-@patch("app.api.upload.store_chunks")       # Mock DB storage
-@patch("app.api.upload.embed_texts")        # Mock Embedding
-@patch("app.api.upload.extract_text_from_pdf") # Mock PDF reading
-def test_upload_flow(mock_extract, mock_embed, mock_store, client):
+@patch("app.services.ingestion.store_chunks")       # Mock DB storage
+@patch("app.services.ingestion.embed_texts")        # Mock Embedding
+@patch("app.services.ingestion.open_pdf") # Mock PDF reading
+def test_upload_flow(mock_extract, mock_embed, mock_store, client, fake_pdf_reader):
     # Setup Mocks
-    mock_extract.return_value = [{"text": "Sample", "page": 1}]
+    mock_extract.return_value = fake_pdf_reader("Sample")
     mock_embed.return_value = [[0.1, 0.2]]
     mock_store.return_value = True
 
@@ -23,9 +26,119 @@ def test_upload_flow(mock_extract, mock_embed, mock_store, client):
     mock_store.assert_called_once()
     assert mock_store.call_args[1]["session_id"] == "session_123"
 
+@patch("app.services.ingestion.copy_document_to_session")
+@patch("app.services.ingestion.store_chunks")
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_upload_same_pdf_is_deduplicated(mock_extract, mock_embed, mock_store, mock_copy, client, fake_pdf_reader):
+    """Re-uploading identical bytes skips extraction and embedding."""
+    mock_extract.return_value = fake_pdf_reader("Sample")
+    mock_embed.return_value = [[0.1, 0.2]]
+    mock_copy.return_value = 1
+
+    files = {"file": ("test.pdf", b"SAME_BYTES", "application/pdf")}
+    client.post("/api/upload", files=files, data={"session_id": "session_a"})
+
+    # Same session again: returns immediately
+    again = client.post("/api/upload", files=files, data={"session_id": "session_a"})
+    assert again.json()["deduplicated"] is True
+    mock_copy.assert_not_called()
+
+    # Another session: stored vectors are attached to it
+    other = client.post("/api/upload", files=files, data={"session_id": "session_b"})
+    assert other.json()["chunks_stored"] == 1
+    mock_copy.assert_called_once()
+    assert mock_copy.call_args[0][1] == "session_b"
+
+    assert mock_extract.call_count == 1
+    assert mock_embed.call_count == 1
+
+@patch("app.services.ingestion.copy_document_to_session")
+@patch("app.services.ingestion.store_chunks")
+@patch("app.services.ingestion.embed_texts")
+def test_encrypted_pdf_is_not_reused_without_password(mock_embed, mock_store, mock_copy, client, make_pdf):
+    """Another session's copy of an encrypted PDF must still be unlocked before dedup."""
+    mock_embed.return_value = [[0.1, 0.2]]
+    mock_copy.return_value = 1
+    data = make_pdf(["Gross salary 1200000"], password="secret")
+
+    first = client.post("/api/upload", files={"file": ("locked.pdf", data, "application/pdf")},
+                        data={"session_id": "session_a", "password": "secret"})
+    assert first.status_code == 200
+
+    files = {"file": ("locked.pdf", data, "application/pdf")}
+    missing = client.post("/api/upload", files=files, data={"session_id": "session_b"})
+    assert missing.status_code == 422
+    wrong = client.post("/api/upload", files=files, data={"session_id": "session_b", "password": "guess"})
+    assert wrong.status_code == 400
+    assert "Incorrect password" in wrong.json()["detail"]
+    mock_copy.assert_not_called()
+
+    unlocked = client.post("/api/upload", files=files, data={"session_id": "session_b", "password": "secret"})
+    assert unlocked.json()["deduplicated"] is True
+    mock_copy.assert_called_once()
+    assert mock_embed.call_count == 1
+
+@patch("app.services.ingestion.store_chunks")
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_upload_background_job(mock_extract, mock_embed, mock_store, client, fake_pdf_reader):
+    """background=true returns a job id that can be polled until completion."""
+    mock_extract.return_value = fake_pdf_reader("Sample")
+    mock_embed.return_value = [[0.1, 0.2]]
+
+    files = {"file": ("job.pdf", b"JOB_BYTES", "application/pdf")}
+    response = client.post("/api/upload", files=files, data={"session_id": "s1", "background": "true"})
+
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    for _ in range(100):
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.02)
+
+    assert job["status"] == "completed"
+    assert job["progress"] == 100
+    assert job["result"]["chunks_stored"] == 1
+
+@patch("app.services.ingestion.store_chunks")
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_upload_is_content_addressed_and_parsed_in_memory(mock_extract, mock_embed, mock_store, client, fake_pdf_reader, upload_dir):
+    mock_extract.return_value = fake_pdf_reader("Sample")
+    mock_embed.return_value = [[0.1, 0.2]]
+
+    files = {"file": ("../../form16.pdf", b"PDF_BYTES", "application/pdf")}
+    response = client.post("/api/upload", files=files, data={"session_id": "s1"})
+
+    assert response.status_code == 200
+    digest = hashlib.sha256(b"PDF_BYTES").hexdigest()
+    assert (upload_dir / digest[:2] / f"{digest}.pdf").read_bytes() == b"PDF_BYTES"
+    # The parser got the buffered bytes, not a path to read back from disk
+    assert isinstance(mock_extract.call_args[0][0], io.BytesIO)
+
+@patch("app.services.ingestion.open_pdf")
+def test_upload_over_size_limit_is_rejected(mock_extract, client):
+    with patch("app.api.upload.settings.MAX_FILE_SIZE_MB", 0):
+        files = {"file": ("big.pdf", b"x" * 1024, "application/pdf")}
+        response = client.post("/api/upload", files=files, data={"session_id": "s1"})
+
+        # Content-Length beyond limit + form overhead: refused before parsing
+        files = {"file": ("huge.pdf", b"x" * 200_000, "application/pdf")}
+        early = client.post("/api/upload", files=files, data={"session_id": "s1"})
+
+    assert response.status_code == 413
+    assert early.status_code == 413
+    mock_extract.assert_not_called()
+
+def test_unknown_job_returns_404(client):
+    assert client.get("/api/jobs/does-not-exist").status_code == 404
+
 # --- TEST QUERY ENDPOINT ---
-@patch("app.api.query.generate_answer")
-@patch("app.api.query.embed_query")
+@patch("app.api.query.agenerate_answer")
+@patch("app.api.query.aembed_query")
 @patch("app.services.vector_store.search_similar")
 def test_query_flow(mock_search, mock_embed, mock_llm, client):
     # Setup Mocks
@@ -45,4 +158,27 @@ def test_query_flow(mock_search, mock_embed, mock_llm, client):
     response = client.post("/api/query", json=payload)
 
     assert response.status_code == 200
-    assert response.json()["answer"] == "Your tax is 10%."
\ No newline at end of file
+    assert response.json()["answer"] == "Your tax is 10%."
+
+@patch("app.api.query.agenerate_answer_stream")
+@patch("app.api.query.aembed_query")
+@patch("app.services.vector_store.search_similar")
+def test_query_stream_sends_citations_then_tokens(mock_search, mock_embed, mock_llm, client):
+    mock_embed.return_value = [0.1, 0.2]
+    mock_search.return_value = {
+        "documents": [["Tax info"]],
+        "metadatas": [[{"page": 1, "source": "doc.pdf"}]]
+    }
+    async def fake_stream(question, contexts):
+        for token in ["Your tax ", "is 10%."]:
+            yield token
+    mock_llm.side_effect = fake_stream
+
+    payload = {"question": "How much tax?", "session_id": "session_123"}
+    response = client.post("/api/query/stream", json=payload)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line.split(": ", 1)[1] for line in response.text.splitlines() if line.startswith("event:")]
+    assert events == ["citations", "token", "token", "done"]
+    assert '"answer": "Your tax is 10%."' in response.text
\ No newline at end of file
@@ -0,0 +1,102 @@
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.services.chunker import Chunker, count_tokens
+from app.services.pdf_service import iter_chunks
+
+PARAGRAPH = " ".join(f"Line {n} of the salary statement for the year." for n in range(40))
+
+
+def test_short_page_is_one_chunk():
+    chunks = list(Chunker(500, 50).split([{"page": 1, "text": "  Gross salary 5,00,000  "}]))
+    assert chunks == [{"text": "Gross salary 5,00,000", "page": 1}]
+
+
+def test_chunks_respect_size_and_overlap():
+    chunks = Chunker(200, 40).split_text(PARAGRAPH)
+
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    # Every chunk ends on a word and the next one repeats its tail
+    for left, right in zip(chunks, chunks[1:]):
+        assert f" {left.split()[-1]} " in f" {PARAGRAPH} "
+        assert right[:10] in left
+    # Nothing is lost: the last words make it into the last chunk
+    assert chunks[-1].endswith("Line 39 of the salary statement for the year.")
+
+
+def test_prefers_paragraph_break_in_back_half():
+    text = "A" * 50 + "\n\n" + "word " * 30 + "\n" + "tail " * 40
+    chunks = Chunker(220, 0).split_text(text)
+    # The blank line at 50 chars would leave a fragment; the later newline is used instead
+    assert len(chunks[0]) > 110
+    assert chunks[0].endswith("word")
+
+
+def test_hard_cut_without_separators():
+    chunks = Chunker(100, 10).split_text("x" * 250)
+    assert [len(chunk) for chunk in chunks] == [100, 100, 70]
+
+
+def test_token_length_unit():
+    chunks = Chunker(30, 5, length_unit="tokens").split_text(PARAGRAPH)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 30 for chunk in chunks)
+
+
+def test_across_pages_merges_page_tails():
+    pages = [
+        {"page": 1, "text": "Table of deductions continues"},
+        {"page": 2, "text": "80C 1,50,000 80D 25,000"},
+        {"page": 3, "text": ""},
+        {"page": 4, "text": PARAGRAPH},
+    ]
+    per_page = list(Chunker(300, 30).split(pages))
+    merged = list(Chunker(300, 30, across_pages=True).split(pages))
+
+    assert len(merged) < len(per_page)
+    assert merged[0]["text"].startswith("Table of deductions continues\n\n80C 1,50,000")
+    assert (merged[0]["page"], merged[0]["page_end"]) == (1, 4)
+    assert merged[-1]["page"] == merged[-1]["page_end"] == 4
+    assert all(len(chunk["text"]) <= 300 for chunk in merged)
+
+
+def test_across_pages_is_lazy():
+    consumed = []
+
+    def pages():
+        for n in range(1, 100):
+            consumed.append(n)
+            yield {"page": n, "text": PARAGRAPH}
+
+    chunks = Chunker(200, 20, across_pages=True).split(pages())
+    first = next(chunks)
+    assert first["page"] == 1
+    assert len(consumed) == 1
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        Chunker(100, 100)
+    with pytest.raises(ValueError):
+        Chunker(100, 10, length_unit="words")
+
+
+@patch("app.services.pdf_service.settings.CHUNK_OVERLAP", 20)
+@patch("app.services.pdf_service.settings.CHUNK_SIZE", 120)
+def test_iter_chunks_uses_settings():
+    chunks = list(iter_chunks([{"page": 7, "text": PARAGRAPH}]))
+    assert len(chunks) > 10
+    assert all(len(chunk["text"]) <= 120 and chunk["page"] == 7 for chunk in chunks)
+
+
+def test_langchain_not_imported_on_startup():
+    result = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, app.services.pdf_service; print('langchain_text_splitters' in sys.modules)"],
+        cwd=Path(__file__).parent.parent, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "False"
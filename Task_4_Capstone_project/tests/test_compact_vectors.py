@@ -0,0 +1,75 @@
+import chromadb
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.services import vector_store
+from app.services.compact_vectors import QuantizedIndex, QuantizedVectors, squared_l2, truncate
+
+
+def _unit_vectors(count: int, dims: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+# --- TEST 1: Matryoshka truncation ---
+def test_truncate_keeps_unit_length_prefix():
+    vectors = _unit_vectors(3, 16)
+    short = truncate(vectors, 4)
+
+    assert short.shape == (3, 4)
+    assert np.allclose(np.linalg.norm(short, axis=1), 1.0)
+    assert np.allclose(short[0] / short[0][0], vectors[0][:4] / vectors[0][0])
+    assert truncate(vectors, 0).shape == (3, 16)
+
+
+# --- TEST 2: Quantized first pass + exact re-rank ---
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_candidates_contain_exact_neighbours(quantization):
+    vectors = _unit_vectors(500, 64)
+    queries = _unit_vectors(20, 64, seed=1)
+    index = QuantizedVectors(quantization)
+    ids = [f"c{i}" for i in range(len(vectors))]
+    index.add(ids[:200], vectors[:200])
+    index.add(ids[200:], vectors[200:])
+
+    for query in queries:
+        exact = {ids[i] for i in np.argsort(squared_l2(query, vectors))[:5]}
+        assert exact <= set(index.search(query, 20))
+
+    # float16: 2 bytes a value, int8: 1 (+ a scale); both + a float32 norm per row
+    assert index.nbytes < vectors.nbytes * (0.55 if quantization == "float16" else 0.3)
+
+
+def test_upsert_reloads_session():
+    index = QuantizedIndex("int8", max_sessions=10)
+    index.add("s1", ["a"], _unit_vectors(1, 8))   # not loaded: skipped
+    assert not index.is_loaded("s1")
+
+    index.load_session("s1", ["a", "b"], _unit_vectors(2, 8))
+    index.add("s1", ["c"], _unit_vectors(1, 8))
+    assert index.stats()["vectors"] == 3
+
+    index.add("s1", ["a"], _unit_vectors(1, 8, seed=2))   # overwrites "a"
+    assert not index.is_loaded("s1")
+
+
+# --- TEST 3: Dense search through the quantized index ---
+def test_search_similar_quantized_matches_exact(tmp_path):
+    collection = chromadb.PersistentClient(path=str(tmp_path / "db")).get_or_create_collection("compact")
+    vectors = _unit_vectors(60, 32)
+    chunks = [{"text": f"chunk {i}", "page": i} for i in range(len(vectors))]
+    query = _unit_vectors(1, 32, seed=3)[0]
+
+    with patch.object(vector_store, "collection", collection), \
+         patch.object(vector_store, "quantized_index", QuantizedIndex("int8", max_sessions=10)), \
+         patch("app.services.vector_store.settings.EMBEDDING_DIMENSIONS", 16):
+        vector_store.store_chunks(chunks, vectors.tolist(), "s1")
+        results = vector_store.search_similar(query.tolist(), "s1", top_k=5, mode="dense")
+
+    stored = truncate(vectors, 16)
+    distances = squared_l2(truncate(query, 16), stored)
+    expected = [f"chunk {i}" for i in np.argsort(distances)[:5]]
+    assert results["documents"][0] == expected
+    assert np.allclose(results["distances"][0], np.sort(distances)[:5], atol=1e-5)
+    assert len(results["embeddings"][0][0]) == 16
@@ -0,0 +1,87 @@
+from unittest.mock import patch
+
+from app.services.chunker import Chunker
+from app.services.context_packer import estimate_tokens, mmr_order, pack_context
+
+# --- TEST 1: MMR ordering ---
+def test_mmr_pushes_near_duplicates_back():
+    query = [1.0, 0.0]
+    embeddings = [
+        [1.0, 0.0],     # most relevant
+        [0.99, 0.01],   # near-duplicate of the first
+        [0.7, 0.7],     # less relevant but different
+    ]
+
+    assert mmr_order(query, embeddings, lambda_mult=1.0) == [0, 1, 2]
+    assert mmr_order(query, embeddings, lambda_mult=0.3) == [0, 2, 1]
+
+# --- TEST 2: Merging overlapping chunks ---
+def test_overlapping_chunks_of_a_page_are_merged():
+    overlap = "deduction under section 80C is capped"
+    first = "Investments in PPF and ELSS qualify for " + overlap
+    second = overlap + " at Rs 1,50,000 per financial year."
+    metas = [{"page": 2, "doc_hash": "h"}, {"page": 2, "doc_hash": "h"}]
+
+    contexts = pack_context([1.0], [first, second], metas, token_budget=1000)
+
+    assert len(contexts) == 1
+    assert contexts[0]["text"] == first + " at Rs 1,50,000 per financial year."
+    assert contexts[0]["page"] == 2
+
+def test_token_mode_chunks_are_merged():
+    """Overlap measured in tokens spans far more characters than CHUNK_OVERLAP; it is still found."""
+    words = [f"Clause {n} covers deduction under section 80C for salaried taxpayers." for n in range(40)]
+    page = {"page": 3, "text": " ".join(words)}
+    with patch("app.services.context_packer.settings.CHUNK_OVERLAP", 50):
+        chunks = list(Chunker(200, 50, length_unit="tokens").split([page]))
+        assert len(chunks) > 2
+
+        contexts = pack_context([1.0], [chunk["text"] for chunk in chunks], [{"page": 3, "doc_hash": "h"}] * len(chunks),
+                                token_budget=100_000)
+
+    assert len(contexts) == 1
+    assert contexts[0]["text"] == page["text"]
+
+def test_duplicates_dropped_but_other_pages_kept():
+    text = "Standard deduction of Rs 50,000 applies to salaried employees."
+    metas = [{"page": 1}, {"page": 1}, {"page": 4}]
+
+    contexts = pack_context([1.0], [text, text, text], metas, token_budget=1000)
+
+    assert [context["page"] for context in contexts] == [1, 4]
+
+# --- TEST 3: Token budget ---
+def test_budget_limits_packed_chunks():
+    documents = ["a" * 400, "b" * 400, "c" * 400]
+    metas = [{"page": 1}, {"page": 2}, {"page": 3}]
+    budget = 2 * (estimate_tokens("a" * 400) + 6)
+
+    contexts = pack_context([1.0], documents, metas, token_budget=budget)
+
+    assert [context["page"] for context in contexts] == [1, 2]
+
+def test_oversized_first_chunk_is_trimmed_not_dropped():
+    contexts = pack_context([1.0], ["x" * 4000], [{"page": 1}], token_budget=100)
+
+    assert len(contexts) == 1
+    assert estimate_tokens(contexts[0]["text"]) <= 100
+
+# --- TEST 4: Wired into the query path ---
+@patch("app.api.query.agenerate_answer")
+@patch("app.api.query.aembed_query")
+@patch("app.services.vector_store.search_similar")
+def test_query_sends_packed_contexts(mock_search, mock_embed, mock_llm, client):
+    mock_embed.return_value = [1.0, 0.0]
+    mock_search.return_value = {
+        "documents": [["HRA exemption details", "HRA exemption details", "Home loan interest"]],
+        "metadatas": [[{"page": 1}, {"page": 1}, {"page": 5}]],
+        "embeddings": [[[1.0, 0.0], [1.0, 0.0], [0.6, 0.8]]]
+    }
+    mock_llm.return_value = "Answer (Page 1)."
+
+    response = client.post("/api/query", json={"question": "HRA?", "session_id": "s1"})
+
+    assert response.status_code == 200
+    contexts = mock_llm.call_args[0][1]
+    assert [context["page"] for context in contexts] == [1, 5]
+    assert len(response.json()["citations"]) == 2
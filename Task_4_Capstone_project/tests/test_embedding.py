@@ -1,16 +1,18 @@
+import asyncio
+import threading
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 from fastapi import HTTPException
-from app.services.embedding import embed_texts, embed_query
+from app.services.embedding import aembed_query, embed_texts, embed_query, EmbeddingCache
 
 # --- TEST 1: Document Embedding (embed_texts) ---
-@patch("app.services.embedding.ollama.embeddings")
+@patch("app.services.embedding.ollama.embed")
 def test_embed_texts_success(mock_ollama):
     """Test normal document embedding with 'search_document:' prefix."""
     
     # 1. Setup the Mock to return fake data
-    # The ollama library returns a dict like {'embedding': [...]}
-    mock_ollama.return_value = {"embedding": [0.1, 0.2, 0.3]}
+    # The batched ollama API returns a dict like {'embeddings': [[...], ...]}
+    mock_ollama.return_value = {"embeddings": [[0.6, 0.8, 0.0]]}
 
     # 2. Call the function
     texts = ["Tax Report"]
@@ -18,28 +20,53 @@ def test_embed_texts_success(mock_ollama):
 
     # 3. Verify Results
     assert len(results) == 1
-    assert results[0] == [0.1, 0.2, 0.3]
+    assert results[0] == pytest.approx([0.6, 0.8, 0.0])
 
     # 4. CRITICAL: Check if the prefix was added correctly
     # We inspect the arguments passed to the mock
     mock_ollama.assert_called_once()
     call_args = mock_ollama.call_args
     # call_args[1] holds the keyword arguments (kwargs)
-    assert call_args[1]['prompt'] == "search_document: Tax Report"
+    assert call_args[1]['input'] == ["search_document: Tax Report"]
     assert call_args[1]['model'] == "nomic-embed-text"
 
+@patch("app.services.embedding.settings.EMBED_BATCH_SIZE", 2)
+@patch("app.services.embedding.ollama.embed")
+def test_embed_texts_batches_keep_order(mock_ollama):
+    """Texts are split into batches and results come back in input order."""
+    mock_ollama.side_effect = lambda model, input: {
+        "embeddings": [[float(p.split()[-1]), 1.0] for p in input]
+    }
+
+    results = embed_texts(["1", "2", "3", "4", "5"])
+
+    assert [round(x / y) for x, y in results] == [1, 2, 3, 4, 5]
+    assert mock_ollama.call_count == 3
+
+@patch("app.services.embedding.settings.EMBED_BATCH_SIZE", 1)
+@patch("app.services.embedding.ollama.embeddings")
+def test_embed_texts_unbatched_fallback(mock_ollama):
+    """A batch size of 1 keeps the one-call-per-chunk embeddings API (normalised like /api/embed)."""
+    mock_ollama.return_value = {"embedding": [3.0, 4.0]}
+
+    results = embed_texts(["A", "B"])
+
+    assert results == [pytest.approx([0.6, 0.8])] * 2
+    assert mock_ollama.call_args[1]['prompt'] == "search_document: B"
+
 # --- TEST 2: Query Embedding (embed_query) ---
 @patch("app.services.embedding.ollama.embeddings")
 def test_embed_query_success(mock_ollama):
     """Test query embedding with 'search_query:' prefix."""
     
-    mock_ollama.return_value = {"embedding": [0.9, 0.8, 0.7]}
+    # /api/embeddings vectors are not unit length; queries are normalised like documents
+    mock_ollama.return_value = {"embedding": [0.0, 3.0, 4.0]}
 
     # Call function
     result = embed_query("How much tax?")
 
     # Verify result
-    assert result == [0.9, 0.8, 0.7]
+    assert result == pytest.approx([0.0, 0.6, 0.8])
 
     # Verify Prefix
     call_args = mock_ollama.call_args
@@ -53,7 +80,7 @@ def test_embed_texts_empty_input():
     assert exc.value.status_code == 400
     assert "No text provided" in str(exc.value.detail)
 
-@patch("app.services.embedding.ollama.embeddings")
+@patch("app.services.embedding.ollama.embed")
 def test_embed_texts_api_failure(mock_ollama):
     """Should raise 500 if Ollama fails."""
     # Simulate an error (e.g., Ollama is down)
@@ -63,4 +90,91 @@ def test_embed_texts_api_failure(mock_ollama):
         embed_texts(["Hello"])
     
     assert exc.value.status_code == 500
-    assert "Embedding generation failed" in str(exc.value.detail)
\ No newline at end of file
+    assert "Embedding generation failed" in str(exc.value.detail)
+
+@patch("app.services.embedding.ollama.embed")
+def test_embed_texts_count_mismatch(mock_ollama):
+    """Should raise 500 if a batch returns fewer vectors than prompts."""
+    mock_ollama.return_value = {"embeddings": [[0.1]]}
+
+    with pytest.raises(HTTPException) as exc:
+        embed_texts(["One", "Two"])
+
+    assert exc.value.status_code == 500
+    assert "Expected 2 embeddings" in str(exc.value.detail)
+
+# --- TEST 4: Embedding Cache ---
+def test_embedding_cache_roundtrip(tmp_path):
+    """Vectors survive a reopen and lookups are counted as hits/misses."""
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", max_bytes=1024 * 1024)
+    key = EmbeddingCache.make_key("nomic-embed-text", "search_query: ", "total income")
+
+    assert cache.get(key) is None
+    cache.put(key, [0.5, 0.25])
+
+    reopened = EmbeddingCache(tmp_path / "cache.sqlite3", max_bytes=1024 * 1024)
+    assert reopened.get(key) == [0.5, 0.25]
+    assert cache.stats()["misses"] == 1
+    assert reopened.stats()["hits"] == 1
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    """Once over max_bytes, the least recently used vector is dropped first."""
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", max_bytes=16)  # two 2-dim float32 vectors
+    cache.put("a", [1.0, 1.0])
+    cache.put("b", [2.0, 2.0])
+    cache.get("a")  # 'a' is now more recent than 'b'
+    cache.put("c", [3.0, 3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0, 1.0]
+    assert cache.stats()["evictions"] == 1
+
+@patch("app.services.embedding.ollama.embed")
+def test_embed_texts_only_embeds_cache_misses(mock_ollama, tmp_path):
+    """Cached chunks are not re-sent to Ollama and order is preserved."""
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", max_bytes=1024 * 1024)
+    cache.put(EmbeddingCache.make_key("nomic-embed-text", "search_document: ", "Old"), [1.0, 0.0])
+    # Cached in another vector form (e.g. raw /api/embeddings output): never served
+    cache.put(EmbeddingCache.make_key("nomic-embed-text", "search_document: ", "New", form="raw"), [9.0, 9.0])
+    mock_ollama.return_value = {"embeddings": [[0.0, 2.0]]}
+
+    with patch("app.services.embedding.embedding_cache", cache):
+        results = embed_texts(["Old", "New"])
+        assert embed_texts(["New"]) == [[0.0, 1.0]]
+
+    assert results == [[1.0, 0.0], [0.0, 1.0]]
+    mock_ollama.assert_called_once()
+    assert mock_ollama.call_args[1]['input'] == ["search_document: New"]
+
+class _ThreadRecordingCache(EmbeddingCache):
+    """EmbeddingCache that notes which thread each lookup and write ran on."""
+    def __init__(self, path):
+        super().__init__(path, max_bytes=1024 * 1024)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def put(self, key, vector):
+        self.threads.append(threading.get_ident())
+        super().put(key, vector)
+
+def test_async_query_keeps_cache_io_off_the_event_loop(tmp_path):
+    """The SQLite cache must not block the event loop (ingestion holds its lock)."""
+    cache = _ThreadRecordingCache(tmp_path / "cache.sqlite3")
+
+    async def run():
+        loop_thread = threading.get_ident()
+        first = await aembed_query("How much tax?")
+        second = await aembed_query("How much tax?")
+        return loop_thread, first, second
+
+    with patch("app.services.embedding.embedding_cache", cache), \
+         patch("app.services.embedding._arequest_query_embedding", AsyncMock(return_value=[0.25, 0.5])) as request:
+        loop_thread, first, second = asyncio.run(run())
+
+    assert first == second == [0.25, 0.5]
+    request.assert_awaited_once()
+    assert len(cache.threads) == 3          # miss, write, hit
+    assert loop_thread not in cache.threads
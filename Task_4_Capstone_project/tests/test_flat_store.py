@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.services import vector_store
+from app.services.flat_store import CHUNKS_FILE, INITIAL_CAPACITY, JOURNAL_FILE, FlatClient, FlatCollection
+from app.services.vector_store import PartitionManager
+
+
+def _unit_vectors(count: int, dims: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _fill(collection: FlatCollection, count: int, dims: int = 16) -> np.ndarray:
+    vectors = _unit_vectors(count, dims)
+    collection.add(
+        ids=[f"c{i}" for i in range(count)],
+        embeddings=vectors,
+        documents=[f"chunk {i}" for i in range(count)],
+        metadatas=[{"page": i, "doc_hash": "h1" if i % 2 else "h2"} for i in range(count)]
+    )
+    return vectors
+
+
+# --- TEST 1: Exact search ---
+def test_query_is_exact(tmp_path):
+    collection = FlatCollection("s1", tmp_path / "s1")
+    vectors = _fill(collection, 200)
+    query = _unit_vectors(1, 16, seed=1)
+
+    result = collection.query(query_embeddings=query, n_results=5, include=["documents", "distances", "embeddings"])
+
+    similarity = vectors @ query[0]
+    expected = np.argsort(-similarity)[:5]
+    assert result["ids"][0] == [f"c{i}" for i in expected]
+    assert np.allclose(result["distances"][0], 2 - 2 * similarity[expected], atol=1e-5)
+    assert result["embeddings"][0].shape == (5, 16)
+    assert result["metadatas"] is None
+
+    filtered = collection.query(query_embeddings=query, n_results=5, where={"doc_hash": "h1"})
+    assert all(int(chunk_id[1:]) % 2 for chunk_id in filtered["ids"][0])
+
+
+# --- TEST 2: Writes persist in the memory-mapped files ---
+def test_writes_survive_reopen(tmp_path):
+    collection = FlatCollection("s1", tmp_path / "s1")
+    vectors = _fill(collection, INITIAL_CAPACITY + 10)   # forces the matrix to grow
+
+    collection.upsert(ids=["c0"], embeddings=[vectors[1]], documents=["replaced"], metadatas=[{"page": 0}])
+    collection.add(ids=["c1"], embeddings=[vectors[0]], documents=["ignored"], metadatas=[{}])
+    collection.update(ids=["c2"], metadatas=[{"doc_hash": "h3"}])
+    collection.delete(where={"$and": [{"doc_hash": "h2"}, {"page": 4}]})
+
+    reopened = FlatCollection("s1", tmp_path / "s1")
+    assert reopened.count() == INITIAL_CAPACITY + 9
+    stored = reopened.get(ids=["c0", "c1", "c2", "c4"], include=["documents", "metadatas", "embeddings"])
+    assert stored["ids"] == ["c0", "c1", "c2"]
+    assert stored["documents"][:2] == ["replaced", "chunk 1"]
+    assert stored["metadatas"][2] == {"page": 2, "doc_hash": "h3"}
+    assert np.allclose(stored["embeddings"][0], vectors[1])
+
+
+def test_writes_are_journaled_not_rewritten(tmp_path):
+    """Batches append to the journal; the snapshot is only rewritten when the journal outgrows it."""
+    collection = FlatCollection("s1", tmp_path / "s1")
+    vectors = _fill(collection, 10)
+    snapshot = (tmp_path / "s1" / CHUNKS_FILE).read_bytes()
+
+    collection.add(ids=["new"], embeddings=[vectors[3]], documents=["new chunk"], metadatas=[{"page": 99}])
+    collection.delete(ids=["c3"])
+    assert (tmp_path / "s1" / CHUNKS_FILE).read_bytes() == snapshot
+
+    # Deleted rows are reused; a query never returns them
+    collection.add(ids=["reused"], embeddings=[vectors[5]], documents=["reused chunk"], metadatas=[{}])
+    assert collection._rows["reused"] == 3
+    found = collection.query(query_embeddings=[vectors[3]], n_results=12, include=["documents"])
+    assert "c3" not in found["ids"][0] and found["ids"][0][0] == "new"
+
+    # A crash mid-append leaves a torn last line, which is dropped
+    with (tmp_path / "s1" / JOURNAL_FILE).open("a", encoding="utf-8") as journal:
+        journal.write('{"op": "put", "row": 1')
+    reopened = FlatCollection("s1", tmp_path / "s1")
+    assert reopened.count() == 11
+    reopened.update(ids=["c0"], metadatas=[{"doc_hash": "h9"}])
+    assert FlatCollection("s1", tmp_path / "s1").get(ids=["c0"])["metadatas"] == [{"page": 0, "doc_hash": "h9"}]
+
+    # Once the journal holds as many records as there are chunks, it is folded in
+    live = reopened.get()["ids"]
+    with patch("app.services.flat_store.MIN_JOURNAL_RECORDS", 1):
+        reopened.update(ids=live, metadatas=[{"doc_hash": "h4"}] * len(live))
+    assert not (tmp_path / "s1" / JOURNAL_FILE).exists()
+    compacted = FlatCollection("s1", tmp_path / "s1").get()
+    assert sorted(compacted["ids"]) == sorted(live)
+    assert {metadata["doc_hash"] for metadata in compacted["metadatas"]} == {"h4"}
+
+
+def test_interrupted_upsert_keeps_old_text_and_vector(tmp_path):
+    """A replaced chunk's new vector is written to a free row, so a crash before its record changes nothing."""
+    collection = FlatCollection("s1", tmp_path / "s1")
+    vectors = _fill(collection, 5)
+
+    with patch.object(FlatCollection, "_journal", side_effect=OSError("power cut")), pytest.raises(OSError):
+        collection.upsert(ids=["c0"], embeddings=[vectors[4]], documents=["new text"], metadatas=[{}])
+
+    restarted = FlatCollection("s1", tmp_path / "s1")
+    stored = restarted.get(ids=["c0"], include=["documents", "embeddings"])
+    assert stored["documents"] == ["chunk 0"]
+    assert np.allclose(stored["embeddings"][0], vectors[0])
+
+    restarted.upsert(ids=["c0"], embeddings=[vectors[4]], documents=["new text"], metadatas=[{}])
+    found = FlatCollection("s1", tmp_path / "s1").query(query_embeddings=[vectors[4]], n_results=2)
+    assert dict(zip(found["ids"][0], found["documents"][0])) == {"c0": "new text", "c4": "chunk 4"}
+    assert restarted.count() == 5
+
+
+def test_client_shares_one_instance_per_collection(tmp_path):
+    client = FlatClient(tmp_path / "flat")
+    handle = client.get_or_create_collection("s1")
+    _fill(handle, 3)
+
+    assert client.get_collection("s1") is handle
+    assert client.list_collections() == [handle]
+    client.delete_collection("s1")
+    assert client.get_or_create_collection("s1") is not handle
+
+
+def test_dimension_mismatch_rejected(tmp_path):
+    collection = FlatCollection("s1", tmp_path / "s1")
+    _fill(collection, 3)
+    with pytest.raises(ValueError):
+        collection.add(ids=["x"], embeddings=[[1.0, 0.0]], documents=["x"], metadatas=[{}])
+
+
+# --- TEST 3: vector_store on the flat backend ---
+def test_vector_store_on_flat_backend(tmp_path):
+    partitions = PartitionManager(FlatClient(tmp_path / "flat"), mode="session", buckets=1, max_open=4, idle_seconds=600)
+    vectors = _unit_vectors(30, 16)
+    chunks = [{"text": f"chunk {i}", "page": i} for i in range(30)]
+
+    with patch.object(vector_store, "partitions", partitions):
+        vector_store.store_chunks(chunks, vectors.tolist(), "alice", doc_hash="h1")
+        results = vector_store.search_similar(vectors[7].tolist(), "alice", top_k=3, mode="dense")
+        assert results["documents"][0][0] == "chunk 7"
+        assert vector_store.search_similar(vectors[7].tolist(), "bob", top_k=3)["ids"] == [[]]
+
+        assert vector_store.copy_document_to_session("h1", "bob", ["alice"]) == 30
+        vector_store.delete_document("h1", "alice")
+        assert partitions.get("alice").count() == 0
+        assert partitions.get("bob").count() == 30
+
+        vector_store.delete_session("bob")
+        assert partitions.get("bob", create=False) is None
@@ -0,0 +1,67 @@
+import chromadb
+import numpy as np
+from unittest.mock import patch
+
+from app.services import vector_store
+from app.services.hnsw_tuning import evaluate, exact_top_k, recommend
+from app.services.vector_store import PartitionManager, open_collection
+
+
+def _unit_vectors(count: int, dims: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+# --- TEST 1: Collections are built with the HNSW_* settings ---
+def test_collections_use_configured_hnsw(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path / "db"))
+    with patch("app.services.vector_store.settings.HNSW_SPACE", "cosine"), \
+         patch("app.services.vector_store.settings.HNSW_M", 8), \
+         patch("app.services.vector_store.settings.HNSW_EF_SEARCH", 40):
+        created = open_collection(client, "tuned")
+    hnsw = created.configuration["hnsw"]
+    assert (hnsw["space"], hnsw["max_neighbors"], hnsw["ef_search"]) == ("cosine", 8, 40)
+
+    # An existing collection keeps what it was stored with, including a tuned ef_search
+    created.modify(configuration={"hnsw": {"ef_search": 25}})
+    for create in (True, False):
+        reopened = open_collection(client, "tuned", create=create)
+        hnsw = reopened.configuration["hnsw"]
+        assert (hnsw["space"], hnsw["max_neighbors"], hnsw["ef_search"]) == ("cosine", 8, 25)
+
+
+def test_set_ef_search_updates_stored_collections(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path / "db"))
+    partitions = PartitionManager(client, mode="session", buckets=1, max_open=4, idle_seconds=600)
+    global_collection = open_collection(client, vector_store.settings.COLLECTION_NAME)
+    partitions.get("alice")
+    client.get_or_create_collection("unrelated")
+
+    with patch.object(vector_store, "client", client), patch.object(vector_store, "partitions", partitions):
+        assert vector_store.set_ef_search(25) == 2
+        assert vector_store.set_ef_search(25) == 0
+
+    assert client.get_collection(global_collection.name).configuration["hnsw"]["ef_search"] == 25
+    assert client.get_collection(partitions.name_for("alice")).configuration["hnsw"]["ef_search"] == 25
+    assert client.get_collection("unrelated").configuration["hnsw"]["ef_search"] == 100
+
+
+# --- TEST 2: Grid search against exact recall ---
+def test_tuning_measures_recall_and_recommends(tmp_path):
+    vectors = _unit_vectors(300, 16)
+    queries = _unit_vectors(10, 16, seed=1)
+
+    truth = exact_top_k(vectors, queries, 5, "l2")
+    assert truth[0] == set(np.argsort(((vectors - queries[0]) ** 2).sum(axis=1))[:5].tolist())
+
+    results = evaluate(vectors, queries, 5, ["l2"], [8], [50], [5, 100], tmp_path)
+    assert [result["ef_search"] for result in results] == [5, 100]
+    assert results[1]["recall_at_k"] >= 0.9
+    assert all(result["p95_ms"] >= result["p50_ms"] > 0 for result in results)
+
+    fast = {"recall_at_k": 0.9, "p95_ms": 1.0, "build_seconds": 1.0}
+    accurate = {"recall_at_k": 1.0, "p95_ms": 2.0, "build_seconds": 1.0}
+    assert recommend([fast, accurate], 0.85) is fast
+    assert recommend([fast, accurate], 0.95) is accurate
+    assert recommend([fast, accurate], 1.1) is accurate
+    assert recommend([], 0.9) is None
@@ -0,0 +1,139 @@
+import chromadb
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+from app.services import vector_store
+from app.services.ingestion import ingest_document
+from app.services.jobs import JobManager
+
+# --- TEST 1: Rollback on partial failure ---
+@patch("app.services.ingestion.delete_document")
+@patch("app.services.ingestion.store_chunks")
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_failed_store_is_rolled_back(mock_extract, mock_embed, mock_store, mock_delete, fake_pdf_reader):
+    """If storing fails midway, the document's chunks are deleted again."""
+    mock_extract.return_value = fake_pdf_reader("Sample")
+    mock_embed.return_value = [[0.1]]
+    mock_store.side_effect = HTTPException(status_code=500, detail="Vector store failed")
+
+    with pytest.raises(HTTPException):
+        ingest_document("a.pdf", "a.pdf", session_id="s1", doc_hash="h1")
+
+    mock_delete.assert_called_once_with("h1", "s1")
+
+# --- TEST 2: Progress Reporting ---
+@patch("app.services.ingestion.store_chunks")
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_ingest_reports_stages(mock_extract, mock_embed, mock_store, fake_pdf_reader):
+    mock_extract.return_value = fake_pdf_reader("Sample")
+    mock_embed.return_value = [[0.1]]
+    stages = []
+
+    ingest_document("a.pdf", "a.pdf", "s1", "h1", progress=lambda stage, pct: stages.append(stage))
+
+    assert stages == ["extracting", "embedding", "storing", "completed"]
+
+# --- TEST 3: Streaming in Bounded Batches ---
+@patch("app.services.ingestion.settings.INGEST_BATCH_SIZE", 2)
+@patch("app.services.ingestion.store_chunks")
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_ingest_flushes_in_batches(mock_open, mock_embed, mock_store, fake_pdf_reader):
+    """Chunks are embedded and stored batch by batch, in page order."""
+    mock_open.return_value = fake_pdf_reader("p1", "p2", "p3", "p4", "p5")
+    mock_embed.side_effect = lambda texts: [[0.1] for _ in texts]
+
+    result = ingest_document("a.pdf", "a.pdf", "s1", "h1")
+
+    assert result["chunks_stored"] == 5
+    assert mock_embed.call_count == 3
+    stored_pages = [c["page"] for call in mock_store.call_args_list for c in call[0][0]]
+    assert stored_pages == [1, 2, 3, 4, 5]
+
+@patch("app.services.ingestion.settings.INGEST_BATCH_SIZE", 1)
+@patch("app.services.ingestion.delete_document")
+@patch("app.services.ingestion.store_chunks")
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_ingest_rolls_back_earlier_batches(mock_open, mock_embed, mock_store, mock_delete, fake_pdf_reader):
+    """A failure on a later batch removes the batches already flushed."""
+    mock_open.return_value = fake_pdf_reader("p1", "p2", "p3")
+    mock_embed.side_effect = [[[0.1]], HTTPException(status_code=500, detail="Ollama Down")]
+
+    with pytest.raises(HTTPException):
+        ingest_document("a.pdf", "a.pdf", "s1", "h1")
+
+    assert mock_store.call_count == 1
+    mock_delete.assert_called_once_with("h1", "s1")
+
+# --- TEST 4: Re-uploading a changed document ---
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_reupload_only_reindexes_changed_pages(mock_open, mock_embed, document_registry, fake_pdf_reader, tmp_path):
+    """A new version under the same name re-embeds changed pages and drops removed ones."""
+    collection = chromadb.PersistentClient(path=str(tmp_path / "db")).get_or_create_collection("versions")
+    mock_embed.side_effect = lambda texts: [[float(len(text)), 1.0] for text in texts]
+
+    with patch.object(vector_store, "collection", collection):
+        mock_open.return_value = fake_pdf_reader("Salary 10,00,000", "80C 1,50,000", "TDS 90,000")
+        first = ingest_document("v1.pdf", "form16.pdf", "s1", "h1")
+
+        mock_open.return_value = fake_pdf_reader("Salary 10,00,000", "80C 1,20,000")
+        second = ingest_document("v2.pdf", "form16.pdf", "s1", "h2")
+
+    assert first["version"] == 1
+    assert second["version"] == 2
+    assert (second["pages_unchanged"], second["pages_reindexed"], second["pages_removed"]) == (1, 1, 1)
+    # Only the changed page was embedded again
+    assert mock_embed.call_args_list[-1][0][0] == ["80C 1,20,000"]
+
+    stored = collection.get()
+    assert sorted(stored["documents"]) == ["80C 1,20,000", "Salary 10,00,000"]
+    assert {meta["doc_hash"] for meta in stored["metadatas"]} == {"h2"}
+    assert document_registry.current_version("s1", "form16.pdf")["page_chunks"] == [1, 1]
+    assert document_registry.get("h1") is None
+
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_failed_reupload_keeps_previous_version(mock_open, mock_embed, document_registry, fake_pdf_reader, tmp_path):
+    """An embedding failure while indexing a new version leaves the old one registered and searchable."""
+    collection = chromadb.PersistentClient(path=str(tmp_path / "db")).get_or_create_collection("versions")
+    mock_embed.side_effect = lambda texts: [[float(len(text)), 1.0] for text in texts]
+
+    with patch.object(vector_store, "collection", collection), \
+         patch.object(vector_store.partitions, "mode", "global"):
+        mock_open.return_value = fake_pdf_reader("Salary 10,00,000", "80C 1,50,000", "TDS 90,000")
+        ingest_document("v1.pdf", "form16.pdf", "s1", "h1")
+        before = collection.get(include=["documents", "metadatas"])
+
+        mock_open.return_value = fake_pdf_reader("Salary 10,00,000", "80C 1,20,000", "TDS 95,000")
+        mock_embed.side_effect = [[[12.0, 1.0]], HTTPException(status_code=504, detail="Ollama timed out")]
+        with patch("app.services.ingestion.settings.INGEST_BATCH_SIZE", 1), pytest.raises(HTTPException):
+            ingest_document("v2.pdf", "form16.pdf", "s1", "h2")
+
+        # Failing after the unchanged page was moved over hands it back too
+        mock_embed.side_effect = lambda texts: [[float(len(text)), 1.0] for text in texts]
+        with patch.object(document_registry, "register", side_effect=RuntimeError("disk full")), \
+             pytest.raises(RuntimeError):
+            ingest_document("v2.pdf", "form16.pdf", "s1", "h2")
+
+        after = collection.get(include=["documents", "metadatas"])
+        found = vector_store.search_similar([12.0, 1.0], "s1", top_k=3, mode="dense")
+
+    assert sorted(after["ids"]) == sorted(before["ids"])
+    assert {meta["doc_hash"] for meta in after["metadatas"]} == {"h1"}
+    assert sorted(found["documents"][0]) == sorted(before["documents"])
+    assert document_registry.current_version("s1", "form16.pdf")["doc_hash"] == "h1"
+    assert document_registry.get("h1") is not None and document_registry.get("h2") is None
+
+# --- TEST 5: Job Admission ---
+def test_job_manager_rejects_when_full():
+    """Submitting beyond max_pending raises 429 instead of queueing forever."""
+    manager = JobManager(max_workers=1, max_pending=0)
+
+    with pytest.raises(HTTPException) as exc:
+        manager.submit(lambda **kwargs: {}, filename="a.pdf", session_id="s1")
+
+    assert exc.value.status_code == 429
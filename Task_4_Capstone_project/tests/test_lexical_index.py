@@ -0,0 +1,62 @@
+import pytest
+from unittest.mock import patch
+from app.services.lexical_index import LexicalIndex, tokenize, reciprocal_rank_fusion
+from app.services.vector_store import search_similar
+
+# --- TEST 1: Tokenizer ---
+def test_tokenize_keeps_tax_tokens_whole():
+    tokens = tokenize("Deduction u/s 80C and Section 10(13A), PAN ABCDE1234F")
+    assert "80c" in tokens
+    assert "10(13a)" in tokens and "10" in tokens
+    assert "abcde1234f" in tokens
+
+# --- TEST 2: BM25 Ranking ---
+def test_bm25_ranks_exact_token_match_first():
+    index = LexicalIndex(max_sessions=10)
+    index.load_session("s1", ["a", "b", "c"], [
+        "Gross salary paid by the employer for the year",
+        "Deduction under section 80C for life insurance premium",
+        "Tax deducted at source (TDS) on salary",
+    ])
+
+    assert index.search("s1", "How much did I claim under 80C?", top_k=2)[0][0] == "b"
+    assert index.search("s1", "total TDS", top_k=1)[0][0] == "c"
+    assert index.search("s2", "80C", top_k=1) == []   # sessions are isolated
+
+def test_incremental_updates_only_for_loaded_sessions():
+    index = LexicalIndex(max_sessions=10)
+    index.add("s1", ["a"], ["80C deduction"])        # not loaded: left for lazy load
+    assert not index.is_loaded("s1")
+
+    index.load_session("s1", [], [])
+    index.add("s1", ["a"], ["80C deduction"])
+    assert index.search("s1", "80C", top_k=1)[0][0] == "a"
+
+    index.remove("s1", ["a"])
+    assert index.search("s1", "80C", top_k=1) == []
+
+# --- TEST 3: Fusion ---
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert [chunk_id for chunk_id, _ in fused] == ["a", "c", "b"]
+
+# --- TEST 4: Hybrid search_similar ---
+@patch("app.services.vector_store.lexical_index", LexicalIndex(max_sessions=10))
+@patch("app.services.vector_store.collection")
+def test_hybrid_search_pulls_in_lexical_only_hits(mock_collection):
+    # Dense search misses the 80C chunk entirely
+    mock_collection.query.return_value = {
+        "ids": [["salary"]],
+        "documents": [["Gross salary for the year"]],
+        "metadatas": [[{"page": 1}]]
+    }
+    # Session load for BM25, then the text lookup for the lexical-only hit
+    mock_collection.get.side_effect = [
+        {"ids": ["salary", "80c"], "documents": ["Gross salary for the year", "Section 80C investments"]},
+        {"ids": ["80c"], "documents": ["Section 80C investments"], "metadatas": [{"page": 3}]},
+    ]
+
+    results = search_similar([0.1, 0.2], session_id="s1", top_k=2, query_text="80C", mode="hybrid")
+
+    assert set(results["ids"][0]) == {"salary", "80c"}
+    assert "Section 80C investments" in results["documents"][0]
@@ -0,0 +1,107 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.services import metrics
+from app.services.ingestion import ingest_document
+from app.services.metrics import MetricsRegistry
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.registry.reset()
+    yield
+
+# --- TEST 1: Exposition format ---
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="embed")
+    histogram.observe(0.5, stage="embed")
+    histogram.observe(5.0, stage="embed")
+
+    text = registry.render()
+
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{stage="embed",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{stage="embed",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{stage="embed",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{stage="embed"} 3' in text
+
+def test_counter_family_uses_total_suffix():
+    registry = MetricsRegistry()
+    registry.counter("pages", "Pages.").inc(3)
+
+    text = registry.render()
+
+    assert "# TYPE pages_total counter" in text
+    assert "pages_total 3" in text
+
+def test_cache_and_admission_totals_are_counters():
+    """Monotonic hit/miss/rejection totals are exported as counters, not gauges."""
+    metrics.ANSWER_CACHE_MISSES.inc()
+    metrics.LLM_REJECTED.inc(2)
+
+    text = metrics.registry.render()
+
+    for name in ("rag_llm_rejected", "rag_answer_cache_hits", "rag_answer_cache_misses",
+                 "rag_answer_cache_invalidations", "rag_embedding_cache_hits", "rag_embedding_cache_misses"):
+        assert f"# TYPE {name}_total counter" in text
+        assert f"# TYPE {name} gauge" not in text
+    assert "rag_answer_cache_misses_total 1" in text
+    assert "rag_llm_rejected_total 2" in text
+
+def test_timed_records_errors():
+    with pytest.raises(ValueError):
+        with metrics.timed("search"):
+            raise ValueError("boom")
+
+    assert metrics.STAGE_SECONDS.count(stage="search") == 1
+    assert metrics.STAGE_ERRORS.value(stage="search") == 1
+
+def test_ollama_usage_recorded():
+    metrics.record_ollama_usage("mistral:7b", {
+        "prompt_eval_count": 120, "eval_count": 30,
+        "prompt_eval_duration": 400_000_000, "eval_duration": 900_000_000
+    })
+
+    assert metrics.OLLAMA_TOKENS.value(model="mistral:7b", kind="prompt") == 120
+    assert metrics.OLLAMA_TOKENS.value(model="mistral:7b", kind="completion") == 30
+    assert metrics.STAGE_SECONDS.count(stage="llm_prefill") == 1
+
+# --- TEST 2: Instrumented query path + /metrics ---
+@patch("app.api.query.agenerate_answer")
+@patch("app.api.query.aembed_query")
+@patch("app.services.vector_store.search_similar")
+def test_query_stages_exposed_on_metrics(mock_search, mock_embed, mock_llm, client):
+    mock_embed.return_value = [0.1, 0.2]
+    mock_search.return_value = {
+        "documents": [["Tax info", "More tax info"]],
+        "metadatas": [[{"page": 1}, {"page": 2}]]
+    }
+    mock_llm.return_value = "Your tax is 10%."
+    client.post("/api/query", json={"question": "How much tax?", "session_id": "s1"})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    for stage in ("embed_query", "search", "context", "llm"):
+        assert f'rag_stage_duration_seconds_count{{stage="{stage}"}} 1' in response.text
+    assert 'rag_search_results_bucket{mode="dense",le="2.0"} 1' in response.text
+    assert "rag_llm_active 0" in response.text
+
+@patch("app.services.ingestion.store_chunks")
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_ingest_stages_recorded(mock_open, mock_embed, mock_store, fake_pdf_reader):
+    mock_open.return_value = fake_pdf_reader("p1", "p2")
+    mock_embed.side_effect = lambda texts: [[0.1] for _ in texts]
+
+    ingest_document("a.pdf", "a.pdf", "s1", "h1")
+
+    assert metrics.STAGE_SECONDS.count(stage="extract") == 2
+    assert metrics.STAGE_SECONDS.count(stage="chunk") == 2
+    assert metrics.STAGE_SECONDS.count(stage="embed") == 1
+    assert metrics.STAGE_SECONDS.count(stage="store") == 1
+    assert metrics.PAGES_EXTRACTED.value() == 2
+    assert metrics.CHUNKS_STORED.value() == 2
@@ -1,7 +1,9 @@
 import pytest
 from unittest.mock import Mock, patch
 from fastapi import HTTPException
-from app.services.pdf_service import extract_text_from_pdf
+import io
+from concurrent.futures import Future
+from app.services.pdf_service import extract_text_from_pdf, iter_pages, iter_pages_parallel, open_pdf, extract_pages
 
 # --- TEST 1: Extraction & Chunking Logic ---
 @patch("app.services.pdf_service.PdfReader")
@@ -54,4 +56,77 @@ def test_encrypted_pdf_wrong_password(mock_pdf_reader):
         extract_text_from_pdf("locked.pdf", password="wrong_pass")
     
     assert exc.value.status_code == 400
-    assert "Incorrect password" in str(exc.value.detail)
\ No newline at end of file
+    assert "Incorrect password" in str(exc.value.detail)
+
+# --- TEST 4: Lazy Page Iteration ---
+def test_iter_pages_is_lazy():
+    """Pages are parsed one at a time, only when the consumer asks for them."""
+    page1 = Mock(); page1.extract_text.return_value = "First"
+    page2 = Mock(); page2.extract_text.return_value = "Second"
+    reader = Mock(); reader.pages = [page1, page2]
+
+    pages = iter_pages(reader)
+    assert next(pages) == {"page": 1, "text": "First"}
+    page2.extract_text.assert_not_called()
+    assert next(pages)["page"] == 2
+
+# --- TEST 5: Parallel Extraction ---
+@patch("app.services.pdf_service.settings.PDF_PAGES_PER_TASK", 2)
+@patch("app.services.pdf_service.settings.PDF_PARALLEL_MIN_PAGES", 3)
+@patch("app.services.pdf_service.settings.PDF_EXTRACT_WORKERS", 2)
+def test_parallel_extraction_matches_serial(make_pdf):
+    """Process-pool extraction returns the same pages, in order, even when encrypted."""
+    texts = [f"Page {n} salary details" for n in range(1, 8)]
+    data = make_pdf(texts, password="secret")
+
+    reader = open_pdf(io.BytesIO(data), password="secret")
+    parallel = list(extract_pages(io.BytesIO(data), reader, password="secret"))
+
+    assert parallel == list(iter_pages(reader))
+    assert [p["page"] for p in parallel] == list(range(1, 8))
+    assert parallel[6]["text"] == "Page 7 salary details"
+
+@patch("app.services.pdf_service.iter_pages_parallel")
+def test_small_pdf_extracted_serially(mock_parallel, make_pdf):
+    """Documents below PDF_PARALLEL_MIN_PAGES never start a process pool."""
+    data = make_pdf(["Only page"])
+    reader = open_pdf(io.BytesIO(data))
+
+    pages = list(extract_pages(io.BytesIO(data), reader))
+
+    assert pages == [{"page": 1, "text": "Only page"}]
+    mock_parallel.assert_not_called()
+class _InlineExecutor:
+    """Runs extraction ranges in this process, recording what was asked of the pool."""
+    instances = []
+
+    def __init__(self, max_workers, mp_context, initializer, initargs):
+        self.start_method = mp_context.get_start_method()
+        self.submitted = []
+        self.shutdown_args = None
+        initializer(*initargs)
+        _InlineExecutor.instances.append(self)
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdown_args = (wait, cancel_futures)
+
+@patch("app.services.pdf_service.ProcessPoolExecutor", _InlineExecutor)
+def test_parallel_extraction_stays_ahead_by_a_bounded_window(make_pdf):
+    """Ranges are submitted as pages are consumed, and abandoned work is cancelled."""
+    data = make_pdf([f"Page {n}" for n in range(1, 41)])
+    pages = iter_pages_parallel(io.BytesIO(data), 40, workers=2, pages_per_task=2)
+
+    assert next(pages) == {"page": 1, "text": "Page 1"}
+    pool = _InlineExecutor.instances[-1]
+    assert pool.start_method == "spawn"
+    assert len(pool.submitted) == 5        # 2 ranges per worker, plus one refill
+
+    pages.close()
+    assert pool.shutdown_args == (False, True)
+    assert len(pool.submitted) == 5
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+from app.services.context_packer import mmr_order
+from app.utils.profiler import SamplingProfiler, run_in_threadpool
+
+QUERY = {"question": "How much tax?", "session_id": "s1"}
+SEARCH_RESULT = {
+    "documents": [["Tax info"]],
+    "metadatas": [[{"page": 1, "source": "doc.pdf"}]]
+}
+
+# --- TEST 1: Server-Timing header ---
+@patch("app.api.query.agenerate_answer")
+@patch("app.api.query.aembed_query")
+@patch("app.services.vector_store.search_similar")
+def test_query_has_server_timing(mock_search, mock_embed, mock_llm, client):
+    mock_embed.return_value = [0.1, 0.2]
+    mock_search.return_value = SEARCH_RESULT
+    mock_llm.return_value = "Your tax is 10%."
+
+    response = client.post("/api/query", json=QUERY)
+
+    timing = response.headers["server-timing"]
+    stages = [part.split(";")[0] for part in timing.split(", ")]
+    assert stages == ["embed_query", "search", "context", "llm", "total"]
+    assert "X-Profile-Id" not in response.headers
+
+@patch("app.services.ingestion.store_chunks")
+@patch("app.services.ingestion.embed_texts")
+@patch("app.services.ingestion.open_pdf")
+def test_upload_timing_includes_parse_thread_stages(mock_open, mock_embed, mock_store, client, fake_pdf_reader):
+    mock_open.return_value = fake_pdf_reader("p1", "p2")
+    mock_embed.side_effect = lambda texts: [[0.1] for _ in texts]
+
+    files = {"file": ("a.pdf", b"PDF_BYTES", "application/pdf")}
+    response = client.post("/api/upload", files=files, data={"session_id": "s1"})
+
+    timing = response.headers["server-timing"]
+    for stage in ("extract", "chunk", "embed", "store", "total"):
+        assert f"{stage};dur=" in timing
+
+def test_other_endpoints_are_not_timed(client):
+    assert "server-timing" not in client.get("/").headers
+
+# --- TEST 2: Admin-gated profiling ---
+@patch("app.api.query.agenerate_answer")
+@patch("app.api.query.aembed_query")
+@patch("app.services.vector_store.search_similar")
+def test_profile_requires_admin_token(mock_search, mock_embed, mock_llm, client, tmp_path):
+    mock_embed.return_value = [0.1, 0.2]
+    mock_search.return_value = SEARCH_RESULT
+    mock_llm.return_value = "Your tax is 10%."
+
+    with patch("app.main.settings.ADMIN_TOKEN", "secret"), patch("app.main.settings.PROFILE_DIR", tmp_path):
+        denied = client.post("/api/query", json=QUERY, headers={"X-Profile": "1", "X-Admin-Token": "wrong"})
+        allowed = client.post("/api/query", json=QUERY, headers={"X-Profile": "1", "X-Admin-Token": "secret"})
+
+        profile_id = allowed.headers["x-profile-id"]
+        assert (tmp_path / f"{profile_id}.folded").exists()
+
+        fetched = client.get(f"/api/admin/profiles/{profile_id}", headers={"X-Admin-Token": "secret"})
+        forbidden = client.get(f"/api/admin/profiles/{profile_id}")
+
+    assert "x-profile-id" not in denied.headers
+    assert fetched.status_code == 200
+    assert forbidden.status_code == 403
+
+def test_sampling_profiler_captures_app_frames():
+    profiler = SamplingProfiler(interval=0.001).start()
+    deadline = time.perf_counter() + 0.2
+    while time.perf_counter() < deadline:
+        mmr_order([1.0, 0.0], [[1.0, 0.0], [0.0, 1.0]] * 20, 0.7)
+    profiler.stop()
+
+    assert profiler.samples > 0
+    assert "mmr_order" in profiler.folded()
+
+def _busy_mmr(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        mmr_order([1.0, 0.0], [[1.0, 0.0], [0.0, 1.0]] * 20, 0.7)
+
+def test_sampling_profiler_only_samples_the_request_threads():
+    """Other threads are ignored; a threadpool worker is sampled while it runs the request's call."""
+    stop = threading.Event()
+    def busy_bystander():
+        while not stop.is_set():
+            _busy_mmr(0.01)
+    bystander = threading.Thread(target=busy_bystander)
+    bystander.start()
+
+    async def handle_request():
+        profiler = SamplingProfiler(interval=0.001).start()
+        await run_in_threadpool(time.sleep, 0.2)
+        return profiler.stop()
+
+    try:
+        profiler = asyncio.run(handle_request())
+    finally:
+        stop.set()
+        bystander.join()
+
+    folded = profiler.folded()
+    assert "_call_tracked" in folded
+    assert "mmr_order" not in folded
@@ -0,0 +1,91 @@
+import chromadb
+from unittest.mock import patch
+
+from app.services import sessions, vector_store
+from app.services.sessions import SessionTracker, delete_session, expire_idle_sessions
+
+# --- TEST 1: Last-access tracking ---
+def test_touch_is_throttled(tmp_path):
+    tracker = SessionTracker(tmp_path / "sessions.sqlite3", touch_interval=60)
+    tracker.touch("s1", now=1000)
+    tracker.touch("s1", now=1030)   # within the interval: not written
+    assert tracker.last_access("s1") == 1000
+
+    tracker.touch("s1", now=1100)
+    assert tracker.last_access("s1") == 1100
+
+def test_touch_throttle_forgets_old_sessions(tmp_path):
+    """Write times are kept for the sessions of the last interval only."""
+    tracker = SessionTracker(tmp_path / "sessions.sqlite3", touch_interval=60)
+    for n in range(100):
+        tracker.touch(f"s{n}", now=1000 + n / 10)
+    tracker.touch("late", now=1070)
+    assert set(tracker._written) == {"late"}
+
+    tracker.forget("late")
+    tracker.touch("s1", now=1200)
+    tracker.prune(now=1300)
+    assert tracker._written == {}
+    assert tracker.count() == 100
+
+def test_idle_sessions(session_tracker):
+    session_tracker.touch("old", now=100)
+    session_tracker.touch("new", now=900)
+
+    assert session_tracker.idle_sessions(cutoff=500) == ["old"]
+
+# --- TEST 2: Deleting a session ---
+@patch("app.services.sessions.vector_store.delete_session")
+def test_delete_session_keeps_files_still_in_use(mock_delete, document_registry, session_tracker, tmp_path):
+    pdf = tmp_path / "form16.pdf"
+    pdf.write_bytes(b"%PDF")
+    document_registry.register("h1", "form16.pdf", str(pdf), 3, "alice")
+    document_registry.add_session("h1", "bob")
+    session_tracker.touch("alice")
+
+    with patch("app.services.sessions.settings.UPLOAD_DIR", tmp_path):
+        assert delete_session("alice")["files_deleted"] == 0
+        assert pdf.exists()
+        assert document_registry.get("h1") is not None
+
+        assert delete_session("bob")["files_deleted"] == 1
+        assert not pdf.exists()
+        assert document_registry.get("h1") is None
+
+    mock_delete.assert_called_with("bob")
+    assert session_tracker.last_access("alice") is None
+    assert "alice" not in session_tracker._written
+
+@patch("app.services.sessions.delete_session")
+def test_expire_idle_sessions(mock_delete, session_tracker):
+    session_tracker.touch_interval = 600
+    session_tracker.touch("idle", now=0)
+    session_tracker.touch("active", now=10_000)
+
+    expired = expire_idle_sessions(ttl_seconds=3600, now=10_100)
+
+    assert expired == ["idle"]
+    mock_delete.assert_called_once_with("idle")
+    # Even with delete_session mocked out, the idle session's throttle entry goes
+    assert set(session_tracker._written) == {"active"}
+
+@patch("app.services.sessions.delete_session")
+def test_delete_session_endpoint(mock_delete, client):
+    mock_delete.return_value = {"session_id": "s1", "files_deleted": 0}
+
+    response = client.delete("/api/sessions/s1")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "success"
+    mock_delete.assert_called_once_with("s1")
+
+# --- TEST 3: Reset drops and recreates the collection ---
+def test_reset_store_recreates_collection(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path / "db"))
+    collection = client.get_or_create_collection(name="tax_documents")
+    collection.add(ids=["a", "b"], embeddings=[[1.0, 0.0], [0.0, 1.0]], documents=["x", "y"])
+
+    with patch.object(vector_store, "client", client), patch.object(vector_store, "collection", collection):
+        assert vector_store.reset_store() == 2
+        assert vector_store.collection.count() == 0
+        assert vector_store.collection.id != collection.id
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from app.utils.singleflight import SingleFlight, AsyncSingleFlight
+
+# --- TEST 1: Thread Coalescing ---
+def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    def slow_embed():
+        calls.append(1)
+        time.sleep(0.05)
+        return [0.1, 0.2]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("key", slow_embed)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [[0.1, 0.2]] * 5
+    assert len(calls) == 1
+    assert flight.stats()["merged"] == 4
+
+def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight()
+
+    with pytest.raises(ValueError):
+        flight.do("key", lambda: (_ for _ in ()).throw(ValueError("Ollama Down")))
+
+    # Nothing stays in flight, so the next call runs again
+    assert flight.do("key", lambda: "ok") == "ok"
+
+# --- TEST 2: Async Coalescing ---
+def test_async_identical_calls_share_one_task():
+    flight = AsyncSingleFlight()
+    calls = 0
+
+    async def answer():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return "Your tax is 10%."
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do(("s1", "how much tax"), answer) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ["Your tax is 10%."] * 3
+    assert calls == 1
+    assert flight.stats()["merged"] == 2
+
+# --- TEST 3: Query Endpoint Coalescing ---
+@patch("app.api.query.agenerate_answer")
+@patch("app.api.query.aembed_query")
+@patch("app.services.vector_store.search_similar")
+def test_duplicate_in_flight_queries_run_one_pipeline(mock_search, mock_embed, mock_llm):
+    from app.api.query import query_docs, _query_flight
+    from app.models.request import QueryRequest
+
+    mock_embed.return_value = [0.1, 0.2]
+    mock_search.return_value = {
+        "documents": [["Tax info"]],
+        "metadatas": [[{"page": 1, "source": "doc.pdf"}]]
+    }
+
+    async def slow_answer(question, contexts):
+        await asyncio.sleep(0.05)
+        return "Your tax is 10%."
+    mock_llm.side_effect = slow_answer
+
+    async def scenario():
+        return await asyncio.gather(
+            query_docs(QueryRequest(question="How much tax?", session_id="s1")),
+            query_docs(QueryRequest(question="how much  TAX", session_id="s1"))
+        )
+
+    merged_before = _query_flight.merged
+    first, second = asyncio.run(scenario())
+
+    assert first.answer == second.answer == "Your tax is 10%."
+    assert mock_llm.call_count == 1
+    assert _query_flight.merged == merged_before + 1
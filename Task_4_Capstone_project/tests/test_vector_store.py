@@ -1,7 +1,17 @@
+import chromadb
+import numpy as np
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from fastapi import HTTPException
-from app.services.vector_store import store_chunks, search_similar
+from app.services.vector_store import (
+    PartitionManager,
+    open_collection,
+    persistent_client,
+    store_chunks,
+    search_similar,
+    copy_document_to_session,
+    delete_document
+)
 
 # --- TEST 1: Storing Chunks ---
 @patch("app.services.vector_store.collection") # Mock the global collection object
@@ -23,6 +33,27 @@ def test_store_chunks_success(mock_collection):
     assert call_args["embeddings"] == [[0.1, 0.2]]
     assert call_args["metadatas"][0]["session_id"] == "user_123"
 
+@patch("app.services.vector_store.collection")
+def test_copy_document_to_session(mock_collection):
+    """Chunks of a known document are re-added under the new session only once."""
+    mock_collection.get.return_value = {
+        "ids": ["a", "b", "c"],
+        "documents": ["Hello", "World", "Hello"],
+        "embeddings": [[0.1], [0.2], [0.1]],
+        "metadatas": [
+            {"page": 1, "session_id": "old", "doc_hash": "h"},
+            {"page": 2, "session_id": "old", "doc_hash": "h"},
+            {"page": 1, "session_id": "other", "doc_hash": "h"},
+        ]
+    }
+
+    copied = copy_document_to_session("h", "new")
+
+    assert copied == 2
+    call_args = mock_collection.add.call_args[1]
+    assert call_args["documents"] == ["Hello", "World"]
+    assert all(m["session_id"] == "new" for m in call_args["metadatas"])
+
 def test_store_chunks_validation():
     """Test input validation logic."""
     # Empty input
@@ -51,4 +82,101 @@ def test_search_similar_success(mock_collection):
     call_args = mock_collection.query.call_args[1]
     
     # Check if 'where={"session_id": ...}' was passed
-    assert call_args["where"] == {"session_id": "user_123"}
\ No newline at end of file
+    assert call_args["where"] == {"session_id": "user_123"}
+
+# --- TEST 3: Partitioned store ---
+@pytest.fixture
+def partition_manager(tmp_path):
+    """Swaps in a partition manager over a throwaway Chroma database."""
+    def _build(mode, buckets=4, max_open=8, idle_seconds=600):
+        manager = PartitionManager(
+            chromadb.PersistentClient(path=str(tmp_path / mode)),
+            mode=mode, buckets=buckets, max_open=max_open, idle_seconds=idle_seconds
+        )
+        patcher = patch("app.services.vector_store.partitions", manager)
+        patcher.start()
+        managers.append(patcher)
+        return manager
+
+    managers = []
+    yield _build
+    for patcher in managers:
+        patcher.stop()
+
+def test_session_partitions_isolate_sessions(partition_manager):
+    manager = partition_manager("session")
+    store_chunks([{"text": "Salary slip", "page": 1}], [[1.0, 0.0]], "alice", doc_hash="h1")
+    store_chunks([{"text": "Rent receipt", "page": 1}], [[1.0, 0.0]], "bob", doc_hash="h2")
+
+    results = search_similar([1.0, 0.0], session_id="alice", top_k=5)
+
+    assert results["documents"][0] == ["Salary slip"]
+    assert manager.name_for("alice") != manager.name_for("bob")
+
+def test_unknown_session_does_not_create_partition(partition_manager):
+    manager = partition_manager("session")
+
+    results = search_similar([1.0, 0.0], session_id="nobody", top_k=5)
+
+    assert results["documents"] == [[]]
+    assert manager.client.list_collections() == []
+
+def test_bucket_partitions_filter_by_session(partition_manager):
+    manager = partition_manager("bucket", buckets=1)
+    store_chunks([{"text": "Salary slip", "page": 1}], [[1.0, 0.0]], "alice")
+    store_chunks([{"text": "Rent receipt", "page": 1}], [[1.0, 0.0]], "bob")
+
+    results = search_similar([1.0, 0.0], session_id="bob", top_k=5)
+
+    assert results["documents"][0] == ["Rent receipt"]
+    assert len(manager.client.list_collections()) == 1
+
+def test_partitioned_copy_and_delete(partition_manager):
+    partition_manager("session")
+    store_chunks([{"text": "Form 16", "page": 2}], [[0.0, 1.0]], "alice", doc_hash="h1")
+
+    assert copy_document_to_session("h1", "bob", source_sessions=["alice"]) == 1
+    assert search_similar([0.0, 1.0], session_id="bob", top_k=5)["documents"][0] == ["Form 16"]
+
+    delete_document("h1", "alice")
+    assert search_similar([0.0, 1.0], session_id="alice", top_k=5)["documents"] == [[]]
+    assert search_similar([0.0, 1.0], session_id="bob", top_k=5)["documents"][0] == ["Form 16"]
+
+def test_partition_handles_are_closed_and_reopened(partition_manager):
+    manager = partition_manager("session", max_open=2, idle_seconds=0)
+    for session in ("a", "b", "c"):
+        store_chunks([{"text": f"doc {session}", "page": 1}], [[1.0, 0.0]], session)
+
+    # idle_seconds=0: every earlier handle is closed on the next access
+    assert manager.stats()["open"] == 1
+    assert search_similar([1.0, 0.0], session_id="a", top_k=1)["documents"][0] == ["doc a"]
+
+    manager.drop("a")
+    assert search_similar([1.0, 0.0], session_id="a", top_k=1)["documents"] == [[]]
+    assert manager.drop_all() == 2
+
+# --- TEST 4: Bounded index cache ---
+def test_evicted_partitions_reload_from_disk(tmp_path):
+    with patch("app.services.vector_store.settings.CHROMA_HNSW_CACHE_SIZE", 4):
+        client = persistent_client(str(tmp_path / "bounded"))
+    assert client._server.hnsw_cache_size == 4
+
+    # The override uses private bindings: refuse other chromadb versions loudly
+    with patch("app.services.vector_store.settings.CHROMA_HNSW_CACHE_SIZE", 4), \
+         patch("app.services.vector_store.chromadb.__version__", "9.9.9"), pytest.raises(RuntimeError):
+        persistent_client(str(tmp_path / "unverified"))
+
+    # A collection made with Chroma's sync_threshold (1000) is lowered when opened
+    client.get_or_create_collection(name="legacy")
+    assert open_collection(client, "legacy").configuration["hnsw"]["sync_threshold"] == 100
+
+    # Enough vectors per collection (> Chroma's batch_size of 100) to build an HNSW index
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(20, 150, 8))
+    for i in range(20):
+        open_collection(client, f"part-{i:02d}").add(ids=[f"c{j}" for j in range(150)], embeddings=vectors[i])
+    # Revisit collections whose indexes were evicted from the cache meanwhile
+    for i in rng.integers(20, size=100).tolist():
+        partition = open_collection(client, f"part-{i:02d}", create=False)
+        found = partition.query(query_embeddings=[vectors[i][7]], n_results=1)
+        assert found["ids"][0] == ["c7"]
@@ -0,0 +1 @@
+"""Deterministic stand-in for the Ollama API, for offline tests and benchmarks."""
@@ -0,0 +1,50 @@
+"""
+Run the fake Ollama server.
+
+Usage (from the repository root):
+    python -m fake_ollama                         # nomic-embed-text / mistral:7b on CPU
+    python -m fake_ollama --port 11435 --latency-scale 0
+    python -m fake_ollama --tokens-per-sec 60 --num-parallel 4
+
+Point the tasks at it with OLLAMA_HOST=http://127.0.0.1:<port> (the
+ollama client) or by running it on the default port 11434.
+"""
+import argparse
+
+import uvicorn
+
+from fake_ollama.config import settings
+from fake_ollama.server import create_app
+
+# CLI flag -> Settings attribute; defaults come from the FAKE_OLLAMA_* environment
+OPTIONS = {
+    "host": ("HOST", str),
+    "port": ("PORT", int),
+    "embed_dim": ("EMBED_DIM", int),
+    "embed_latency_ms": ("EMBED_LATENCY_MS", float),
+    "embed_item_ms": ("EMBED_ITEM_MS", float),
+    "chat_latency_ms": ("CHAT_LATENCY_MS", float),
+    "prefill_tokens_per_sec": ("PREFILL_TOKENS_PER_SEC", float),
+    "tokens_per_sec": ("TOKENS_PER_SEC", float),
+    "answer_tokens": ("ANSWER_TOKENS", int),
+    "num_parallel": ("NUM_PARALLEL", int),
+    "latency_scale": ("LATENCY_SCALE", float),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for option, (attribute, kind) in OPTIONS.items():
+        parser.add_argument(
+            "--" + option.replace("_", "-"), type=kind, default=getattr(settings, attribute),
+            help=f"default: %(default)s (env FAKE_OLLAMA_{attribute})"
+        )
+    args = parser.parse_args()
+    for option, (attribute, _) in OPTIONS.items():
+        setattr(settings, attribute, getattr(args, option))
+
+    uvicorn.run(create_app(settings), host=settings.HOST, port=settings.PORT, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import os
+
+
+class Settings:
+    HOST = os.getenv("FAKE_OLLAMA_HOST", "127.0.0.1")
+    PORT = int(os.getenv("FAKE_OLLAMA_PORT", 11434))
+
+    # --- EMBEDDINGS (defaults mimic nomic-embed-text on CPU) ---
+    # Vector size for models not in MODEL_DIMENSIONS
+    EMBED_DIM = int(os.getenv("FAKE_OLLAMA_EMBED_DIM", 768))
+    # Fixed cost of every embedding call plus the cost of each input text
+    EMBED_LATENCY_MS = float(os.getenv("FAKE_OLLAMA_EMBED_LATENCY_MS", 5))
+    EMBED_ITEM_MS = float(os.getenv("FAKE_OLLAMA_EMBED_ITEM_MS", 15))
+
+    # --- CHAT (defaults mimic mistral:7b, Q4, on CPU) ---
+    # Time to first token = CHAT_LATENCY_MS + prompt tokens / PREFILL_TOKENS_PER_SEC,
+    # then one token every 1 / TOKENS_PER_SEC seconds
+    CHAT_LATENCY_MS = float(os.getenv("FAKE_OLLAMA_CHAT_LATENCY_MS", 50))
+    PREFILL_TOKENS_PER_SEC = float(os.getenv("FAKE_OLLAMA_PREFILL_TOKENS_PER_SEC", 400))
+    TOKENS_PER_SEC = float(os.getenv("FAKE_OLLAMA_TOKENS_PER_SEC", 20))
+    # Length of the canned answer unless the request's num_predict is lower
+    ANSWER_TOKENS = int(os.getenv("FAKE_OLLAMA_ANSWER_TOKENS", 60))
+
+    # Requests served at once per kind (embed / chat), like OLLAMA_NUM_PARALLEL;
+    # the rest queue. 0 = unlimited.
+    NUM_PARALLEL = int(os.getenv("FAKE_OLLAMA_NUM_PARALLEL", 1))
+    # Multiplies every simulated delay: 0 answers instantly, 2 is twice as slow
+    LATENCY_SCALE = float(os.getenv("FAKE_OLLAMA_LATENCY_SCALE", 1.0))
+
+
+settings = Settings()
@@ -0,0 +1,278 @@
+"""
+Fake Ollama server: the subset of the Ollama REST API the tasks in this
+repo use, with deterministic output and simulated model latency.
+
+  POST /api/embed        {"model", "input": str | [str]}  -> {"embeddings": [[...]]}
+  POST /api/embeddings   {"model", "prompt"}              -> {"embedding": [...]}
+  POST /api/chat         {"model", "messages", "stream"}  -> NDJSON stream or one JSON
+  GET  /api/tags, /api/version, /                          (client health checks)
+
+Embeddings are hashed bags of words: every word adds a few signed unit
+components chosen by its hash, plus a small per-text component so that
+different texts never share a vector. Same text -> same vector, and texts
+sharing words point the same way, so retrieval still returns sensible
+neighbours. Chat answers are built from the first "[Page N]" context of the
+prompt and streamed word by word at the configured token rate.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from fake_ollama.config import Settings, settings as default_settings
+
+VERSION = "0.6.1-fake"
+
+# Output size of the embedding models the tasks use (Ollama library defaults)
+MODEL_DIMENSIONS = {
+    "nomic-embed-text": 768,
+    "mxbai-embed-large": 1024,
+    "all-minilm": 384,
+    "snowflake-arctic-embed": 1024,
+    "bge-m3": 1024,
+}
+
+WORD_RE = re.compile(r"\w+")
+TOKEN_RE = re.compile(r"\S+\s*")
+CONTEXT_RE = re.compile(r"\[Page ([^\]]+)\]\s*(.+?)(?=\n\s*\n|\[Page |\Z)", re.DOTALL)
+# Signed components each word adds to its embedding
+COMPONENTS_PER_WORD = 4
+# Norm of the per-text component relative to the bag of words
+TEXT_NOISE = 0.3
+CHARS_PER_TOKEN = 4
+
+
+def base_model(model: str) -> str:
+    return model.split(":", 1)[0]
+
+
+def embedding_dim(model: str, settings: Settings) -> int:
+    return MODEL_DIMENSIONS.get(base_model(model), settings.EMBED_DIM)
+
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def embed_text(text: str, model: str, dim: int) -> list[float]:
+    """Deterministic unit vector for text; a function of (model, text) only."""
+    model = base_model(model)
+    vector = [0.0] * dim
+    words = WORD_RE.findall(text.lower())
+    for word in words:
+        digest = hashlib.blake2b(f"{model}\x00{word}".encode(), digest_size=4 * COMPONENTS_PER_WORD).digest()
+        for offset in range(0, len(digest), 4):
+            value = int.from_bytes(digest[offset:offset + 4], "little")
+            vector[value % dim] += 1.0 if value & 0x80000000 else -1.0
+
+    rng = random.Random(hashlib.sha256(f"{model}\x00{text}".encode()).digest())
+    sigma = TEXT_NOISE * math.sqrt(COMPONENTS_PER_WORD * max(len(words), 1) / dim)
+    for i in range(dim):
+        vector[i] += rng.gauss(0.0, sigma)
+    return _normalize(vector)
+
+
+def canned_answer(prompt: str, max_tokens: int) -> str:
+    """
+    Grounded-looking answer: the start of the prompt's first page-tagged
+    context with a page citation, or an echo of the prompt without one.
+    """
+    match = CONTEXT_RE.search(prompt)
+    if match:
+        page, context = match.group(1).strip(), match.group(2)
+        words = context.split()[:max(max_tokens - 8, 1)]
+        return f"According to the document, {' '.join(words)} (Page {page}).\n\nPages used: {page}"
+    words = prompt.split()[:max(max_tokens - 4, 1)]
+    return f"Fake answer to: {' '.join(words)}"
+
+
+def split_tokens(text: str) -> list[str]:
+    """Word-sized 'tokens' (each keeps its trailing whitespace) for streaming."""
+    return TOKEN_RE.findall(text)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _error(message: str, status_code: int = 400) -> JSONResponse:
+    # Ollama reports errors as {"error": "..."}; its client raises ResponseError
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    settings = settings or default_settings
+    # One queue per kind of model, like Ollama's per-model parallel slots
+    slots = {
+        kind: asyncio.Semaphore(settings.NUM_PARALLEL) if settings.NUM_PARALLEL > 0 else None
+        for kind in ("embed", "chat")
+    }
+
+    app = FastAPI(title="Fake Ollama", version=VERSION)
+
+    @asynccontextmanager
+    async def slot(kind: str):
+        semaphore = slots[kind]
+        if semaphore is None:
+            yield
+            return
+        async with semaphore:
+            yield
+
+    async def simulate(seconds: float) -> int:
+        """Sleeps for the scaled delay; returns it in nanoseconds (Ollama's unit)."""
+        seconds *= settings.LATENCY_SCALE
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+        return int(seconds * 1e9)
+
+    async def read_json(request: Request) -> dict:
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return {}
+        return body if isinstance(body, dict) else {}
+
+    async def embed_inputs(model: str, texts: list[str], dimensions: Optional[int]) -> tuple[list, int]:
+        dim = embedding_dim(model, settings)
+        async with slot("embed"):
+            duration = await simulate((settings.EMBED_LATENCY_MS + settings.EMBED_ITEM_MS * len(texts)) / 1000)
+        vectors = [embed_text(text, model, dim) for text in texts]
+        if dimensions and dimensions < dim:
+            # Matryoshka-style truncation, renormalised like Ollama does
+            vectors = [_normalize(vector[:dimensions]) for vector in vectors]
+        return vectors, duration
+
+    @app.get("/", response_class=PlainTextResponse)
+    @app.head("/", response_class=PlainTextResponse)
+    async def root():
+        return "Ollama is running"
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": VERSION}
+
+    @app.get("/api/tags")
+    async def tags():
+        models = [f"{name}:latest" for name in MODEL_DIMENSIONS] + ["mistral:7b"]
+        return {
+            "models": [
+                {"name": name, "model": name, "modified_at": _now(), "size": 0,
+                 "digest": hashlib.sha256(name.encode()).hexdigest(), "details": {"format": "fake"}}
+                for name in models
+            ]
+        }
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await read_json(request)
+        model = body.get("model")
+        if not model:
+            return _error("model is required")
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            return _error("invalid input type")
+
+        vectors, duration = await embed_inputs(model, texts, body.get("dimensions"))
+        return {
+            "model": model,
+            "embeddings": vectors,
+            "total_duration": duration,
+            "load_duration": 0,
+            "prompt_eval_count": sum(count_tokens(text) for text in texts)
+        }
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        body = await read_json(request)
+        model = body.get("model")
+        if not model:
+            return _error("model is required")
+        prompt = body.get("prompt", "")
+        if not isinstance(prompt, str):
+            return _error("invalid prompt type")
+        if not prompt:
+            # Legacy endpoint: an empty prompt gets an empty embedding
+            return {"embedding": []}
+        vectors, _ = await embed_inputs(model, [prompt], None)
+        return {"embedding": vectors[0]}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await read_json(request)
+        model = body.get("model")
+        if not model:
+            return _error("model is required")
+        messages = body.get("messages") or []
+        if not isinstance(messages, list):
+            return _error("invalid messages type")
+
+        prompt = "\n".join(str(message.get("content") or "") for message in messages if isinstance(message, dict))
+        options = body.get("options") or {}
+        num_predict = options.get("num_predict")
+        tokens = split_tokens(canned_answer(prompt, settings.ANSWER_TOKENS))
+        done_reason = "stop"
+        if isinstance(num_predict, int) and 0 <= num_predict < len(tokens):
+            tokens = tokens[:num_predict]
+            done_reason = "length"
+        prompt_tokens = count_tokens(prompt)
+        prefill_seconds = settings.CHAT_LATENCY_MS / 1000 + prompt_tokens / settings.PREFILL_TOKENS_PER_SEC
+        token_seconds = 1 / settings.TOKENS_PER_SEC if settings.TOKENS_PER_SEC > 0 else 0.0
+
+        def final(content: str, prefill_ns: int, eval_ns: int) -> dict:
+            return {
+                "model": model,
+                "created_at": _now(),
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "done_reason": done_reason,
+                "total_duration": prefill_ns + eval_ns,
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": prefill_ns,
+                "eval_count": len(tokens),
+                "eval_duration": eval_ns
+            }
+
+        if body.get("stream", True) is False:
+            async with slot("chat"):
+                prefill_ns = await simulate(prefill_seconds)
+                eval_ns = await simulate(token_seconds * len(tokens))
+            return final("".join(tokens), prefill_ns, eval_ns)
+
+        async def stream():
+            async with slot("chat"):
+                prefill_ns = await simulate(prefill_seconds)
+                eval_ns = 0
+                for token in tokens:
+                    eval_ns += await simulate(token_seconds)
+                    part = {
+                        "model": model,
+                        "created_at": _now(),
+                        "message": {"role": "assistant", "content": token},
+                        "done": False
+                    }
+                    yield json.dumps(part) + "\n"
+            yield json.dumps(final("", prefill_ns, eval_ns)) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the repository root to the python path so "fake_ollama" imports
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from fake_ollama.config import Settings
+from fake_ollama.server import create_app
+
+
+@pytest.fixture
+def fast_settings():
+    """Settings with every simulated delay switched off."""
+    settings = Settings()
+    settings.LATENCY_SCALE = 0
+    settings.NUM_PARALLEL = 1
+    settings.ANSWER_TOKENS = 60
+    return settings
+
+
+@pytest.fixture
+def client(fast_settings):
+    return TestClient(create_app(fast_settings))
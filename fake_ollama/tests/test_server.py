@@ -0,0 +1,160 @@
+import asyncio
+import json
+import math
+import time
+
+import httpx
+import ollama
+import pytest
+from fastapi.testclient import TestClient
+
+from fake_ollama.server import canned_answer, create_app, embed_text
+
+PROMPT = """DOCUMENT CONTEXT:
+[Page 2] Gross salary for the year is 5,00,000 and tax deducted at source is 12,000.
+
+[Page 3] The employer is Acme Corp.
+
+USER QUESTION:
+What is the gross salary?
+"""
+
+
+def dot(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def test_embeddings_are_deterministic_unit_vectors():
+    first = embed_text("gross salary", "nomic-embed-text", 768)
+    assert first == embed_text("gross salary", "nomic-embed-text:latest", 768)
+    assert len(first) == 768
+    assert math.isclose(dot(first, first), 1.0, rel_tol=1e-9)
+    assert first != embed_text("gross salary.", "nomic-embed-text", 768)
+
+
+def test_texts_sharing_words_are_closer():
+    query = embed_text("search_query: what is the gross salary", "nomic-embed-text", 768)
+    related = embed_text("search_document: the gross salary for the year is 5,00,000", "nomic-embed-text", 768)
+    unrelated = embed_text("search_document: employer address and PAN details", "nomic-embed-text", 768)
+    assert dot(query, related) > dot(query, unrelated) + 0.2
+
+
+def test_embed_batch_uses_model_dimension(client):
+    response = client.post("/api/embed", json={"model": "all-minilm", "input": ["a", "b", "c"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["embeddings"]) == 3
+    assert all(len(vector) == 384 for vector in body["embeddings"])
+
+    single = client.post("/api/embed", json={"model": "all-minilm", "input": "b"}).json()
+    assert single["embeddings"] == [body["embeddings"][1]]
+
+
+def test_embed_truncates_to_requested_dimensions(client):
+    body = client.post("/api/embed", json={"model": "nomic-embed-text", "input": "x", "dimensions": 256}).json()
+    vector = body["embeddings"][0]
+    assert len(vector) == 256
+    assert math.isclose(dot(vector, vector), 1.0, rel_tol=1e-9)
+
+
+def test_missing_model_is_an_ollama_error(client):
+    response = client.post("/api/embed", json={"input": "x"})
+    assert response.status_code == 400
+    assert response.json() == {"error": "model is required"}
+
+
+def test_legacy_embeddings_endpoint(client):
+    body = client.post("/api/embeddings", json={"model": "nomic-embed-text", "prompt": "hello"}).json()
+    assert body["embedding"] == embed_text("hello", "nomic-embed-text", 768)
+
+
+def test_chat_answer_cites_first_context_page():
+    answer = canned_answer(PROMPT, 60)
+    assert answer.startswith("According to the document, Gross salary")
+    assert "(Page 2)" in answer
+
+
+def test_chat_without_stream_returns_one_response(client):
+    body = client.post("/api/chat", json={
+        "model": "mistral:7b",
+        "messages": [{"role": "user", "content": PROMPT}],
+        "stream": False
+    }).json()
+    assert body["done"] is True
+    assert body["done_reason"] == "stop"
+    assert "(Page 2)" in body["message"]["content"]
+    assert body["prompt_eval_count"] == math.ceil(len(PROMPT) / 4)
+    assert body["eval_count"] == len(body["message"]["content"].split())
+
+
+def test_chat_streams_ndjson_parts(client):
+    with client.stream("POST", "/api/chat", json={
+        "model": "mistral:7b",
+        "messages": [{"role": "user", "content": PROMPT}]
+    }) as response:
+        assert response.headers["content-type"] == "application/x-ndjson"
+        parts = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert all(not part["done"] for part in parts[:-1])
+    assert parts[-1]["done"] is True
+    assert parts[-1]["eval_count"] == len(parts) - 1
+    text = "".join(part["message"]["content"] for part in parts)
+    assert text == canned_answer(PROMPT, 60)
+
+
+def test_num_predict_truncates_answer(client):
+    body = client.post("/api/chat", json={
+        "model": "mistral:7b",
+        "messages": [{"role": "user", "content": PROMPT}],
+        "options": {"num_predict": 5},
+        "stream": False
+    }).json()
+    assert body["eval_count"] == 5
+    assert body["done_reason"] == "length"
+
+
+def test_simulated_latency_is_reported(fast_settings):
+    fast_settings.LATENCY_SCALE = 1
+    fast_settings.CHAT_LATENCY_MS = 0
+    fast_settings.PREFILL_TOKENS_PER_SEC = 1e9
+    fast_settings.TOKENS_PER_SEC = 200
+    fast_settings.ANSWER_TOKENS = 10
+    client = TestClient(create_app(fast_settings))
+
+    started = time.perf_counter()
+    body = client.post("/api/chat", json={
+        "model": "mistral:7b",
+        "messages": [{"role": "user", "content": PROMPT}],
+        "stream": False
+    }).json()
+    elapsed = time.perf_counter() - started
+
+    expected = body["eval_count"] / 200
+    assert elapsed >= expected
+    assert body["eval_duration"] == pytest.approx(expected * 1e9, rel=0.01)
+
+
+def test_official_client_against_fake_server(client):
+    # The same calls Task_4's embedding and llm services make
+    sync_client = ollama.Client(host="http://testserver", transport=client._transport)
+    assert len(sync_client.embed(model="nomic-embed-text", input=["a", "b"])["embeddings"]) == 2
+    assert len(sync_client.embeddings(model="nomic-embed-text", prompt="a")["embedding"]) == 768
+
+    parts = list(sync_client.chat(
+        model="mistral:7b",
+        messages=[{"role": "user", "content": PROMPT}],
+        options={"temperature": 0},
+        stream=True
+    ))
+    assert parts[-1]["done"] and parts[-1]["eval_count"] > 0
+
+
+def test_async_client_against_fake_server(fast_settings):
+    async def run():
+        async_client = ollama.AsyncClient(
+            host="http://testserver", transport=httpx.ASGITransport(app=create_app(fast_settings))
+        )
+        response = await async_client.chat(model="mistral:7b", messages=[{"role": "user", "content": PROMPT}])
+        return response["message"]["content"]
+
+    assert "(Page 2)" in asyncio.run(run())